@@ -313,11 +313,15 @@ class PromoCodeAdmin(admin.ModelAdmin):
 
 @admin.register(Broadcast)
 class BroadcastAdmin(admin.ModelAdmin):
-    list_display = ("id", "status", "scheduled_at", "sent_at")
+    list_display = ("id", "status", "scheduled_at", "sent_at", "delivered_count", "failed_count", "blocked_count")
     list_filter = ("status",)
     search_fields = ("id", "text")
-    fields = ("text", "media_type", "media_file", "telegram_file_id", "media_url", "scheduled_at", "sent_at")
-    readonly_fields = ("sent_at", "status")
+    fields = (
+        "text", "media_type", "media_file", "telegram_file_id", "media_url", "scheduled_at",
+        "only_active", "only_with_family", "min_walks", "landing_source",
+        "status", "started_at", "sent_at", "delivered_count", "failed_count", "blocked_count",
+    )
+    readonly_fields = ("sent_at", "status", "started_at", "delivered_count", "failed_count", "blocked_count")
 
 
 @admin.register(Referral)
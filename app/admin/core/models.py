@@ -324,6 +324,17 @@ class Broadcast(models.Model):
     scheduled_at = models.DateTimeField(_("Отправить в"), null=True, blank=True)
     sent_at = models.DateTimeField(_("Отправлено"), null=True, blank=True)
     status = models.CharField(_("Статус"), max_length=10, default="pending")
+    only_active = models.BooleanField(_("Только активным"), default=True)
+    only_with_family = models.BooleanField(_("Только состоящим в семье"), default=False)
+    min_walks = models.IntegerField(_("Минимум прогулок"), null=True, blank=True)
+    landing_source = models.CharField(_("Источник перехода"), max_length=120, null=True, blank=True)
+    started_at = models.DateTimeField(_("Начата"), null=True, blank=True)
+    claimed_by = models.CharField(_("Воркер"), max_length=128, null=True, blank=True)
+    lease_until = models.DateTimeField(_("Аренда до"), null=True, blank=True)
+    cursor_user_id = models.BigIntegerField(_("Курсор (id пользователя)"), default=0)
+    delivered_count = models.IntegerField(_("Доставлено"), default=0)
+    failed_count = models.IntegerField(_("Ошибок"), default=0)
+    blocked_count = models.IntegerField(_("Заблокировали бота"), default=0)
 
     class Meta:
         db_table = "broadcasts"
@@ -388,6 +399,9 @@ class PVZ(models.Model):
     """
     id = models.CharField(_("ID"), max_length=64, primary_key=True)
     full_address = models.CharField(_("Полный адрес"), max_length=255)
+    city = models.CharField(_("Город (поиск)"), max_length=128, null=True, blank=True, editable=False)
+    street = models.CharField(_("Улица (поиск)"), max_length=255, null=True, blank=True, editable=False)
+    search = models.CharField(_("Адрес (поиск)"), max_length=255, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(_("Создан"), auto_now_add=True)
 
     class Meta:
@@ -399,3 +413,13 @@ class PVZ(models.Model):
     def __str__(self):
         return f"{self.full_address} ({self.id})"
 
+    def save(self, *args, **kwargs) -> None:
+        """
+        Заполняет поисковые колонки тем же разбором адреса, что и импорт в боте.
+        """
+        from app.steps_bot.services.pvz_address import parse_address
+
+        parsed = parse_address(self.full_address)
+        self.city, self.street, self.search = parsed.city, parsed.street, parsed.search
+        super().save(*args, **kwargs)
+
@@ -3,27 +3,33 @@ Admin API for PVZ management and order retrieval.
 
 Endpoints:
 - POST /pvz: Replace PVZ list in database
-- GET /order/{date_from-date_to}: Get orders for date range
+- GET /order/{date_from-date_to}: Get orders for date range (streamed or paged)
 """
 
 from __future__ import annotations
 
+import asyncio
+import csv
+import io
+import json
 import logging
 from datetime import datetime, date as date_type
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 
-from fastapi import FastAPI, Header, HTTPException, status, Depends
+from fastapi import FastAPI, Header, HTTPException, Query, status, Depends
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 from fastapi.requests import Request
-import json
 
 from app.steps_bot.settings import config
+from app.steps_bot.api.json_stream import JSONStreamError, iter_json_array, iter_ndjson
+from app.steps_bot.db.pvz_import import PvzImport, PvzImportResult
 from app.steps_bot.db.repo import (
+    ORDER_EXPORT_FIELDS,
+    OrderCursor,
     get_session,
-    replace_pvz_list,
-    get_pvz_by_city,
-    get_pvz_by_city_and_street,
-    get_orders_between,
+    get_orders_page,
+    iter_orders_between,
 )
 
 
@@ -31,11 +37,21 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI(title="steps_bot Admin API", version="1.0.0")
 
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+PVZ_ID_MAX_LENGTH = 64
+PVZ_ADDRESS_MAX_LENGTH = 255
+ORDER_EXPORT_MEDIA_TYPES = {
+    "json": "application/json",
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+ORDER_EXPORT_CHUNK_SIZE = 64 * 1024
+
 
 class PVZItem(BaseModel):
     """Model for PVZ item in request."""
-    id: str = Field(..., min_length=1)
-    full_address: str = Field(..., min_length=1)
+    id: str = Field(..., min_length=1, max_length=PVZ_ID_MAX_LENGTH)
+    full_address: str = Field(..., min_length=1, max_length=PVZ_ADDRESS_MAX_LENGTH)
 
 
 class PVZResponse(BaseModel):
@@ -43,6 +59,10 @@ class PVZResponse(BaseModel):
     success: bool
     count: int
     message: str
+    inserted: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
 
 
 class OrderResponse(BaseModel):
@@ -82,6 +102,69 @@ def validate_api_key(
     return True
 
 
+def _validate_pvz_item(item: Any) -> Tuple[Optional[Dict[str, str]], Optional[str]]:
+    """Return a cleaned {"id", "full_address"} dict or an error message for one item."""
+    if not isinstance(item, dict):
+        return None, "not a valid object"
+    if "id" not in item or "full_address" not in item:
+        return None, "missing required fields: id, full_address"
+    pvz_id = str(item["id"]).strip()
+    full_address = str(item["full_address"]).strip()
+    if not pvz_id or len(pvz_id) > PVZ_ID_MAX_LENGTH:
+        return None, f"id must be 1-{PVZ_ID_MAX_LENGTH} characters"
+    if not full_address or len(full_address) > PVZ_ADDRESS_MAX_LENGTH:
+        return None, f"full_address must be 1-{PVZ_ADDRESS_MAX_LENGTH} characters"
+    return {"id": pvz_id, "full_address": full_address}, None
+
+
+async def _import_pvz(items: AsyncIterator[Tuple[int, Any, Optional[str]]]) -> PvzImportResult:
+    """Validate, stage and merge the streamed PVZ items; raise HTTPException on bad input."""
+    errors: List[Dict[str, Any]] = []
+    errors_total = 0
+    # The session takes a connection only at the first stage(), i.e. once a full
+    # batch has been read; the transaction then stays open until the body ends
+    async with get_session() as session:
+        pvz_import = PvzImport(session)
+        batch: List[Dict[str, str]] = []
+        staged = 0
+        async for idx, item, error in items:
+            row = None
+            if error is None:
+                row, error = _validate_pvz_item(item)
+            if error is not None:
+                if not errors_total:
+                    # Nothing will be saved: release the staged rows and the connection now
+                    await session.rollback()
+                errors_total += 1
+                if len(errors) < config.PVZ_IMPORT_MAX_ERRORS:
+                    errors.append({"index": idx, "error": error})
+                continue
+            # After the first error keep reading only to report the remaining ones
+            if errors_total:
+                continue
+            batch.append(row)
+            if len(batch) >= config.PVZ_IMPORT_BATCH_SIZE:
+                staged += await pvz_import.stage(batch)
+                batch = []
+
+        if errors_total:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail={
+                    "message": f"{errors_total} invalid PVZ items, nothing saved",
+                    "errors_total": errors_total,
+                    "errors": errors,
+                },
+            )
+        staged += await pvz_import.stage(batch)
+        if not staged:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="PVZ list cannot be empty",
+            )
+        return await pvz_import.merge()
+
+
 @app.post("/pvz", response_model=PVZResponse)
 async def replace_pvz(
     request: Request,
@@ -89,67 +172,55 @@ async def replace_pvz(
 ) -> PVZResponse:
     """
     Replace entire PVZ list in database.
+
+    The list is merged into the table in one transaction: new items are
+    inserted, changed ones updated, missing ones deleted. Readers keep seeing
+    the previous list until the import commits.
+
+    The body is read as a stream and staged in batches of PVZ_IMPORT_BATCH_SIZE,
+    so memory does not grow with the size of the list. Reading and merging must
+    finish within PVZ_IMPORT_TIMEOUT_SECONDS, otherwise the response is 408 and
+    nothing is saved. Two formats:
+    - application/json: JSON array of PVZ items
+    - application/x-ndjson: one PVZ item per line
     
     Request body: JSON array of PVZ items
     [{
         "id": "019620d8987e745880fb93a122b7da44",
         "full_address": "Москва Ленинградский проспект 75 к1А"
     }, ...]
+
+    If any item is invalid nothing is saved: the response is 400 with
+    errors_total and the first PVZ_IMPORT_MAX_ERRORS errors ({index, error},
+    index is the array position or the line number starting at 0).
     
     Returns:
         - success: boolean indicating success
         - count: number of saved PVZ items
         - message: descriptive message
+        - inserted / updated / deleted / unchanged: diff against the previous list
     """
-    # Parse request body
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in NDJSON_CONTENT_TYPES:
+        items = iter_ndjson(request.stream())
+    else:
+        items = iter_json_array(request.stream())
+
     try:
-        body = await request.json()
-    except json.JSONDecodeError:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid JSON in request body",
-        )
-    
-    # Validate it's a list
-    if not isinstance(body, list):
+        result = await asyncio.wait_for(_import_pvz(items), timeout=config.PVZ_IMPORT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(f"PVZ import timed out after {config.PVZ_IMPORT_TIMEOUT_SECONDS}s")
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Request body must be a JSON array",
+            status_code=status.HTTP_408_REQUEST_TIMEOUT,
+            detail=f"PVZ import did not finish in {config.PVZ_IMPORT_TIMEOUT_SECONDS} seconds, nothing saved",
         )
-    
-    if not body:
+    except HTTPException:
+        raise
+    except JSONStreamError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="PVZ list cannot be empty",
+            detail=f"Invalid JSON in request body: {e}",
         )
-    
-    # Validate each item
-    pvz_list = []
-    for idx, item in enumerate(body):
-        if not isinstance(item, dict):
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Item {idx} is not a valid object",
-            )
-        if "id" not in item or "full_address" not in item:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Item {idx} missing required fields: id, full_address",
-            )
-        pvz_list.append({
-            "id": str(item["id"]).strip(),
-            "full_address": str(item["full_address"]).strip(),
-        })
-    
-    try:
-        async with get_session() as session:
-            count = await replace_pvz_list(session, pvz_list)
-            logger.info(f"PVZ list replaced: {count} items saved")
-            return PVZResponse(
-                success=True,
-                count=count,
-                message=f"Successfully saved {count} PVZ items",
-            )
     except Exception as e:
         logger.error(f"Error replacing PVZ list: {str(e)}")
         raise HTTPException(
@@ -157,12 +228,89 @@ async def replace_pvz(
             detail="Failed to save PVZ list",
         )
 
+    logger.info(
+        f"PVZ list replaced: {result.total} items "
+        f"(+{result.inserted} ~{result.updated} -{result.deleted})"
+    )
+    return PVZResponse(
+        success=True,
+        count=result.total,
+        message=f"Successfully saved {result.total} PVZ items",
+        inserted=result.inserted,
+        updated=result.updated,
+        deleted=result.deleted,
+        unchanged=result.unchanged,
+    )
+
+
+async def _encode_orders(rows: AsyncIterator[Dict[str, str]], fmt: str) -> AsyncIterator[str]:
+    """Serialize order rows as a JSON array, NDJSON or CSV, in chunks of ~64 KB."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if fmt == "json":
+        buffer.write("[")
+    elif writer is not None:
+        writer.writerow(ORDER_EXPORT_FIELDS)
+
+    first = True
+    async for row in rows:
+        if writer is not None:
+            writer.writerow([row[name] for name in ORDER_EXPORT_FIELDS])
+        else:
+            if fmt == "json" and not first:
+                buffer.write(",")
+            buffer.write(json.dumps(row, ensure_ascii=False))
+            if fmt == "ndjson":
+                buffer.write("\n")
+        first = False
+        if buffer.tell() >= ORDER_EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if fmt == "json":
+        buffer.write("]")
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def _iter_list(rows: List[Dict[str, str]]) -> AsyncIterator[Dict[str, str]]:
+    for row in rows:
+        yield row
+
+
+async def _stream_orders(date_from: date_type, date_to: date_type, fmt: str) -> AsyncIterator[str]:
+    """Read orders through a server-side cursor while the response is being sent."""
+    count = 0
+
+    async def counted(rows: AsyncIterator[Dict[str, str]]) -> AsyncIterator[Dict[str, str]]:
+        nonlocal count
+        async for row in rows:
+            count += 1
+            yield row
 
-@app.get("/order/{date_range}", response_model=List[OrderResponse])
+    try:
+        async with get_session() as session:
+            rows = iter_orders_between(session, date_from, date_to, config.ORDER_EXPORT_BATCH_SIZE)
+            async for chunk in _encode_orders(counted(rows), fmt):
+                yield chunk
+    except Exception as e:
+        # Headers are already sent: the client sees a truncated body
+        logger.error(f"Error streaming orders after {count} rows: {str(e)}")
+        raise
+    logger.info(f"Streamed {count} orders for range {date_from} to {date_to}")
+
+
+# The body is written by _encode_orders (JSON, NDJSON or CSV), so there is no
+# response_model; OrderResponse only documents the JSON shape in OpenAPI
+@app.get("/order/{date_range}", responses={200: {"model": List[OrderResponse]}})
 async def get_orders_by_date_range(
     date_range: str,
+    fmt: str = Query("json", alias="format", pattern="^(json|ndjson|csv)$"),
+    limit: Optional[int] = Query(None, ge=1, le=config.ORDER_EXPORT_MAX_LIMIT),
+    cursor: Optional[str] = Query(None),
     _: bool = Depends(validate_api_key),
-) -> List[OrderResponse]:
+) -> Response:
     """
     Get orders for specified date range.
     
@@ -170,17 +318,24 @@ async def get_orders_by_date_range(
         date_range: two ISO dates separated by hyphen
         Format: YYYY-MM-DD-YYYY-MM-DD
         Example: 2025-10-01-2025-10-17
+
+    Query parameters:
+        format: json (array, default) | ndjson (one object per line) | csv (with header)
+        limit: page size; without limit and cursor the whole range is streamed
+            from a server-side cursor
+        cursor: value of X-Next-Cursor from the previous page
     
     Returns:
-        JSON array of order objects with fields:
+        Orders from newest to oldest with fields:
         - first_name (string)
         - last_name (string)
         - phone (string)
         - email (string)
         - pvz_id (string)
         - order_id (string)
-        - created_at (ISO 8601 datetime)
+        - created_at (MSK datetime, YYYY-MM-DDTHH:MM:SS)
         - product_code (string)
+        Paged responses carry X-Next-Cursor while more orders remain.
     """
     # Parse date range
     try:
@@ -202,18 +357,36 @@ async def get_orders_by_date_range(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Invalid date range format: {str(e)}. Use YYYY-MM-DD-YYYY-MM-DD",
         )
-    
+
+    after = None
+    if cursor:
+        try:
+            after = OrderCursor.decode(cursor)
+        except (ValueError, OverflowError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+
+    media_type = ORDER_EXPORT_MEDIA_TYPES[fmt]
+    if limit is None and after is None:
+        return StreamingResponse(_stream_orders(date_from, date_to, fmt), media_type=media_type)
+
+    limit = limit or config.ORDER_EXPORT_MAX_LIMIT
     try:
         async with get_session() as session:
-            orders = await get_orders_between(session, date_from, date_to)
-            logger.info(f"Retrieved {len(orders)} orders for range {date_from_str} to {date_to_str}")
-            return [OrderResponse(**order) for order in orders]
+            orders, next_cursor = await get_orders_page(session, date_from, date_to, limit, after)
     except Exception as e:
         logger.error(f"Error retrieving orders: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve orders",
         )
+    logger.info(f"Retrieved {len(orders)} orders for range {date_from_str} to {date_to_str}")
+
+    body = "".join([chunk async for chunk in _encode_orders(_iter_list(orders), fmt)])
+    headers = {"X-Next-Cursor": next_cursor.encode()} if next_cursor else None
+    return Response(content=body, media_type=media_type, headers=headers)
 
 
 if __name__ == "__main__":
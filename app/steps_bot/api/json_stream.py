@@ -0,0 +1,132 @@
+"""
+Incremental parsing of large JSON request bodies.
+
+Both parsers read the body chunk by chunk and yield one item at a time, so
+only the current item (plus one network chunk) is held in memory:
+
+- iter_ndjson: one JSON value per line (application/x-ndjson)
+- iter_json_array: a single top-level JSON array
+
+Each yielded value is ``(index, item, error)``: ``error`` is a message for an
+item that could not be decoded, in which case ``item`` is None. A broken
+array cannot be resynchronised, so iter_json_array raises JSONStreamError
+instead of yielding per-item errors for syntax problems.
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Optional, Tuple
+
+# A single item larger than this is rejected instead of buffered indefinitely
+MAX_ITEM_BYTES = 1 << 20
+
+StreamItem = Tuple[int, Optional[Any], Optional[str]]
+
+# What may still follow the decoded prefix of a number split across chunks
+# ("1" + "2", "1." + "5", "1e" + "-3")
+_NUMBER_TAIL = frozenset("0123456789+-.eE")
+
+
+class JSONStreamError(ValueError):
+    """The body is not a well-formed JSON array / NDJSON stream."""
+
+
+async def iter_ndjson(chunks: AsyncIterable[bytes]) -> AsyncIterator[StreamItem]:
+    """Yield ``(line_index, value, error)`` for every non-empty line."""
+    buffer = b""
+    index = 0
+
+    def decode(line: bytes) -> StreamItem:
+        try:
+            return index, json.loads(line), None
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            return index, None, f"invalid JSON: {e}"
+
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > MAX_ITEM_BYTES:
+            raise JSONStreamError(f"line {index + len(lines)} exceeds {MAX_ITEM_BYTES} bytes")
+        for line in lines:
+            if line.strip():
+                yield decode(line)
+            index += 1
+    if buffer.strip():
+        yield decode(buffer)
+
+
+async def iter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator[StreamItem]:
+    """Yield ``(array_index, value, None)`` for every element of a top-level JSON array."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    index = 0
+    # start: expect "[", first: element or "]", value: element after ",",
+    # separator: "," or "]", done: array closed
+    state = "start"
+
+    async for chunk in chunks:
+        try:
+            buffer += utf8.decode(chunk)
+        except UnicodeDecodeError as e:
+            raise JSONStreamError(f"invalid UTF-8: {e}")
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos >= len(buffer) or state == "done":
+                break
+            char = buffer[pos]
+            if state == "start":
+                if char != "[":
+                    raise JSONStreamError("request body must be a JSON array")
+                pos += 1
+                state = "first"
+            elif state in ("first", "value"):
+                if char == "]" and state == "first":
+                    pos += 1
+                    state = "done"
+                    continue
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    # Most likely the element is split across chunks: wait for more data
+                    if len(buffer) - pos > MAX_ITEM_BYTES:
+                        raise JSONStreamError(f"item {index} is malformed or exceeds {MAX_ITEM_BYTES} bytes")
+                    break
+                if not isinstance(item, (dict, list, str)):
+                    # A number or literal is complete only before a delimiter: without one
+                    # it may continue in the next chunk ("[12" + "3]", "[1." + "5]")
+                    follow = buffer[end:end + 1]
+                    if not follow or not (follow in ",]" or follow.isspace()):
+                        if not _NUMBER_TAIL.issuperset(buffer[end:]):
+                            raise JSONStreamError(f"invalid JSON in item {index}: unexpected {follow!r}")
+                        if len(buffer) - pos > MAX_ITEM_BYTES:
+                            raise JSONStreamError(f"item {index} is malformed or exceeds {MAX_ITEM_BYTES} bytes")
+                        break
+                pos = end
+                yield index, item, None
+                index += 1
+                state = "separator"
+            else:
+                if char == ",":
+                    state = "value"
+                elif char == "]":
+                    state = "done"
+                else:
+                    raise JSONStreamError(f"expected ',' or ']' after item {index - 1}")
+                pos += 1
+        buffer = buffer[pos:]
+        if state == "done" and buffer.strip():
+            raise JSONStreamError("unexpected data after the JSON array")
+
+    buffer += utf8.decode(b"", final=True)
+    if state != "done":
+        if state in ("first", "value") and buffer.strip():
+            try:
+                decoder.raw_decode(buffer)
+            except json.JSONDecodeError as e:
+                raise JSONStreamError(f"invalid JSON in item {index}: {e.msg}")
+        raise JSONStreamError("unexpected end of JSON array")
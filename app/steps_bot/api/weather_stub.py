@@ -0,0 +1,59 @@
+"""
+Local stand-in for the Open-Meteo forecast endpoint.
+
+Lets the bot run against a predictable weather source in tests and local
+development without hitting the real API.
+
+Usage:
+    WEATHER_STUB_TEMP_C=-12 uvicorn app.steps_bot.api.weather_stub:app --port 8090
+    OPEN_METEO_URL=http://localhost:8090/v1/forecast
+
+Endpoints:
+- GET /v1/forecast: Open-Meteo compatible `current_weather` response
+- GET /stats: number of forecast requests served
+- POST /temperature/{temp_c}: change the temperature returned by the stub
+"""
+
+from __future__ import annotations
+
+import os
+
+from fastapi import FastAPI, Query
+
+app = FastAPI(title="Open-Meteo Stub")
+
+_state = {
+    "temperature": float(os.getenv("WEATHER_STUB_TEMP_C", "15")),
+    "requests": 0,
+}
+
+
+@app.get("/v1/forecast")
+async def forecast(
+    latitude: float = Query(...),
+    longitude: float = Query(...),
+):
+    """Return the configured temperature for any coordinates."""
+    _state["requests"] += 1
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "current_weather": {
+            "temperature": _state["temperature"],
+            "windspeed": 0.0,
+            "weathercode": 0,
+        },
+    }
+
+
+@app.get("/stats")
+async def stats():
+    """Return how many forecast requests the stub has served."""
+    return {"requests": _state["requests"], "temperature": _state["temperature"]}
+
+
+@app.post("/temperature/{temp_c}")
+async def set_temperature(temp_c: float):
+    """Change the temperature returned by subsequent forecast requests."""
+    _state["temperature"] = temp_c
+    return {"temperature": temp_c}
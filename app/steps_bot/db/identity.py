@@ -0,0 +1,127 @@
+"""
+Разрешение пользователя по идентификатору.
+
+Telegram id и users.id — оба целые числа, и одно и то же значение может
+оказаться и тем и другим. Поэтому вызывающий код явно указывает тип:
+TelegramId(message.from_user.id) или UserId(user.id).
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import case, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.steps_bot.db.models.user import User
+from app.steps_bot.settings import config
+
+
+class TelegramId(int):
+    """Значение users.telegram_id (id пользователя в Telegram)."""
+    __slots__ = ()
+
+
+class UserId(int):
+    """Значение users.id (первичный ключ)."""
+    __slots__ = ()
+
+
+class _TelegramIdCache:
+    """Небольшой LRU telegram_id → users.id на процесс (связка не меняется)."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[int, int] = OrderedDict()
+
+    def get(self, telegram_id: int) -> Optional[int]:
+        user_id = self._data.get(telegram_id)
+        if user_id is not None:
+            self._data.move_to_end(telegram_id)
+        return user_id
+
+    def put(self, telegram_id: int, user_id: int) -> None:
+        self._data[telegram_id] = user_id
+        self._data.move_to_end(telegram_id)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def discard(self, telegram_id: int) -> None:
+        self._data.pop(telegram_id, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+telegram_id_cache = _TelegramIdCache(config.IDENTITY_CACHE_SIZE)
+
+
+def _session_map(session: AsyncSession) -> dict:
+    """Карта telegram_id → User в рамках сессии (одна сессия — один апдейт)."""
+    return session.info.setdefault("users_by_telegram_id", {})
+
+
+def forget_users(session: AsyncSession) -> None:
+    """Сбрасывает карту сессии (после expunge_all/отката объекты в ней отцеплены)."""
+    session.info.pop("users_by_telegram_id", None)
+
+
+def remember_user(session: AsyncSession, user: User) -> None:
+    _session_map(session)[user.telegram_id] = user
+    telegram_id_cache.put(user.telegram_id, user.id)
+
+
+async def resolve_user(
+    session: AsyncSession,
+    ident: int,
+    *,
+    for_update: bool = False,
+) -> Optional[User]:
+    """
+    Возвращает пользователя не более чем одним запросом по индексу.
+
+    UserId ищется по первичному ключу (из identity map сессии — без запроса),
+    TelegramId — по кэшу telegram_id → users.id, иначе по users.telegram_id.
+    Нетипизированное число по-старому трактуется сначала как users.id, потом как
+    telegram_id, но одним запросом. for_update блокирует строку пользователя.
+    """
+    if isinstance(ident, UserId):
+        user = await session.get(User, int(ident), with_for_update=for_update or None)
+        if user is not None:
+            remember_user(session, user)
+        return user
+
+    if isinstance(ident, TelegramId):
+        tg = int(ident)
+        if not for_update:
+            user = _session_map(session).get(tg)
+            if user is not None and user in session:
+                return user
+        cached_id = telegram_id_cache.get(tg)
+        if cached_id is not None:
+            user = await session.get(User, cached_id, with_for_update=for_update or None)
+            if user is not None and user.telegram_id == tg:
+                remember_user(session, user)
+                return user
+            telegram_id_cache.discard(tg)
+        q = select(User).where(User.telegram_id == tg).limit(1)
+        if for_update:
+            q = q.with_for_update()
+        user = await session.scalar(q)
+        if user is not None:
+            remember_user(session, user)
+        return user
+
+    value = int(ident)
+    q = (
+        select(User)
+        .where(or_(User.id == value, User.telegram_id == value))
+        .order_by(case((User.id == value, 0), else_=1))
+        .limit(1)
+    )
+    if for_update:
+        q = q.with_for_update()
+    user = await session.scalar(q)
+    if user is not None:
+        remember_user(session, user)
+    return user
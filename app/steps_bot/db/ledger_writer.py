@@ -0,0 +1,192 @@
+"""
+Пакетная запись проводок журнала.
+
+LedgerWriter копит проводки и изменения балансов/счётчиков одной единицы работы
+и отправляет их двумя выражениями: изменения users и families — UPDATE … RETURNING
+в CTE одного запроса, затем проводки — многострочным INSERT … RETURNING с
+balance_after, посчитанным из вернувшихся балансов. Если строки владельца нет,
+проводки не пишутся (LedgerOwnerNotFound). created_at проставляет сервер.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert, literal, select, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+
+from app.steps_bot.db.models.family import Family
+from app.steps_bot.db.models.ledger import LedgerEntry, OperationType, OwnerType
+from app.steps_bot.db.models.user import User
+from app.steps_bot.db.models.walk import WalkForm
+
+_LEDGER_COLUMNS = (
+    "owner_type",
+    "user_id",
+    "family_id",
+    "operation",
+    "amount",
+    "balance_after",
+    "order_id",
+    "title",
+    "description",
+    "walk_form",
+)
+
+
+class LedgerOwnerNotFound(ValueError):
+    """Нет строки users/families для владельца проводки; транзакцию нужно откатить."""
+
+    def __init__(self, missing: List[tuple[OwnerType, int]]) -> None:
+        self.missing = missing
+        names = ", ".join(f"{owner_type.value}:{owner_id}" for owner_type, owner_id in missing)
+        super().__init__(f"Владелец проводки не найден: {names}")
+
+
+class LedgerWriter:
+    """Проводки и изменения балансов, записываемые одним запросом в flush()."""
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        self._entries: List[Dict[str, Any]] = []
+        # (owner_type, id) → {колонка: приращение}
+        self._increments: Dict[tuple[OwnerType, int], Dict[str, int]] = {}
+        self._extra: list = []
+
+    def __bool__(self) -> bool:
+        return bool(self._entries or self._increments or self._extra)
+
+    def add(
+        self,
+        *,
+        owner_type: OwnerType,
+        operation: OperationType,
+        amount: int,
+        title: str,
+        user_id: Optional[int] = None,
+        family_id: Optional[int] = None,
+        apply: bool = True,
+        balance_after: Optional[int] = None,
+        order_id: Optional[int] = None,
+        description: Optional[str] = None,
+        walk_form: Optional[WalkForm] = None,
+    ) -> None:
+        """
+        Добавляет проводку. apply=True — сумма меняет баланс владельца, balance_after
+        вычисляется при записи; apply=False — статистическая проводка, balance_after как передан.
+        """
+        owner_id = user_id if owner_type == OwnerType.USER else family_id
+        if owner_id is None:
+            raise ValueError("Не указан владелец проводки")
+        key = (owner_type, int(owner_id))
+        offset = None
+        if apply:
+            incs = self._increments.setdefault(key, {})
+            incs["balance"] = incs.get("balance", 0) + int(amount)
+            # Баланс после этой проводки = итоговый баланс − сумма последующих изменений;
+            # пока храним накопленную сумму, смещение досчитаем в flush()
+            offset = incs["balance"]
+        self._entries.append(
+            {
+                "owner_type": owner_type,
+                "user_id": int(user_id) if owner_type == OwnerType.USER else None,
+                "family_id": int(family_id) if owner_type == OwnerType.FAMILY else None,
+                "operation": operation,
+                "amount": int(amount),
+                "balance_after": balance_after,
+                "order_id": order_id,
+                "title": title,
+                "description": description,
+                "walk_form": walk_form,
+                "_key": key if apply else None,
+                "_running": offset,
+            }
+        )
+
+    def increment_user(self, user_id: int, **columns: int) -> None:
+        """Приращения числовых колонок users без проводки (счётчики прогулок, шаги, баланс)."""
+        incs = self._increments.setdefault((OwnerType.USER, int(user_id)), {})
+        for name, delta in columns.items():
+            incs[name] = incs.get(name, 0) + int(delta)
+
+    def also(self, statement) -> None:
+        """Дополнительное UPDATE/INSERT, выполняемое тем же запросом (как CTE)."""
+        self._extra.append(statement)
+
+    async def flush(self) -> List[LedgerEntry]:
+        """Выполняет накопленное; возвращает проводки в порядке добавления."""
+        if not self:
+            return []
+
+        balances = await self._apply_increments()
+        extra = [stmt.cte(f"extra_{i}") for i, stmt in enumerate(self._extra)]
+
+        entries: List[LedgerEntry] = []
+        if self._entries:
+            rows = []
+            for entry in self._entries:
+                row = {name: entry[name] for name in _LEDGER_COLUMNS}
+                key = entry["_key"]
+                if key is not None:
+                    # Баланс после проводки = итоговый баланс − сумма последующих изменений
+                    tail = self._increments[key]["balance"] - entry["_running"]
+                    row["balance_after"] = balances[key] - tail
+                rows.append(row)
+            stmt = insert(LedgerEntry).values(rows).returning(LedgerEntry)
+            if extra:
+                stmt = stmt.add_cte(*extra)
+            entries = list(await self.session.scalars(stmt))
+        elif extra:
+            # Выполняем первое выражение, остальные — его CTE
+            await self.session.execute(select(extra[0].c[0]).add_cte(*extra[1:]))
+
+        self._sync_identity_map(balances)
+        self._entries.clear()
+        self._increments.clear()
+        self._extra.clear()
+        return entries
+
+    async def _apply_increments(self) -> Dict[tuple[OwnerType, int], int]:
+        """
+        Применяет приращения users/families одним запросом и возвращает итоговые
+        балансы владельцев. LedgerOwnerNotFound, если UPDATE не нашёл чью-то строку.
+        """
+        if not self._increments:
+            return {}
+        keys = list(self._increments)
+        selects = []
+        for i, (owner_type, owner_id) in enumerate(keys):
+            model = User if owner_type == OwnerType.USER else Family
+            incs = self._increments[(owner_type, owner_id)]
+            cte = (
+                update(model)
+                .where(model.id == owner_id)
+                .values({name: getattr(model, name) + delta for name, delta in incs.items()})
+                .returning(model.balance)
+                .cte(f"{owner_type.value}_{i}")
+            )
+            selects.append(select(literal(i).label("n"), cte.c.balance))
+        stmt = selects[0] if len(selects) == 1 else union_all(*selects)
+        balances = {keys[n]: int(balance) for n, balance in (await self.session.execute(stmt)).all()}
+        if len(balances) != len(keys):
+            raise LedgerOwnerNotFound([key for key in keys if key not in balances])
+        return balances
+
+    def _sync_identity_map(self, balances: Dict[tuple[OwnerType, int], int]) -> None:
+        """
+        Обновляет загруженные в сессию User/Family без повторного SELECT: баланс
+        берётся из RETURNING, остальные счётчики — приращением.
+        """
+        identity_map = self.session.sync_session.identity_map
+        for key, incs in self._increments.items():
+            owner_type, owner_id = key
+            model = User if owner_type == OwnerType.USER else Family
+            obj = identity_map.get(identity_key(model, owner_id))
+            if obj is None:
+                continue
+            for name, delta in incs.items():
+                if name == "balance":
+                    set_committed_value(obj, name, balances[key])
+                elif name in obj.__dict__:
+                    set_committed_value(obj, name, int(obj.__dict__[name]) + delta)
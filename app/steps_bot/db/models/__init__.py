@@ -6,11 +6,18 @@ from app.steps_bot.db.models.family import (
     FamilyInviteStatus,
 )
 from app.steps_bot.db.models.walk import WalkForm, WalkFormCoefficient
+from app.steps_bot.db.models.walk_session import WalkSessionRecord
 from app.steps_bot.db.models.coefficients import TemperatureCoefficient
 from app.steps_bot.db.models.captions import MediaType, Content
 from app.steps_bot.db.models.faq import FAQ
 from app.steps_bot.db.models.promo import PromoGroup, PromoCode
-from app.steps_bot.db.models.ledger import LedgerEntry, OwnerType, OperationType
+from app.steps_bot.db.models.ledger import (
+    LedgerCheckpoint,
+    LedgerCheckpointState,
+    LedgerEntry,
+    OwnerType,
+    OperationType,
+)
 from app.steps_bot.db.models.catalog import (
     CatalogCategory,
     Product,
@@ -32,6 +39,7 @@ __all__ = [
     "Family",
     "WalkForm",
     "WalkFormCoefficient",
+    "WalkSessionRecord",
     "TemperatureCoefficient",
     "MediaType",
     "Content",
@@ -45,6 +53,8 @@ __all__ = [
     "PromoCode",
     "PromoGroup",
     "LedgerEntry",
+    "LedgerCheckpoint",
+    "LedgerCheckpointState",
     "OwnerType",
     "OperationType",
     "Broadcast",
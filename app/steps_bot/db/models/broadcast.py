@@ -4,7 +4,7 @@ import enum
 import datetime as dt
 from typing import Optional
 
-from sqlalchemy import DateTime, Enum, Integer, String, Text, func, Index
+from sqlalchemy import BigInteger, Boolean, DateTime, Enum, Integer, String, Text, func, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.steps_bot.db.models.base import Base
@@ -14,6 +14,7 @@ from app.steps_bot.db.utils import enum_values
 
 class BroadcastStatus(str, enum.Enum):
     PENDING = "pending"
+    SENDING = "sending"
     SENT = "sent"
     FAILED = "failed"
 
@@ -43,6 +44,22 @@ class Broadcast(Base):
         index=True,
     )
 
+    # Сегментация получателей
+    only_active: Mapped[bool] = mapped_column(Boolean, default=True, server_default="true", nullable=False)
+    only_with_family: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false", nullable=False)
+    min_walks: Mapped[Optional[int]] = mapped_column(Integer)
+    landing_source: Mapped[Optional[str]] = mapped_column(String(120))
+
+    # Прогресс: последний обработанный users.id и итоги доставки
+    started_at: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True))
+    # Аренда: какой воркер отправляет рассылку и до какого момента
+    claimed_by: Mapped[Optional[str]] = mapped_column(String(128))
+    lease_until: Mapped[Optional[dt.datetime]] = mapped_column(DateTime(timezone=True))
+    cursor_user_id: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0", nullable=False)
+    delivered_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    failed_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    blocked_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+
     created_at: Mapped[dt.datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
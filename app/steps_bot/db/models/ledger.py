@@ -5,12 +5,14 @@ import datetime as dt
 from typing import Optional
 
 from sqlalchemy import (
+    BigInteger,
     CheckConstraint,
     DateTime,
     Enum,
     ForeignKey,
     Index,
     Integer,
+    SmallInteger,
     String,
     Text,
     func,
@@ -19,7 +21,7 @@ from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.steps_bot.db.models.base import Base
 from app.steps_bot.db.models.walk import WalkForm
-from app.steps_bot.db.utils import enum_values
+from app.steps_bot.db.utils import XID8, enum_values
 
 
 class OwnerType(str, enum.Enum):
@@ -57,10 +59,14 @@ class LedgerEntry(Base):
             "(owner_type = 'family' AND family_id IS NOT NULL AND user_id IS NULL)",
             name="ck_ledger_owner_fk",
         ),
-        Index("ix_ledger_owner_created", "owner_type", "created_at"),
-        Index("ix_ledger_user_created", "user_id", "created_at"),
-        Index("ix_ledger_family_created", "family_id", "created_at"),
-        Index("ix_ledger_operation_created", "operation", "created_at"),
+        # История по курсору (created_at, id) — отдельно по пользователю и по семье
+        Index("ix_ledger_user_created_id", "user_id", "created_at", "id"),
+        Index("ix_ledger_family_created_id", "family_id", "created_at", "id"),
+        Index("ix_ledger_created_brin", "created_at", postgresql_using="brin"),
+        # Хвост после снимка журнала (txid >= ledger_checkpoint_state.upto_txid)
+        Index("ix_ledger_txid", "txid"),
+        # Месячные секции ledger_entries_YYYY_MM создаёт ensure_ledger_partitions()
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
@@ -68,23 +74,19 @@ class LedgerEntry(Base):
     owner_type: Mapped[OwnerType] = mapped_column(
         Enum(OwnerType, values_callable=enum_values, name="ownertype"),
         nullable=False,
-        index=True,
     )
     user_id: Mapped[Optional[int]] = mapped_column(
         ForeignKey("users.id", ondelete="CASCADE"),
         nullable=True,
-        index=True,
     )
     family_id: Mapped[Optional[int]] = mapped_column(
         ForeignKey("families.id", ondelete="CASCADE"),
         nullable=True,
-        index=True,
     )
 
     operation: Mapped[OperationType] = mapped_column(
         Enum(OperationType, values_callable=enum_values, name="operationtype"),
         nullable=False,
-        index=True,
     )
     amount: Mapped[int] = mapped_column(Integer, nullable=False)
     balance_after: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
@@ -92,7 +94,6 @@ class LedgerEntry(Base):
     order_id: Mapped[Optional[int]] = mapped_column(
         ForeignKey("orders.id", ondelete="SET NULL"),
         nullable=True,
-        index=True,
     )
 
     title: Mapped[str] = mapped_column(String(120), nullable=False)
@@ -103,14 +104,80 @@ class LedgerEntry(Base):
         nullable=True,
     )
 
+    # Ключ секционирования входит в первичный ключ (id, created_at)
     created_at: Mapped[dt.datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
-        nullable=False,
-        index=True,
+        primary_key=True,
+    )
+
+    # Транзакция, записавшая проводку (верхнего уровня, pg_current_xact_id()): по ней
+    # снимки журнала отделяют завершённые транзакции от ещё идущих
+    txid: Mapped[Optional[int]] = mapped_column(
+        XID8(),
+        server_default=func.pg_current_xact_id(),
+        nullable=True,
     )
 
     order = relationship("Order", viewonly=True)
 
     def __repr__(self) -> str:
         return f"<LedgerEntry {self.id} {self.owner_type.value} {self.operation.value} {self.amount}>"
+
+
+class LedgerCheckpoint(Base):
+    """
+    Снимок журнала: итоги владельца по типу операции для проводок транзакций
+    с txid < ledger_checkpoint_state.upto_txid.
+
+    Актуальные итоги = снимок + «хвост» проводок с txid >= upto_txid. balance_delta —
+    влияние проводок на баланс владельца (статистические пользовательские проводки
+    не меняют баланс), по нему сверяется users.balance / families.balance.
+    """
+    __tablename__ = "ledger_checkpoints"
+
+    owner_type: Mapped[OwnerType] = mapped_column(
+        Enum(OwnerType, values_callable=enum_values, name="ownertype"),
+        primary_key=True,
+    )
+    owner_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    operation: Mapped[OperationType] = mapped_column(
+        Enum(OperationType, values_callable=enum_values, name="operationtype"),
+        primary_key=True,
+    )
+
+    amount_sum: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    balance_delta: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    entry_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+    updated_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"<LedgerCheckpoint {self.owner_type.value}:{self.owner_id} "
+            f"{self.operation.value} {self.amount_sum}>"
+        )
+
+
+class LedgerCheckpointState(Base):
+    """
+    Граница снимков журнала (одна строка). Все транзакции с txid < upto_txid к моменту
+    снимка завершены, и их проводки уже в ledger_checkpoints; проводки с txid >= upto_txid —
+    хвост, даже если они закоммичены позже проводок с большими id.
+    """
+    __tablename__ = "ledger_checkpoint_state"
+
+    id: Mapped[int] = mapped_column(SmallInteger, primary_key=True, default=1)
+    upto_txid: Mapped[int] = mapped_column(XID8(), nullable=False)
+    updated_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return f"<LedgerCheckpointState upto_txid={self.upto_txid}>"
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import datetime as dt
-from sqlalchemy import String, DateTime, func
+from typing import Optional
+
+from sqlalchemy import String, DateTime, Index, func
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.steps_bot.db.models.base import Base
@@ -14,12 +16,31 @@ class PVZ(Base):
     Поля:
     - id: уникальный идентификатор (строка, первичный ключ)
     - full_address: полный адрес ПВЗ
+    - city, street: город и улица из адреса в поисковой форме (services/pvz_address.py)
+    - search: весь адрес в поисковой форме, по нему триграммный индекс
     - created_at: дата создания записи
     """
     __tablename__ = "pvz"
+    __table_args__ = (
+        Index(
+            "ix_pvz_city_trgm",
+            "city",
+            postgresql_using="gin",
+            postgresql_ops={"city": "gin_trgm_ops"},
+        ),
+        Index(
+            "ix_pvz_search_trgm",
+            "search",
+            postgresql_using="gin",
+            postgresql_ops={"search": "gin_trgm_ops"},
+        ),
+    )
 
     id: Mapped[str] = mapped_column(String(64), primary_key=True)
     full_address: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
+    city: Mapped[Optional[str]] = mapped_column(String(128), nullable=True, index=True)
+    street: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    search: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     created_at: Mapped[dt.datetime] = mapped_column(
         DateTime(timezone=True),
         server_default=func.now(),
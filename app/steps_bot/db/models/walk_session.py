@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import Optional
+
+from sqlalchemy import BigInteger, Boolean, DateTime, Enum, Float, Integer, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.steps_bot.db.models.base import Base
+from app.steps_bot.db.models.walk import WalkForm
+from app.steps_bot.db.utils import enum_values
+
+
+class WalkSessionRecord(Base):
+    """
+    Сохранённое состояние прогулки пользователя (по telegram_id) для переживания рестартов.
+    """
+    __tablename__ = "walk_sessions"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=False)
+
+    lat: Mapped[Optional[float]] = mapped_column(Float)
+    lon: Mapped[Optional[float]] = mapped_column(Float)
+    coords_ts: Mapped[Optional[float]] = mapped_column(Float)
+    steps: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    chat_id: Mapped[Optional[int]] = mapped_column(BigInteger)
+    message_id: Mapped[Optional[int]] = mapped_column(BigInteger)
+
+    was_over_speed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    finished: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+
+    multiplier: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
+    walk_form: Mapped[Optional[WalkForm]] = mapped_column(
+        Enum(WalkForm, values_callable=enum_values, name="walkform"),
+        nullable=True,
+    )
+    started_at: Mapped[Optional[float]] = mapped_column(Float)
+    temp_c: Mapped[Optional[int]] = mapped_column(Integer)
+    temp_updated_at: Mapped[Optional[float]] = mapped_column(Float)
+
+    daily_steps_used: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    daily_steps_date: Mapped[Optional[str]] = mapped_column(String(10))
+
+    updated_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return f"<WalkSession tg={self.user_id} steps={self.steps}>"
@@ -0,0 +1,106 @@
+"""
+Уведомления между процессами через Postgres LISTEN/NOTIFY.
+
+Админка (Django), админ-API и бот — разные процессы; об изменениях в общих таблицах
+они узнают по каналам NOTIFY. Слушатель держит отдельное соединение asyncpg
+(не из пула SQLAlchemy) и сам переподключается при обрыве.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from typing import Callable, Dict, List, Optional
+
+import asyncpg
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.steps_bot.db.session import mark_writes
+from app.steps_bot.settings import config
+
+logger = logging.getLogger(__name__)
+
+# payload None — соединение (пере)установлено и часть уведомлений могла потеряться
+NotifyCallback = Callable[[Optional[str]], None]
+
+
+async def notify(session: AsyncSession, channel: str, payload: str = "") -> None:
+    """Отправляет NOTIFY; доставляется слушателям после коммита транзакции сессии."""
+    mark_writes(session)
+    await session.execute(
+        text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": channel, "payload": payload},
+    )
+
+
+class PgListener:
+    """Подписка на каналы NOTIFY с синхронными колбэками."""
+
+    def __init__(self) -> None:
+        self._callbacks: Dict[str, List[NotifyCallback]] = {}
+        self._conn: Optional[asyncpg.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, channel: str, callback: NotifyCallback) -> None:
+        is_new = channel not in self._callbacks
+        self._callbacks.setdefault(channel, []).append(callback)
+        if is_new and self._conn is not None and not self._conn.is_closed():
+            asyncio.create_task(self._conn.add_listener(channel, self._on_notify))
+
+    async def start(self) -> None:
+        if not config.PG_LISTEN_ENABLED or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._conn is not None:
+            with contextlib.suppress(Exception):
+                await self._conn.close()
+            self._conn = None
+
+    def _on_notify(self, _conn, _pid, channel: str, payload: str) -> None:
+        self._dispatch(channel, payload)
+
+    def _dispatch(self, channel: str, payload: Optional[str]) -> None:
+        for callback in self._callbacks.get(channel, ()):
+            try:
+                callback(payload)
+            except Exception:
+                logger.exception("Ошибка обработчика NOTIFY %s", channel)
+
+    async def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            lost = asyncio.Event()
+            try:
+                self._conn = await asyncpg.connect(
+                    user=config.POSTGRES_USER,
+                    password=config.POSTGRES_PASSWORD,
+                    host=config.POSTGRES_HOST,
+                    port=config.POSTGRES_PORT,
+                    database=config.POSTGRES_DB,
+                )
+                self._conn.add_termination_listener(lambda _conn: lost.set())
+                for channel in list(self._callbacks):
+                    await self._conn.add_listener(channel, self._on_notify)
+                backoff = 1.0
+                # Пока не слушали, уведомления терялись — подписчики пусть перечитают состояние
+                for channel in list(self._callbacks):
+                    self._dispatch(channel, None)
+                await lost.wait()
+                logger.warning("LISTEN-соединение закрыто, переподключаемся")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("LISTEN недоступен (%s), повтор через %.0f с", e, backoff)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+
+pg_listener = PgListener()
@@ -0,0 +1,112 @@
+"""
+Импорт списка ПВЗ слиянием через промежуточную таблицу.
+
+Новый список копируется (COPY) во временную таблицу pvz_import, затем одной
+транзакцией сливается с pvz: новые ПВЗ вставляются, изменившиеся обновляются,
+отсутствующие в списке удаляются, неизменённые строки не трогаются (нет лишнего
+WAL и раздувания). До коммита читатели видят прежний список целиком.
+"""
+from __future__ import annotations
+
+from typing import Iterable, List, Mapping, NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.steps_bot.db.session import mark_writes
+from app.steps_bot.services.pvz_address import parse_address
+
+STAGING_TABLE = "pvz_import"
+_COLUMNS = ["id", "full_address", "city", "street", "search"]
+
+
+class PvzImportResult(NamedTuple):
+    total: int
+    inserted: int
+    updated: int
+    deleted: int
+
+    @property
+    def unchanged(self) -> int:
+        return self.total - self.inserted - self.updated
+
+
+class PvzImport:
+    """Загрузка списка ПВЗ порциями (stage) и слияние с таблицей pvz (merge)."""
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        self._created = False
+
+    async def _ensure_staging(self) -> None:
+        if self._created:
+            return
+        mark_writes(self.session)
+        # n — порядок строк: при повторе id побеждает последняя
+        await self.session.execute(
+            text(
+                f"CREATE TEMP TABLE {STAGING_TABLE} ("
+                "n bigserial, id varchar(64) NOT NULL, full_address varchar(255) NOT NULL, "
+                "city varchar(128), street varchar(255), search varchar(255)"
+                ") ON COMMIT DROP"
+            )
+        )
+        self._created = True
+
+    async def stage(self, items: Iterable[Mapping[str, str]]) -> int:
+        """Копирует порцию {"id", "full_address"} во временную таблицу; возвращает её размер."""
+        await self._ensure_staging()
+        records: List[tuple] = []
+        for item in items:
+            parsed = parse_address(item["full_address"])
+            records.append((item["id"], item["full_address"], parsed.city, parsed.street, parsed.search))
+        if not records:
+            return 0
+        conn = await self.session.connection()
+        raw = (await conn.get_raw_connection()).driver_connection
+        await raw.copy_records_to_table(STAGING_TABLE, records=records, columns=_COLUMNS)
+        return len(records)
+
+    async def merge(self) -> PvzImportResult:
+        """Сливает загруженное с pvz; ПВЗ, которых нет в загрузке, удаляются."""
+        await self._ensure_staging()
+        s = self.session
+        deleted = (
+            await s.execute(
+                text(
+                    f"DELETE FROM pvz p WHERE NOT EXISTS "
+                    f"(SELECT 1 FROM {STAGING_TABLE} i WHERE i.id = p.id)"
+                )
+            )
+        ).rowcount or 0
+
+        # xmax = 0 у только что вставленной строки; неизменённые строки WHERE отсекает
+        rows = (
+            await s.execute(
+                text(
+                    f"""
+                    INSERT INTO pvz (id, full_address, city, street, search)
+                    SELECT DISTINCT ON (id) id, full_address, city, street, search
+                    FROM {STAGING_TABLE}
+                    ORDER BY id, n DESC
+                    ON CONFLICT (id) DO UPDATE SET
+                        full_address = EXCLUDED.full_address,
+                        city = EXCLUDED.city,
+                        street = EXCLUDED.street,
+                        search = EXCLUDED.search
+                    WHERE (pvz.full_address, pvz.city, pvz.street, pvz.search)
+                        IS DISTINCT FROM
+                        (EXCLUDED.full_address, EXCLUDED.city, EXCLUDED.street, EXCLUDED.search)
+                    RETURNING (xmax = 0) AS inserted
+                    """
+                )
+            )
+        ).scalars().all()
+        inserted = sum(1 for r in rows if r)
+        total = await s.scalar(text(f"SELECT count(DISTINCT id) FROM {STAGING_TABLE}"))
+        return PvzImportResult(
+            total=int(total or 0),
+            inserted=inserted,
+            updated=len(rows) - inserted,
+            deleted=deleted,
+        )
@@ -1,14 +1,17 @@
 from __future__ import annotations
 
+import asyncio
 from contextlib import asynccontextmanager
-from typing import Any, Dict, List, Optional, Tuple
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
 from datetime import date as date_type
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, time, timezone, timedelta
 
-from sqlalchemy import select, delete
+from sqlalchemy import String, cast, event, func, literal_column, select, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.steps_bot.db.session import AsyncSessionLocal
+from app.steps_bot.db.session import RAW_WRITES_KEY, AsyncSessionLocal
+from app.steps_bot.db.identity import forget_users, resolve_user
 from app.steps_bot.db.models.catalog import (
     CatalogCategory,
     Order,
@@ -18,13 +21,130 @@ from app.steps_bot.db.models.catalog import (
 from app.steps_bot.db.models.user import User
 from app.steps_bot.db.models.family import Family
 from app.steps_bot.db.models.pvz import PVZ
+from app.steps_bot.db.pvz_import import PvzImport, PvzImportResult
+from app.steps_bot.services.pvz_address import normalize_text
+from app.steps_bot.settings import config
+
+
+class _UnitOfWork:
+    """Сессия апдейта: общая для всех get_session() в задаче, которая её открыла."""
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        self.owner = asyncio.current_task()
+        self.active = True
+        self.has_writes = False
+        event.listen(session.sync_session, "after_flush", self._on_flush)
+        event.listen(session.sync_session, "do_orm_execute", self._on_execute)
+
+    def _on_flush(self, _session, _flush_context) -> None:
+        self.has_writes = True
+
+    def _on_execute(self, state) -> None:
+        # ORM-выражения insert/update/delete; сырой SQL отмечается явно через mark_writes()
+        if state.is_insert or state.is_update or state.is_delete:
+            self.has_writes = True
+
+    def owns_current_task(self) -> bool:
+        return self.active and self.owner is asyncio.current_task()
+
+    def is_dirty(self) -> bool:
+        s = self.session
+        return (
+            self.has_writes
+            or bool(s.info.get(RAW_WRITES_KEY))
+            or bool(s.new or s.dirty or s.deleted)
+        )
+
+    async def commit(self) -> None:
+        """Коммитит текущую транзакцию апдейта; следующий запрос начнёт новую."""
+        s = self.session
+        if s.in_transaction():
+            await s.commit()
+        self.has_writes = False
+        s.info.pop(RAW_WRITES_KEY, None)
+
+
+_current_uow: ContextVar[Optional[_UnitOfWork]] = ContextVar("db_unit_of_work", default=None)
+
+
+@asynccontextmanager
+async def unit_of_work():
+    """
+    Одна сессия и одна транзакция на апдейт: вложенные get_session() переиспользуют
+    её, коммит — один раз в конце. Фоновые задачи, запущенные из апдейта, получают
+    собственные сессии.
+    """
+    session = AsyncSessionLocal()
+    uow = _UnitOfWork(session)
+    token = _current_uow.set(uow)
+    try:
+        yield session
+        await uow.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        uow.active = False
+        _current_uow.reset(token)
+        await session.close()
+
+
+async def commit_unit_of_work() -> None:
+    """
+    Коммитит транзакцию апдейта до его конца. Вызывается перед каждым запросом
+    к Telegram API (CommitBeforeRequestMiddleware): пользователь видит ответ
+    только после того, как данные записаны, а блокировки FOR UPDATE не держатся
+    на время сетевого вызова.
+    """
+    uow = _current_uow.get()
+    if uow is not None and uow.owns_current_task():
+        await uow.commit()
+
+
+@asynccontextmanager
+async def _nested_scope(uow: _UnitOfWork):
+    session = uow.session
+    if uow.is_dirty():
+        # Ошибка вызова откатывает только его изменения, сделанное ранее в апдейте остаётся
+        nested = await session.begin_nested()
+        try:
+            yield session
+        except Exception:
+            if nested.is_active:
+                await nested.rollback()
+            raise
+        if nested.is_active:
+            await nested.commit()
+        return
+
+    try:
+        yield session
+        await session.flush()
+    except Exception:
+        # До этого вызова апдейт ничего не менял: отцепляем загруженные объекты
+        # (чтобы они не протухли) и откатываем транзакцию целиком
+        session.expunge_all()
+        forget_users(session)
+        await session.rollback()
+        raise
 
 
 @asynccontextmanager
-async def get_session():
+async def get_session(isolated: bool = False):
     """
     Возвращает асинхронную сессию БД с автокоммитом/ролбэком.
+
+    Внутри unit_of_work() (апдейт бота) отдаёт сессию апдейта без отдельной транзакции;
+    isolated=True — всегда своя транзакция, которая коммитится сразу (начисления,
+    которые не должны зависеть от исхода остального апдейта).
     """
+    uow = None if isolated else _current_uow.get()
+    if uow is not None and uow.owns_current_task():
+        async with _nested_scope(uow) as session:
+            yield session
+        return
+
     session = AsyncSessionLocal()
     try:
         yield session
@@ -56,33 +176,14 @@ async def get_product_with_category(
     return product, category
 
 
-async def _resolve_user(session: AsyncSession, user_id_or_telegram: int) -> Optional[User]:
-    """
-    Возвращает пользователя по users.id или по users.telegram_id.
-    """
-    user = (
-        await session.execute(
-            select(User).where(User.id == user_id_or_telegram).limit(1)
-        )
-    ).scalar_one_or_none()
-    if user:
-        return user
-    user = (
-        await session.execute(
-            select(User).where(User.telegram_id == user_id_or_telegram).limit(1)
-        )
-    ).scalar_one_or_none()
-    return user
-
-
 async def get_user_with_family(
     session: AsyncSession,
     user_id: int,
 ) -> Tuple[User, Optional[Family], List[object]]:
     """
-    Возвращает пользователя и его семью по users.id или users.telegram_id.
+    Возвращает пользователя и его семью (user_id — TelegramId или UserId).
     """
-    user = await _resolve_user(session, user_id)
+    user = await resolve_user(session, user_id)
     if not user:
         raise ValueError("Пользователь не найден")
     family = None
@@ -95,6 +196,40 @@ async def get_user_with_family(
     return user, family, []
 
 
+def _family_total_query(family_id: int):
+    """
+    Баланс семьи + сумма балансов участников одним скалярным запросом
+    (участники суммируются по индексу users.family_id, ORM-объекты не грузятся).
+    """
+    members_sum = (
+        select(func.coalesce(func.sum(User.balance), 0))
+        .where(User.family_id == Family.id)
+        .correlate(Family)
+        .scalar_subquery()
+    )
+    return select(Family.balance + members_sum).where(Family.id == family_id)
+
+
+async def family_total_balance(session: AsyncSession, family_id: int) -> Optional[int]:
+    """
+    Возвращает суммарные баллы семьи или None, если семьи нет.
+    """
+    total = await session.scalar(_family_total_query(family_id))
+    return int(total) if total is not None else None
+
+
+async def spendable_points(session: AsyncSession, user: User) -> int:
+    """
+    Баллы, доступные пользователю для покупки: суммарные баллы семьи, если он в семье,
+    иначе личный баланс.
+    """
+    if user.family_id:
+        total = await family_total_balance(session, user.family_id)
+        if total is not None:
+            return total
+    return int(user.balance)
+
+
 async def family_points_enough(
     session: AsyncSession,
     family_id: int,
@@ -103,18 +238,8 @@ async def family_points_enough(
     """
     Проверяет достаточность суммарных баллов семьи: баланс семьи + сумма баллов участников.
     """
-    family = (
-        await session.execute(select(Family).where(Family.id == family_id).limit(1))
-    ).scalar_one_or_none()
-    if not family:
-        return False
-
-    members = (
-        await session.execute(select(User).where(User.family_id == family_id))
-    ).scalars().all()
-
-    total = int(family.balance) + sum(int(u.balance) for u in members)
-    return total >= int(amount)
+    total = await family_total_balance(session, family_id)
+    return total is not None and total >= int(amount)
 
 
 async def deduct_family_points_proportional(
@@ -173,9 +298,9 @@ async def create_order_with_item(
     recipient_last_name: str = "",
 ) -> Order:
     """
-    Создаёт заказ для реального users.id, найденного по id или telegram_id.
+    Создаёт заказ для пользователя (user_id — TelegramId или UserId).
     """
-    user = await _resolve_user(session, user_id)
+    user = await resolve_user(session, user_id)
     if not user:
         raise ValueError("Пользователь не найден")
     order = Order(
@@ -193,69 +318,88 @@ async def create_order_with_item(
     return order
 
 
-async def replace_pvz_list(session: AsyncSession, pvz_list: List[Dict[str, str]]) -> int:
+async def replace_pvz_list(session: AsyncSession, pvz_list: List[Dict[str, str]]) -> PvzImportResult:
     """
-    Удаляет все ПВЗ из БД и вставляет новый список.
+    Заменяет список ПВЗ новым: вставляет новые, обновляет изменившиеся и удаляет
+    отсутствующие в списке ПВЗ одной транзакцией (COPY во временную таблицу + слияние).
+    Город, улица и поисковая строка разбираются из full_address.
     
     Args:
         session: async сессия БД
         pvz_list: список словарей {"id": "...", "full_address": "..."}
     
     Returns:
-        количество сохраненных ПВЗ
+        итог импорта: всего, вставлено, обновлено, удалено
     """
-    # Удаляем все старые ПВЗ
-    await session.execute(delete(PVZ))
-    
-    # Вставляем новые
-    pvz_objects = [
-        PVZ(id=item["id"], full_address=item["full_address"])
-        for item in pvz_list
-    ]
-    session.add_all(pvz_objects)
-    await session.flush()
-    
-    return len(pvz_objects)
+    pvz_import = PvzImport(session)
+    await pvz_import.stage(pvz_list)
+    return await pvz_import.merge()
+
+
+async def _set_trgm_threshold(session: AsyncSession, name: str, value: float) -> None:
+    """Порог операторов pg_trgm до конца транзакции (set_config(..., is_local=true))."""
+    await session.execute(select(func.set_config(f"pg_trgm.{name}", str(value), True)))
 
 
-async def get_pvz_by_city(session: AsyncSession, city: str) -> List[PVZ]:
+async def resolve_pvz_city(session: AsyncSession, city: str) -> Optional[str]:
     """
-    Возвращает список ПВЗ, где full_address содержит город.
-    
-    Args:
-        session: async сессия БД
-        city: название города для фильтрации
+    Находит город из базы ПВЗ по вводу пользователя: точное совпадение поисковой
+    формы, иначе самый похожий по триграммам (опечатки, «ё»/«е»).
     
     Returns:
-        список объектов PVZ
+        город в поисковой форме или None
     """
-    query = select(PVZ).where(PVZ.full_address.ilike(f"%{city}%")).order_by(PVZ.full_address)
-    result = await session.execute(query)
-    return result.scalars().all()
+    query = normalize_text(city)
+    if not query:
+        return None
+    exact = await session.scalar(select(PVZ.city).where(PVZ.city == query).limit(1))
+    if exact is not None:
+        return exact
+
+    await _set_trgm_threshold(session, "similarity_threshold", config.PVZ_CITY_SIMILARITY)
+    return await session.scalar(
+        select(PVZ.city)
+        .where(PVZ.city.op("%")(query))
+        .group_by(PVZ.city)
+        .order_by(func.max(func.similarity(PVZ.city, query)).desc(), PVZ.city)
+        .limit(1)
+    )
 
 
-async def get_pvz_by_city_and_street(session: AsyncSession, city: str, street: str) -> List[PVZ]:
+async def search_pvz(
+    session: AsyncSession,
+    city: str,
+    street: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0,
+) -> Tuple[List[PVZ], int]:
     """
-    Возвращает список ПВЗ, отфильтрованный по городу и улице.
-    
-    Args:
-        session: async сессия БД
-        city: название города
-        street: название улицы или часть адреса
+    Страница ПВЗ города (city — результат resolve_pvz_city), при заданной улице —
+    ранжированная по сходству слов адреса с запросом.
     
     Returns:
-        список объектов PVZ, отсортированные по адресу
+        (ПВЗ страницы, всего найдено — не больше PVZ_SEARCH_LIMIT)
     """
-    query = (
-        select(PVZ)
-        .where(
-            PVZ.full_address.ilike(f"%{city}%"),
-            PVZ.full_address.ilike(f"%{street}%")
+    limit = config.PVZ_PAGE_SIZE if limit is None else limit
+    limit = max(0, min(limit, config.PVZ_SEARCH_LIMIT - offset))
+    conditions = [PVZ.city == city]
+    order_by = [PVZ.full_address]
+    if street:
+        query = normalize_text(street)
+        await _set_trgm_threshold(session, "word_similarity_threshold", config.PVZ_STREET_SIMILARITY)
+        # search %> запрос: word_similarity(запрос, search) выше порога, по GIN-индексу
+        conditions.append(PVZ.search.op("%>")(query))
+        order_by.insert(0, func.word_similarity(query, PVZ.search).desc())
+
+    total = func.count().over().label("total")
+    rows = (
+        await session.execute(
+            select(PVZ, total).where(*conditions).order_by(*order_by).limit(limit).offset(offset)
         )
-        .order_by(PVZ.full_address)
-    )
-    result = await session.execute(query)
-    return result.scalars().all()
+    ).all()
+    if not rows:
+        return [], 0
+    return [pvz for pvz, _ in rows], min(int(rows[0].total), config.PVZ_SEARCH_LIMIT)
 
 
 def _parse_full_name(full_name: str) -> tuple[str, str]:
@@ -283,68 +427,118 @@ def _parse_full_name(full_name: str) -> tuple[str, str]:
     return "", ""
 
 
-async def get_orders_between(
-    session: AsyncSession,
+ORDER_EXPORT_FIELDS = (
+    "first_name",
+    "last_name",
+    "phone",
+    "email",
+    "pvz_id",
+    "order_id",
+    "created_at",
+    "product_code",
+)
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class OrderCursor(NamedTuple):
+    """Позиция в выгрузке заказов: (created_at, id заказа, id позиции); строкой — «мкс:id:id»."""
+    created_at: datetime
+    order_id: int
+    item_id: int
+
+    def encode(self) -> str:
+        micros = (self.created_at - _EPOCH) // timedelta(microseconds=1)
+        return f"{micros}:{self.order_id}:{self.item_id}"
+
+    @classmethod
+    def decode(cls, value: str) -> "OrderCursor":
+        micros, order_id, item_id = value.split(":")
+        return cls(_EPOCH + timedelta(microseconds=int(micros)), int(order_id), int(item_id))
+
+
+def _orders_between_query(
     date_from: date_type,
     date_to: date_type,
-) -> List[Dict[str, Any]]:
+    after: Optional[OrderCursor] = None,
+    with_cursor: bool = False,
+):
     """
-    Возвращает список заказов за диапазон дат с необходимыми полями.
-    Включает все заказы от начала date_from до конца дня date_to.
+    Заказы за диапазон дат (от начала date_from до конца дня date_to), от новых к старым.
+    Поля выгрузки готовятся в SQL: пустые строки вместо NULL, created_at — время MSK
+    (UTC+3) без микросекунд и зоны.
     """
-    from datetime import datetime, time
-    
-    # Конвертируем даты в datetime с временем
     start_datetime = datetime.combine(date_from, time.min)
     end_datetime = datetime.combine(date_to, time.max)
-    
+    msk_created_at = func.timezone(literal_column("INTERVAL '3 hours'"), Order.created_at)
+
+    columns = [
+        func.coalesce(Order.recipient_first_name, "").label("first_name"),
+        func.coalesce(Order.recipient_last_name, "").label("last_name"),
+        func.coalesce(User.phone, "").label("phone"),
+        func.coalesce(User.email, "").label("email"),
+        func.coalesce(Order.pvz_id, "").label("pvz_id"),
+        cast(Order.id, String).label("order_id"),
+        func.to_char(msk_created_at, 'YYYY-MM-DD"T"HH24:MI:SS').label("created_at"),
+        func.coalesce(Product.product_code, "").label("product_code"),
+    ]
+    if with_cursor:
+        columns += [
+            Order.created_at.label("cursor_created_at"),
+            Order.id.label("cursor_order_id"),
+            OrderItem.id.label("cursor_item_id"),
+        ]
+
     query = (
-        select(
-            Order.recipient_first_name,
-            Order.recipient_last_name,
-            User.phone,
-            User.email,
-            Order.id,
-            Order.pvz_id,
-            Order.created_at,
-            Product.product_code
-        )
+        select(*columns)
+        .select_from(User)
         .join(Order, Order.user_id == User.id)
         .join(OrderItem, OrderItem.order_id == Order.id)
         .join(Product, Product.id == OrderItem.product_id)
         .where(Order.created_at >= start_datetime)
         .where(Order.created_at <= end_datetime)
-        .order_by(Order.created_at.desc())
+        .order_by(Order.created_at.desc(), Order.id.desc(), OrderItem.id.desc())
     )
-    
-    result = await session.execute(query)
-    rows = result.all()
-    
-    # MSK timezone (UTC+3)
-    msk_tz = timezone(timedelta(hours=3))
-    
-    orders = []
-    for row in rows:
-        first_name, last_name, phone, email, order_id, pvz_id, created_at, product_code = row
-        
-        # Форматируем время в MSK без микросекунд
-        if created_at:
-            # Конвертируем UTC в MSK
-            msk_time = created_at.astimezone(msk_tz)
-            # Форматируем без микросекунд и часового пояса
-            created_at_str = msk_time.strftime("%Y-%m-%dT%H:%M:%S")
-        else:
-            created_at_str = ""
-        
-        orders.append({
-            "first_name": first_name or "",
-            "last_name": last_name or "",
-            "phone": phone or "",
-            "email": email or "",
-            "pvz_id": pvz_id or "",
-            "order_id": str(order_id),
-            "created_at": created_at_str,
-            "product_code": str(product_code) if product_code else "",
-        })
-    
-    return orders
+    if after is not None:
+        query = query.where(
+            tuple_(Order.created_at, Order.id, OrderItem.id)
+            < tuple_(after.created_at, after.order_id, after.item_id)
+        )
+    return query
+
+
+async def iter_orders_between(
+    session: AsyncSession,
+    date_from: date_type,
+    date_to: date_type,
+    batch_size: int = 1000,
+) -> AsyncIterator[Dict[str, str]]:
+    """
+    Заказы за диапазон дат через серверный курсор: в памяти не больше batch_size строк.
+    Сессия должна оставаться открытой, пока итератор не исчерпан.
+    """
+    query = _orders_between_query(date_from, date_to).execution_options(yield_per=batch_size)
+    result = await session.stream(query)
+    async for row in result.mappings():
+        yield dict(row)
+
+
+async def get_orders_page(
+    session: AsyncSession,
+    date_from: date_type,
+    date_to: date_type,
+    limit: int,
+    after: Optional[OrderCursor] = None,
+) -> Tuple[List[Dict[str, str]], Optional[OrderCursor]]:
+    """
+    Страница заказов за диапазон дат после курсора after.
+    Возвращает (строки, курсор следующей страницы или None).
+    """
+    query = _orders_between_query(date_from, date_to, after, with_cursor=True).limit(limit + 1)
+    rows = (await session.execute(query)).mappings().all()
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = OrderCursor(last["cursor_created_at"], last["cursor_order_id"], last["cursor_item_id"])
+    return [{name: row[name] for name in ORDER_EXPORT_FIELDS} for row in rows[:limit]], next_cursor
+
@@ -1,6 +1,11 @@
+import time
+from uuid import uuid4
+
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
+from app.steps_bot import metrics
 from app.steps_bot.settings import config
 
 DATABASE_URL = (
@@ -8,7 +13,76 @@ DATABASE_URL = (
     f'@{config.POSTGRES_HOST}:{config.POSTGRES_PORT}/{config.POSTGRES_DB}'
 )
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+checkout_wait = metrics.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Ожидание соединения из пула",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, замеряющий время ожидания свободного соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            checkout_wait.observe(time.perf_counter() - started)
+
+
+def _engine_kwargs() -> dict:
+    connect_args = {"command_timeout": config.DB_COMMAND_TIMEOUT}
+    if config.DB_PGBOUNCER:
+        # PgBouncer в transaction-режиме: подготовленные выражения не переживают смену
+        # серверного соединения — кэш выключаем, имена делаем уникальными, пул держит PgBouncer
+        connect_args.update(
+            statement_cache_size=0,
+            prepared_statement_cache_size=0,
+            prepared_statement_name_func=lambda: f"__asyncpg_{uuid4()}__",
+        )
+        return {"poolclass": NullPool, "connect_args": connect_args}
+
+    connect_args.update(
+        statement_cache_size=config.DB_STATEMENT_CACHE_SIZE,
+        prepared_statement_cache_size=config.DB_STATEMENT_CACHE_SIZE,
+    )
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
+
+
+engine = create_async_engine(DATABASE_URL, echo=False, **_engine_kwargs())
 AsyncSessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
+
+# Флаг в session.info: сессия выполнила DML в обход ORM (text(), COPY)
+RAW_WRITES_KEY = "has_raw_writes"
+
+
+def mark_writes(session: AsyncSession) -> None:
+    """
+    Отмечает, что в транзакции сессии есть изменения, которых ORM не видит
+    (text() с INSERT/UPDATE/DELETE, COPY, pg_notify): unit of work не должен
+    считать такую транзакцию чистой и откатывать её целиком.
+    """
+    session.info[RAW_WRITES_KEY] = True
+
+
+def _pool_stat(name: str) -> float:
+    pool = engine.sync_engine.pool
+    fn = getattr(pool, name, None)
+    return fn() if fn is not None else 0
+
+
+metrics.gauge("db_pool_size", "Размер пула соединений", fn=lambda: _pool_stat("size"))
+metrics.gauge("db_pool_checked_out", "Соединения, выданные из пула", fn=lambda: _pool_stat("checkedout"))
+metrics.gauge("db_pool_checked_in", "Свободные соединения в пуле", fn=lambda: _pool_stat("checkedin"))
+metrics.gauge("db_pool_overflow", "Соединения сверх pool_size", fn=lambda: _pool_stat("overflow"))
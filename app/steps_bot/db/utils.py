@@ -1,2 +1,14 @@
+from sqlalchemy.types import UserDefinedType
+
+
 def enum_values(enum_cls):
     return [member.value for member in enum_cls]
+
+
+class XID8(UserDefinedType):
+    """64-битный идентификатор транзакции Postgres (xid8); в Python — int."""
+
+    cache_ok = True
+
+    def get_col_spec(self, **kw) -> str:
+        return "xid8"
@@ -3,6 +3,7 @@ from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.client.default import DefaultBotProperties
 
 from app.steps_bot.settings import config
+from app.steps_bot.middlewares.db_session import CommitBeforeRequestMiddleware, DbSessionMiddleware
 from app.steps_bot.handlers import start
 from app.steps_bot.handlers import back
 from app.steps_bot.handlers import walk
@@ -25,7 +26,9 @@ bot = Bot(
     token=config.BOT_TOKEN,
     default=DefaultBotProperties(parse_mode='HTML')
 )
+bot.session.middleware(CommitBeforeRequestMiddleware())
 dp = Dispatcher(storage=MemoryStorage())
+dp.update.middleware(DbSessionMiddleware())
 
 dp.include_router(start.router)
 dp.include_router(back.router)
@@ -14,6 +14,9 @@ from app.steps_bot.services.buy_service import (
     ensure_purchase_allowed,
 )
 from app.steps_bot.db import repo
+from app.steps_bot.db.identity import TelegramId, resolve_user
+from app.steps_bot.services import pvz_index
+from app.steps_bot.settings import config
 from app.steps_bot.services.validators import (
     normalize_phone,
     validate_address,
@@ -29,18 +32,34 @@ from app.steps_bot.states.order import OrderInput, OrderStates
 router = Router()
 
 
-def pvz_list_kb(items: list[Any], page: int = 0) -> InlineKeyboardBuilder:
+def pvz_list_kb(items: list[Any], page: int = 0, total: int | None = None) -> InlineKeyboardBuilder:
     """
     Возвращает клавиатуру выбора ПВЗ из локального списка.
     
     Args:
-        items: список объектов PVZ из БД
-        page: номер страницы (для совместимости)
+        items: ПВЗ текущей страницы
+        page: номер страницы
+        total: всего найдено ПВЗ; если больше страницы — добавляются кнопки листания
     """
     kb = InlineKeyboardBuilder()
     for item in items:
         kb.button(text=f"📍 {item.full_address[:40]}", callback_data=f"pvz:{item.id}")
-    kb.adjust(1)
+    sizes = [1] * len(items)
+
+    page_size = config.PVZ_PAGE_SIZE
+    if total is not None and total > page_size:
+        pages = (total + page_size - 1) // page_size
+        nav = 0
+        if page > 0:
+            kb.button(text="◀️", callback_data=f"pvzp:{page - 1}")
+            nav += 1
+        kb.button(text=f"{page + 1}/{pages}", callback_data="pvzp:noop")
+        nav += 1
+        if page + 1 < pages:
+            kb.button(text="▶️", callback_data=f"pvzp:{page + 1}")
+            nav += 1
+        sizes.append(nav)
+    kb.adjust(*sizes)
     return kb
 
 
@@ -115,7 +134,7 @@ async def on_buy_click(callback: CallbackQuery, state: FSMContext) -> None:
         await callback.answer("Ошибка данных товара", show_alert=True)
         return
 
-    allowed, msg = await ensure_purchase_allowed(callback.from_user.id, product_id)
+    allowed, msg = await ensure_purchase_allowed(TelegramId(callback.from_user.id), product_id)
     if not allowed:
         await callback.answer(msg, show_alert=True)
         return
@@ -169,19 +188,19 @@ async def on_delivery_type(callback: CallbackQuery, state: FSMContext) -> None:
 @router.message(OrderStates.entering_city, F.text.len() > 0)
 async def on_city_entered(message: Message, state: FSMContext) -> None:
     """
-    Обрабатывает ввод города.
-    Если ПВЗ <= 10, показывает их сразу.
-    Если ПВЗ > 10, просит уточнить улицу.
+    Обрабатывает ввод города (с опечатками и «ё»/«е»).
+    Если ПВЗ <= PVZ_CITY_LIST_MAX, показывает их сразу.
+    Иначе просит уточнить улицу.
     """
     city = message.text.strip()
     if not validate_city(city):
         await message.answer("Город указан некорректно. Повторите ввод.", reply_markup=back_to_delivery_kb().as_markup())
         return
 
-    # Получаем ПВЗ из локальной БД
+    # Ищем ПВЗ в индексе процесса (с запасным поиском в БД)
     try:
-        async with repo.get_session() as session:
-            pvz_list = await repo.get_pvz_by_city(session, city)
+        pvz_city = await pvz_index.resolve_pvz_city(city)
+        pvz_list, total = await pvz_index.search_pvz(pvz_city) if pvz_city else ([], 0)
     except Exception as e:
         await message.answer(
             f"Ошибка при получении списка ПВЗ: {escape(str(e))}",
@@ -196,19 +215,13 @@ async def on_city_entered(message: Message, state: FSMContext) -> None:
         )
         return
 
-    await state.update_data(city=city)
+    await state.update_data(city=city, pvz_city=pvz_city, pvz_street=None)
 
-    # Если ПВЗ 10 или меньше - показываем сразу
-    if len(pvz_list) <= 10:
-        kb = pvz_list_kb(pvz_list)
-        kb.button(text="↩", callback_data="order:back")
-        await message.answer(
-            "Выберите пункт выдачи:",
-            reply_markup=kb.as_markup(),
-        )
-        await state.set_state(OrderStates.entering_pvz_or_address)
+    # Если ПВЗ немного - показываем сразу
+    if total <= config.PVZ_CITY_LIST_MAX:
+        await _show_pvz_page(message, state, pvz_list, total)
     else:
-        # Если больше 10 - просим уточнить улицу
+        # Если больше - просим уточнить улицу
         await message.answer(
             "Укажите улицу удобного ПВЗ Яндекс Маркета для получателя (например: Ленина):"
         )
@@ -218,7 +231,7 @@ async def on_city_entered(message: Message, state: FSMContext) -> None:
 @router.message(OrderStates.entering_street, F.text.len() > 0)
 async def on_street_entered(message: Message, state: FSMContext) -> None:
     """
-    Обрабатывает ввод улицы и фильтрует ПВЗ.
+    Обрабатывает ввод улицы и ищет ПВЗ города по сходству адреса.
     """
     street = message.text.strip()
     if not street or len(street) < 2:
@@ -226,16 +239,15 @@ async def on_street_entered(message: Message, state: FSMContext) -> None:
         return
 
     data = await state.get_data()
-    city = data.get("city")
+    pvz_city = data.get("pvz_city")
 
-    if not city:
+    if not pvz_city:
         await message.answer("Сессия устарела, начните заново.", reply_markup=back_to_delivery_kb().as_markup())
         return
 
     # Получаем ПВЗ, отфильтрованные по городу и улице
     try:
-        async with repo.get_session() as session:
-            pvz_list = await repo.get_pvz_by_city_and_street(session, city, street)
+        pvz_list, total = await pvz_index.search_pvz(pvz_city, street)
     except Exception as e:
         await message.answer(
             f"Ошибка при получении списка ПВЗ: {escape(str(e))}",
@@ -250,7 +262,13 @@ async def on_street_entered(message: Message, state: FSMContext) -> None:
         )
         return
 
-    kb = pvz_list_kb(pvz_list)
+    await state.update_data(pvz_street=street)
+    await _show_pvz_page(message, state, pvz_list, total)
+
+
+async def _show_pvz_page(message: Message, state: FSMContext, pvz_list: list[Any], total: int) -> None:
+    """Отправляет первую страницу найденных ПВЗ и переводит к выбору."""
+    kb = pvz_list_kb(pvz_list, page=0, total=total)
     kb.button(text="↩", callback_data="order:back")
     await message.answer(
         "Выберите пункт выдачи:",
@@ -259,6 +277,38 @@ async def on_street_entered(message: Message, state: FSMContext) -> None:
     await state.set_state(OrderStates.entering_pvz_or_address)
 
 
+@router.callback_query(OrderStates.entering_pvz_or_address, F.data.startswith("pvzp:"))
+async def on_pvz_page(callback: CallbackQuery, state: FSMContext) -> None:
+    """
+    Листает найденные ПВЗ: повторяет поиск по городу/улице из состояния со смещением.
+    """
+    _, page_str = callback.data.split(":")
+    if not page_str.isdigit():
+        await callback.answer()
+        return
+    page = int(page_str)
+
+    data = await state.get_data()
+    pvz_city = data.get("pvz_city")
+    if not pvz_city:
+        await callback.answer("Сессия устарела, начните заново", show_alert=True)
+        return
+
+    pvz_list, total = await pvz_index.search_pvz(
+        pvz_city,
+        data.get("pvz_street"),
+        offset=page * config.PVZ_PAGE_SIZE,
+    )
+    if not pvz_list:
+        await callback.answer("Список ПВЗ изменился, начните заново", show_alert=True)
+        return
+
+    kb = pvz_list_kb(pvz_list, page=page, total=total)
+    kb.button(text="↩", callback_data="order:back")
+    await callback.message.edit_reply_markup(reply_markup=kb.as_markup())
+    await callback.answer()
+
+
 @router.callback_query(F.data.startswith("pvz:"))
 async def on_pvz_choose(callback: CallbackQuery, state: FSMContext) -> None:
     """
@@ -295,7 +345,7 @@ async def on_full_name(message: Message, state: FSMContext) -> None:
     current_email = ""
     try:
         async with repo.get_session() as session:
-            user = await repo._resolve_user(session, message.from_user.id)
+            user = await resolve_user(session, TelegramId(message.from_user.id))
             if user:
                 current_phone = user.phone or ""
                 current_email = user.email or ""
@@ -331,7 +381,7 @@ async def on_phone(message: Message, state: FSMContext) -> None:
     current_email = ""
     try:
         async with repo.get_session() as session:
-            user = await repo._resolve_user(session, message.from_user.id)
+            user = await resolve_user(session, TelegramId(message.from_user.id))
             if user and user.email:
                 current_email = user.email
     except Exception:
@@ -431,13 +481,13 @@ async def on_confirm(callback: CallbackQuery, state: FSMContext) -> None:
         await callback.answer()
         return
 
-    allowed, msg = await ensure_purchase_allowed(callback.from_user.id, product_id)
+    allowed, msg = await ensure_purchase_allowed(TelegramId(callback.from_user.id), product_id)
     if not allowed:
         await callback.message.edit_text(msg)
         await callback.answer()
         return
 
-    user_id = callback.from_user.id
+    user_id = TelegramId(callback.from_user.id)
 
     try:
         info_dict = await finalize_successful_order(
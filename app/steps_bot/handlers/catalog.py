@@ -11,7 +11,9 @@ from app.steps_bot.presentation.keyboards.generic_kb import (
     catalog_page_kb,
     product_card_kb,
 )
+from app.steps_bot.db.identity import TelegramId
 from app.steps_bot.services.catalog_service import (
+    get_available_points,
     get_categories,
     get_category_page,
     get_product,
@@ -46,7 +48,8 @@ async def category_page(callback: CallbackQuery):
         return
 
     pages = max(1, ceil(total / PER_PAGE))
-    kb = catalog_page_kb(products, cat_id, page, pages)
+    available = await get_available_points(TelegramId(callback.from_user.id))
+    kb = catalog_page_kb(products, cat_id, page, pages, available)
 
     await callback.message.delete()
     await callback.message.answer("Список доступных товаров:", reply_markup=kb)
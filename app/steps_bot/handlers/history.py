@@ -1,34 +1,41 @@
 from __future__ import annotations
 
+from typing import Optional
+
 from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import CallbackQuery
 
+from app.steps_bot.db.identity import TelegramId
 from app.steps_bot.db.repo import get_session
 from app.steps_bot.db.models.ledger import OwnerType
-from app.steps_bot.presentation.keyboards.simple_kb import back_kb
-from app.steps_bot.services.ledger_service import get_history_for_user_with_family
+from app.steps_bot.presentation.keyboards.generic_kb import history_kb
+from app.steps_bot.services.ledger_service import HistoryCursor, get_history_page
 
 router = Router()
 
+HISTORY_PAGE_SIZE = 20
 
-@router.callback_query(F.data == "history")
-async def show_history(callback: CallbackQuery) -> None:
-    """
-    Показывает последние операции по пользователю и его семье.
-    """
-    user_id = callback.from_user.id
+
+async def _render_history(
+    callback: CallbackQuery,
+    before: Optional[HistoryCursor] = None,
+    after: Optional[HistoryCursor] = None,
+) -> None:
     async with get_session() as session:
-        user, family, entries = await get_history_for_user_with_family(
+        page = await get_history_page(
             session=session,
-            user_id_or_telegram=user_id,
-            limit=20,
+            user_id_or_telegram=TelegramId(callback.from_user.id),
+            limit=HISTORY_PAGE_SIZE,
+            before=before,
+            after=after,
         )
 
     lines = []
-    if not entries:
+    if not page.entries:
         text = "История пуста"
     else:
-        for e in entries:
+        for e in page.entries:
             sign = "➕" if e.amount > 0 else "➖"
             owner = "Семья" if e.owner_type == OwnerType.FAMILY else "Вы"
             title = e.title or ""
@@ -37,5 +44,39 @@ async def show_history(callback: CallbackQuery) -> None:
             lines.append(f"{sign} {owner}: {title} · {amount_abs}{tail}")
         text = "\n".join(lines)
 
-    await callback.message.edit_text(text, reply_markup=back_kb)
+    kb = history_kb(
+        page.older.encode() if page.older else None,
+        page.newer.encode() if page.newer else None,
+    )
+    try:
+        await callback.message.edit_text(text, reply_markup=kb)
+    except TelegramBadRequest:
+        # Повторное нажатие на ту же страницу — сообщение не изменилось
+        pass
     await callback.answer()
+
+
+@router.callback_query(F.data == "history")
+async def show_history(callback: CallbackQuery) -> None:
+    """
+    Показывает последние операции по пользователю и его семье.
+    """
+    await _render_history(callback)
+
+
+@router.callback_query(F.data.startswith("hist:"))
+async def page_history(callback: CallbackQuery) -> None:
+    """
+    Листает историю: hist:o:<курсор> — операции раньше курсора, hist:n:<курсор> — позже.
+    """
+    _, direction, cursor = callback.data.split(":", 2)
+    try:
+        cursor = HistoryCursor.decode(cursor)
+    except (ValueError, OverflowError):
+        # Испорченная кнопка: показываем последние операции
+        await _render_history(callback)
+        return
+    if direction == "o":
+        await _render_history(callback, before=cursor)
+    else:
+        await _render_history(callback, after=cursor)
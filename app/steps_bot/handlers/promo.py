@@ -2,6 +2,7 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery
 
 from app.steps_bot.presentation.keyboards.generic_kb import promo_groups_kb
+from app.steps_bot.db.identity import TelegramId
 from app.steps_bot.services.promo_service import list_active_groups, purchase_and_acquire_code_family
 from app.steps_bot.services.captions_service import render
 
@@ -39,7 +40,7 @@ async def give_promo_code(cb: CallbackQuery) -> None:
         await cb.answer("Некорректная группа", show_alert=True)
         return
 
-    code, group, err = await purchase_and_acquire_code_family(group_id, cb.from_user.id)
+    code, group, err = await purchase_and_acquire_code_family(group_id, TelegramId(cb.from_user.id))
     if err:
         await cb.answer(err, show_alert=True)
         return
@@ -0,0 +1,52 @@
+"""
+Архивирование старых месячных секций журнала ledger_entries.
+
+Запуск:
+    python -m app.steps_bot.ledger_archive [--before 2025-01] [--dir ledger_archive] [--dry-run]
+
+По умолчанию архивируются секции старше LEDGER_RETENTION_MONTHS месяцев.
+"""
+import argparse
+import asyncio
+import datetime as dt
+import logging
+from pathlib import Path
+
+from app.steps_bot.services.ledger_checkpoints import checkpoint_ledger
+from app.steps_bot.services.ledger_partitions import (
+    add_months,
+    archive_ledger_partitions,
+    month_start,
+)
+from app.steps_bot.settings import config
+
+
+def _parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Архивирование секций ledger_entries")
+    parser.add_argument("--before", help="Архивировать секции до этого месяца (YYYY-MM)")
+    parser.add_argument("--dir", default=config.LEDGER_ARCHIVE_DIR, help="Каталог для .csv.gz")
+    parser.add_argument("--dry-run", action="store_true", help="Только показать секции")
+    return parser.parse_args()
+
+
+async def _main() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    )
+    args = _parse_args()
+    if args.before:
+        before = dt.datetime.strptime(args.before, "%Y-%m").date()
+    else:
+        today = dt.datetime.now(dt.timezone.utc).date()
+        before = add_months(month_start(today), -config.LEDGER_RETENTION_MONTHS)
+
+    # Сначала догоняем снимок, чтобы архивируемые проводки уже были в итогах
+    await checkpoint_ledger()
+    archived = await archive_ledger_partitions(before, Path(args.dir), dry_run=args.dry_run)
+    for part in archived:
+        print(f"{part.name}\t{part.rows}\t{part.path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -1,11 +1,23 @@
+import asyncio
+import contextlib
 import logging
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from contextlib import asynccontextmanager
 
+from app.steps_bot import metrics
+from app.steps_bot.api.admin import validate_api_key
+from app.steps_bot.db.notify import pg_listener
 from app.steps_bot.dispatcher import bot
 from app.steps_bot.settings import config
 from app.steps_bot.presentation.commands import set_default_commands
+from app.steps_bot.services.broadcast_service import run_broadcast_scheduler
+from app.steps_bot.services.ledger_checkpoints import run_ledger_maintenance
+from app.steps_bot.services.coefficients_service import subscribe_coefficient_changes
+from app.steps_bot.services.pvz_index import subscribe_pvz_changes
+from app.steps_bot.services.walk_reaper import run_walk_reaper
+from app.steps_bot.services.weather_service import close_weather_client
+from app.steps_bot.storage.walk_sessions import walk_sessions
 from app.steps_bot.webhooks import telegram_webhook
 
 logging.basicConfig(
@@ -18,15 +30,42 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    if telegram_webhook.shard_router is not None and not config.WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET is required in sharded mode")
     try:
         logger.info("Setting webhook...")
-        await bot.set_webhook(config.WEBHOOK_URL)
+        await bot.set_webhook(config.WEBHOOK_URL, secret_token=config.WEBHOOK_SECRET)
         logger.info(f"Webhook set to: {config.WEBHOOK_URL}")
         await set_default_commands(bot)
     except Exception as e:
         logger.error(f"Failed to set webhook: {e}")
+    reaper = None
+    if telegram_webhook.shard_router is None:
+        await walk_sessions.start()
+        reaper = asyncio.create_task(run_walk_reaper(bot))
+    else:
+        logger.info(f"Routing updates to {telegram_webhook.shard_router.shard_count} shards")
+    # Рассылки ведёт процесс вебхука (и в шардированном режиме): один лимит Telegram на бота
+    subscribe_pvz_changes()
+    subscribe_coefficient_changes()
+    await pg_listener.start()
+    broadcasts = asyncio.create_task(run_broadcast_scheduler())
+    ledger = asyncio.create_task(run_ledger_maintenance())
     yield
     logger.info("Shutting down...")
+    for task in (broadcasts, ledger):
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await pg_listener.close()
+    if telegram_webhook.shard_router is None:
+        reaper.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await reaper
+        await walk_sessions.close()
+        await close_weather_client()
+    else:
+        await telegram_webhook.shard_router.close()
     try:
         await bot.delete_webhook()
     except Exception as e:
@@ -37,3 +76,10 @@ async def lifespan(app: FastAPI):
 app = FastAPI(lifespan=lifespan)
 
 app.include_router(telegram_webhook.router)
+
+
+# Метрики процесса — только с ключом админ-API (заголовок API_Key / API-Key)
+@app.get('/metrics', dependencies=[Depends(validate_api_key)])
+async def get_metrics():
+    return metrics.snapshot()
+
@@ -0,0 +1,123 @@
+"""
+Простые внутрипроцессные метрики (счётчики, датчики и гистограммы) для мониторинга.
+
+Снимок отдаётся эндпоинтом GET /metrics вебхук-приложения и воркеров (с ключом API_KEY).
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Callable, Dict, Optional, Sequence
+
+
+class Counter:
+    """Монотонно растущий счётчик."""
+    __slots__ = ("name", "description", "value")
+
+    def __init__(self, name: str, description: str = "") -> None:
+        self.name = name
+        self.description = description
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    """Текущее значение: задаётся явно или вычисляется функцией при снятии снимка."""
+    __slots__ = ("name", "description", "value", "_fn")
+
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        fn: Optional[Callable[[], float]] = None,
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.value: float = 0
+        self._fn = fn
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def read(self) -> float:
+        return self._fn() if self._fn is not None else self.value
+
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Распределение значений (обычно задержек в секундах) по корзинам «не больше le»."""
+    __slots__ = ("name", "description", "buckets", "counts", "count", "sum")
+
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        # Последняя ячейка — значения больше самой верхней границы (+Inf)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def read(self) -> Dict[str, object]:
+        cumulative = 0
+        buckets: Dict[str, int] = {}
+        for le, n in zip(self.buckets, self.counts):
+            cumulative += n
+            buckets[str(le)] = cumulative
+        buckets["+Inf"] = self.count
+        return {"count": self.count, "sum": round(self.sum, 6), "buckets": buckets}
+
+
+_registry: Dict[str, object] = {}
+
+
+def counter(name: str, description: str = "") -> Counter:
+    metric = _registry.get(name)
+    if metric is None:
+        metric = _registry[name] = Counter(name, description)
+    return metric
+
+
+def gauge(
+    name: str,
+    description: str = "",
+    fn: Optional[Callable[[], float]] = None,
+) -> Gauge:
+    metric = _registry.get(name)
+    if metric is None:
+        metric = _registry[name] = Gauge(name, description, fn)
+    return metric
+
+
+def histogram(
+    name: str,
+    description: str = "",
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+) -> Histogram:
+    metric = _registry.get(name)
+    if metric is None:
+        metric = _registry[name] = Histogram(name, description, buckets)
+    return metric
+
+
+def snapshot() -> Dict[str, object]:
+    """Возвращает текущие значения всех метрик."""
+    result: Dict[str, object] = {}
+    for name, metric in _registry.items():
+        if isinstance(metric, (Gauge, Histogram)):
+            result[name] = metric.read()
+        else:
+            result[name] = metric.value
+    return result
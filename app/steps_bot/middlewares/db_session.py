@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from app.steps_bot.db.repo import commit_unit_of_work, unit_of_work
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Открывает одну сессию БД на апдейт и коммитит её один раз после обработчика.
+
+    Сессия доступна обработчикам как аргумент session, а сервисы получают её
+    через get_session() — без отдельного соединения и BEGIN/COMMIT на каждый вызов.
+    Если обработчик обращается к Telegram API, транзакция коммитится раньше —
+    перед запросом (CommitBeforeRequestMiddleware).
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        async with unit_of_work() as session:
+            data["session"] = session
+            return await handler(event, data)
+
+
+class CommitBeforeRequestMiddleware(BaseRequestMiddleware):
+    """
+    Коммитит транзакцию апдейта перед каждым запросом бота к Telegram API:
+    ответ уходит только после записи данных, и блокировки строк не держатся,
+    пока идёт сетевой вызов. Вне апдейта (фоновые задачи) ничего не делает.
+    """
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> TelegramType:
+        await commit_unit_of_work()
+        return await make_request(bot, method)
@@ -1,8 +1,15 @@
 import asyncio
 import logging
 
+from app.steps_bot.db.notify import pg_listener
 from app.steps_bot.dispatcher import dp, bot
-from app.steps_bot.services.broadcast_service import run_broadcast_worker_once
+from app.steps_bot.services.broadcast_service import run_broadcast_scheduler
+from app.steps_bot.services.ledger_checkpoints import run_ledger_maintenance
+from app.steps_bot.services.coefficients_service import subscribe_coefficient_changes
+from app.steps_bot.services.pvz_index import subscribe_pvz_changes
+from app.steps_bot.services.walk_reaper import run_walk_reaper
+from app.steps_bot.services.weather_service import close_weather_client
+from app.steps_bot.storage.walk_sessions import walk_sessions
 
 
 async def _main() -> None:
@@ -16,18 +23,21 @@ async def _main() -> None:
     except Exception as e:
         logging.warning("delete_webhook failed: %s", e)
 
-    async def scheduler():
-        while True:
-            try:
-                await run_broadcast_worker_once()
-            except Exception as e:
-                logging.error("broadcast worker error: %s", e)
-            await asyncio.sleep(60)
-
-    await asyncio.gather(
-        dp.start_polling(bot),
-        scheduler(),
-    )
+    await walk_sessions.start()
+    subscribe_pvz_changes()
+    subscribe_coefficient_changes()
+    await pg_listener.start()
+    try:
+        await asyncio.gather(
+            dp.start_polling(bot),
+            run_broadcast_scheduler(),
+            run_ledger_maintenance(),
+            run_walk_reaper(bot),
+        )
+    finally:
+        await pg_listener.close()
+        await walk_sessions.close()
+        await close_weather_client()
 
 
 if __name__ == "__main__":
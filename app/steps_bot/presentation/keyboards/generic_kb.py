@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from math import ceil
-from typing import List
+from typing import List, Optional
 
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
@@ -128,10 +128,17 @@ def catalog_page_kb(
     products: List[Product],
     cat_id: int,
     page: int,
-    pages: int
+    pages: int,
+    available_points: Optional[int] = None,
 ) -> InlineKeyboardMarkup:
+    def mark(p: Product) -> str:
+        # Без известного баланса — прежняя иконка; иначе отмечаем, хватает ли баллов
+        if available_points is None:
+            return "🛒"
+        return "🛒" if available_points >= int(p.price) else "🔒"
+
     rows: list[list[InlineKeyboardButton]] = [
-        [InlineKeyboardButton(text=f"🛒 {p.title}", callback_data=f"product:{p.id}:{cat_id}:{page}")]
+        [InlineKeyboardButton(text=f"{mark(p)} {p.title}", callback_data=f"product:{p.id}:{cat_id}:{page}")]
         for p in products
     ]
 
@@ -147,6 +154,17 @@ def catalog_page_kb(
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+# История операций: листание по курсору (created_at, id)
+def history_kb(older: Optional[str], newer: Optional[str]) -> InlineKeyboardMarkup:
+    nav: list[InlineKeyboardButton] = []
+    if older:
+        nav.append(InlineKeyboardButton(text="◀️ Раньше", callback_data=f"hist:o:{older}"))
+    if newer:
+        nav.append(InlineKeyboardButton(text="Позже ▶️", callback_data=f"hist:n:{newer}"))
+    rows = [nav] if nav else []
+    rows.append([InlineKeyboardButton(text="↩ Назад", callback_data="back")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
 
 # Карточки товаров
 def product_card_kb(product_id: int, cat_id: int, page: int) -> InlineKeyboardMarkup:
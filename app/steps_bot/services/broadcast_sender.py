@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import enum
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+
+from app.steps_bot import metrics
+from app.steps_bot.settings import config
+
+logger = logging.getLogger(__name__)
+
+retries_after = metrics.counter(
+    "broadcast_retry_after_total", "Ответы 429 (retry_after) при рассылке"
+)
+
+
+class DeliveryResult(str, enum.Enum):
+    DELIVERED = "delivered"
+    FAILED = "failed"
+    BLOCKED = "blocked"
+
+
+class TokenBucket:
+    """
+    Глобальный лимит отправки: rate сообщений в секунду с запасом capacity.
+    pause() останавливает выдачу на время флуд-запрета Telegram.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatThrottle:
+    """Не чаще одного сообщения в один чат за interval секунд."""
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._next: Dict[int, float] = {}
+
+    async def wait(self, chat_id: int) -> None:
+        now = time.monotonic()
+        ready_at = self._next.get(chat_id, 0.0)
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+            now = time.monotonic()
+        self._next[chat_id] = now + self.interval
+
+    def prune(self) -> None:
+        """Забывает чаты, для которых ограничение уже истекло."""
+        now = time.monotonic()
+        for chat_id in [c for c, t in self._next.items() if t <= now]:
+            del self._next[chat_id]
+
+
+class BroadcastSender:
+    """
+    Отправка сообщений рассылки с ограничением параллельности, глобальным
+    и початовым лимитами и повтором после 429.
+    """
+
+    def __init__(
+        self,
+        *,
+        concurrency: Optional[int] = None,
+        rate: Optional[float] = None,
+        per_chat_interval: Optional[float] = None,
+        max_retries: Optional[int] = None,
+    ) -> None:
+        self.semaphore = asyncio.Semaphore(concurrency or config.BROADCAST_CONCURRENCY)
+        self.bucket = TokenBucket(rate or config.BROADCAST_RATE_PER_SECOND)
+        self.throttle = ChatThrottle(
+            per_chat_interval if per_chat_interval is not None else config.BROADCAST_PER_CHAT_INTERVAL
+        )
+        self.max_retries = max_retries if max_retries is not None else config.BROADCAST_MAX_RETRIES
+
+    async def deliver(
+        self,
+        chat_id: int,
+        send: Callable[[int], Awaitable[object]],
+    ) -> DeliveryResult:
+        """Отправляет одно сообщение через send(chat_id) и классифицирует результат."""
+        async with self.semaphore:
+            attempt = 0
+            while True:
+                await self.throttle.wait(chat_id)
+                await self.bucket.acquire()
+                try:
+                    await send(chat_id)
+                    return DeliveryResult.DELIVERED
+                except TelegramRetryAfter as e:
+                    # Флуд-лимит действует на бота целиком — притормаживаем всех
+                    retries_after.inc()
+                    self.bucket.pause(float(e.retry_after))
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        return DeliveryResult.FAILED
+                except TelegramForbiddenError:
+                    return DeliveryResult.BLOCKED
+                except TelegramAPIError as e:
+                    logger.info("Рассылка: не доставлено в чат %s: %s", chat_id, e)
+                    return DeliveryResult.FAILED
+                except Exception:
+                    logger.exception("Рассылка: ошибка отправки в чат %s", chat_id)
+                    return DeliveryResult.FAILED
@@ -1,73 +1,408 @@
 import asyncio
-from typing import Optional
+import contextlib
+import datetime as dt
+import logging
+import socket
+from collections import Counter
+from typing import AsyncIterator, Dict, Optional
 import os
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update
+from app.steps_bot import metrics
+from app.steps_bot.db.notify import pg_listener
 from app.steps_bot.db.repo import get_session
 from app.steps_bot.db.models import User, Broadcast, BroadcastStatus, MediaType
 from app.steps_bot.dispatcher import bot
+from app.steps_bot.services.broadcast_sender import BroadcastSender, DeliveryResult
 from app.steps_bot.settings import config
 from aiogram.types import FSInputFile
 
+logger = logging.getLogger(__name__)
 
-async def list_recipients(session) -> list[int]:
-    result = await session.execute(select(User.telegram_id))
-    return [row[0] for row in result.all()]
+delivered_total = metrics.counter("broadcast_delivered_total", "Доставленные сообщения рассылок")
+failed_total = metrics.counter("broadcast_failed_total", "Недоставленные сообщения рассылок")
+blocked_total = metrics.counter("broadcast_blocked_total", "Получатели, заблокировавшие бота")
 
+# Один отправитель на процесс: глобальный лимит Telegram общий для всех рассылок
+broadcast_sender = BroadcastSender()
 
-async def send_broadcast_now(b: Broadcast) -> None:
+# Канал NOTIFY из триггера на broadcasts (новая или перенесённая рассылка)
+BROADCASTS_CHANNEL = "broadcasts_changed"
+
+# Владелец аренды рассылки; аренда продлевается после каждой партии
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# Локальная замена NOTIFY: будит планировщик этого процесса
+broadcast_wakeup = asyncio.Event()
+
+
+def notify_broadcasts_changed(_payload: Optional[str] = None) -> None:
+    broadcast_wakeup.set()
+
+
+def _recipient_filters(b: Optional[Broadcast]) -> list:
+    """Сегментация рассылки условиями SQL (поля фильтров хранятся в самой рассылке)."""
+    if b is None:
+        return []
+    conds = []
+    if b.only_active:
+        conds.append(User.is_active.is_(True))
+    if b.only_with_family:
+        conds.append(User.family_id.is_not(None))
+    if b.min_walks:
+        conds.append(
+            User.walk_count_stroller + User.walk_count_dog + User.walk_count_stroller_dog >= b.min_walks
+        )
+    if b.landing_source:
+        conds.append(User.landing_source == b.landing_source)
+    return conds
+
+
+async def list_recipients(
+    session,
+    b: Optional[Broadcast] = None,
+    after_user_id: int = 0,
+    limit: Optional[int] = None,
+) -> list[tuple[int, int]]:
+    """Получатели (users.id, telegram_id) по возрастанию id, начиная после курсора."""
+    q = (
+        select(User.id, User.telegram_id)
+        .where(User.id > after_user_id, *_recipient_filters(b))
+        .order_by(User.id)
+    )
+    if limit:
+        q = q.limit(limit)
+    result = await session.execute(q)
+    return [(row[0], row[1]) for row in result.all()]
+
+
+async def iter_recipients(
+    b: Broadcast,
+    after_user_id: int = 0,
+    batch_size: Optional[int] = None,
+) -> AsyncIterator[list[tuple[int, int]]]:
+    """
+    Отдаёт получателей партиями с keyset-пагинацией по users.id: каждая партия —
+    отдельный короткий запрос, так что память и время жизни транзакций не растут
+    с числом пользователей. Следующая партия читается, пока отправляется текущая.
+    """
+    batch_size = batch_size or config.BROADCAST_BATCH_SIZE
+
+    async def fetch(after: int) -> list[tuple[int, int]]:
+        async with get_session() as session:
+            return await list_recipients(session, b, after_user_id=after, limit=batch_size)
+
+    prefetch: Optional[asyncio.Task] = None
+    try:
+        batch = await fetch(after_user_id)
+        while batch:
+            if len(batch) < batch_size:
+                yield batch
+                return
+            prefetch = asyncio.create_task(fetch(batch[-1][0]))
+            yield batch
+            batch = await prefetch
+    finally:
+        # Потребитель вышел из цикла (aclose): недочитанная партия не нужна
+        if prefetch is not None and not prefetch.done():
+            prefetch.cancel()
+
+
+def _media_path(b: Broadcast) -> Optional[str]:
+    path = b.media_file
+    if path and not os.path.isabs(path):
+        path = os.path.join(config.MEDIA_ROOT, path)
+    if path and os.path.exists(path):
+        return path
+    return None
+
+
+async def _send_one(b: Broadcast, uid: int):
+    if b.media_type == MediaType.PHOTO:
+        # порядок: file_id -> локальный файл -> URL -> текст
+        if b.telegram_file_id:
+            return await bot.send_photo(uid, b.telegram_file_id, caption=b.text or "")
+        if path := _media_path(b):
+            return await bot.send_photo(uid, FSInputFile(path), caption=b.text or "")
+        if b.media_url:
+            return await bot.send_photo(uid, b.media_url, caption=b.text or "")
+    elif b.media_type == MediaType.VIDEO:
+        if b.telegram_file_id:
+            return await bot.send_video(uid, b.telegram_file_id, caption=b.text or "")
+        if path := _media_path(b):
+            return await bot.send_video(uid, FSInputFile(path), caption=b.text or "")
+        if b.media_url:
+            return await bot.send_video(uid, b.media_url, caption=b.text or "")
+    return await bot.send_message(uid, b.text or "")
+
+
+def _needs_upload(b: Broadcast) -> bool:
+    """Медиа ещё не загружено в Telegram, но есть что загружать (файл или URL)."""
+    if b.media_type not in (MediaType.PHOTO, MediaType.VIDEO) or b.telegram_file_id:
+        return False
+    return bool(_media_path(b) or b.media_url)
+
+
+async def _cache_file_id(b: Broadcast, sent) -> None:
+    """
+    Запоминает telegram_file_id загруженного медиа в рассылке — остальным
+    получателям уходит уже file_id без повторной загрузки.
+    """
+    file_id = None
+    if b.media_type == MediaType.PHOTO and getattr(sent, "photo", None):
+        file_id = sent.photo[-1].file_id
+    elif b.media_type == MediaType.VIDEO and getattr(sent, "video", None):
+        file_id = sent.video.file_id
+    if not file_id:
+        return
+    b.telegram_file_id = file_id
+    async with get_session() as session:
+        await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == b.id)
+            .values(telegram_file_id=file_id)
+        )
+
+
+def _lease_until():
+    return func.now() + dt.timedelta(seconds=config.BROADCAST_LEASE_SECONDS)
+
+
+async def _save_progress(broadcast_id: int, cursor: int, counts: Counter) -> bool:
+    """
+    Фиксирует курсор и счётчики после партии и продлевает аренду — после рестарта
+    рассылка продолжится с курсора. False, если аренду перехватил другой воркер.
+    """
     async with get_session() as session:
-        user_ids = await list_recipients(session)
-    for uid in user_ids:
+        result = await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.claimed_by == WORKER_ID)
+            .values(
+                cursor_user_id=cursor,
+                delivered_count=Broadcast.delivered_count + counts[DeliveryResult.DELIVERED],
+                failed_count=Broadcast.failed_count + counts[DeliveryResult.FAILED],
+                blocked_count=Broadcast.blocked_count + counts[DeliveryResult.BLOCKED],
+                lease_until=_lease_until(),
+            )
+        )
+        return result.rowcount > 0
+
+
+class BroadcastLeaseLost(Exception):
+    """Аренда рассылки истекла и её забрал другой воркер."""
+
+
+class BroadcastUploadFailed(Exception):
+    """Медиа рассылки не удалось загрузить в Telegram за BROADCAST_UPLOAD_ATTEMPTS попыток."""
+
+
+async def send_broadcast_now(b: Broadcast) -> Counter:
+    """
+    Рассылает сообщение партиями по BROADCAST_BATCH_SIZE получателей, начиная с
+    сохранённого курсора. Возвращает итоги по доставке за этот запуск.
+    """
+    cursor = b.cursor_user_id or 0
+    totals: Counter = Counter()
+    upload_failures = 0
+
+    async def send(chat_id: int) -> None:
+        await _send_one(b, chat_id)
+
+    async def upload(chat_id: int) -> None:
+        sent = await _send_one(b, chat_id)
+        # Сообщение уже доставлено: сбой сохранения file_id не делает доставку неудачной
         try:
-            if b.media_type == MediaType.PHOTO:
-                # порядок: file_id -> локальный файл -> URL -> текст
-                if b.telegram_file_id:
-                    await bot.send_photo(uid, b.telegram_file_id, caption=b.text or "")
-                else:
-                    path = b.media_file
-                    if path and not os.path.isabs(path):
-                        path = os.path.join(config.MEDIA_ROOT, path)
-                    if path and os.path.exists(path):
-                        await bot.send_photo(uid, FSInputFile(path), caption=b.text or "")
-                    elif b.media_url:
-                        await bot.send_photo(uid, b.media_url, caption=b.text or "")
-                    else:
-                        await bot.send_message(uid, b.text or "")
-            elif b.media_type == MediaType.VIDEO:
-                if b.telegram_file_id:
-                    await bot.send_video(uid, b.telegram_file_id, caption=b.text or "")
-                else:
-                    path = b.media_file
-                    if path and not os.path.isabs(path):
-                        path = os.path.join(config.MEDIA_ROOT, path)
-                    if path and os.path.exists(path):
-                        await bot.send_video(uid, FSInputFile(path), caption=b.text or "")
-                    elif b.media_url:
-                        await bot.send_video(uid, b.media_url, caption=b.text or "")
-                    else:
-                        await bot.send_message(uid, b.text or "")
-            else:
-                await bot.send_message(uid, b.text or "")
-        except Exception:
-            continue
-
-
-async def pick_due_broadcast() -> Optional[Broadcast]:
+            await _cache_file_id(b, sent)
+        except Exception as e:
+            logger.error("Рассылка %s: не удалось сохранить file_id: %s", b.id, e)
+
+    async with contextlib.aclosing(iter_recipients(b, after_user_id=cursor)) as batches:
+        async for batch in batches:
+            counts: Counter = Counter()
+            pending = batch
+            # Загружаем медиа один раз: по одному получателю, пока не получим file_id
+            while pending and _needs_upload(b):
+                (user_id, telegram_id), pending = pending[0], pending[1:]
+                result = await broadcast_sender.deliver(telegram_id, upload)
+                counts[result] += 1
+                # Заблокировавший бота получатель ничего не говорит о самом медиа
+                if result != DeliveryResult.BLOCKED and _needs_upload(b):
+                    upload_failures += 1
+                    if upload_failures >= config.BROADCAST_UPLOAD_ATTEMPTS:
+                        await _record_batch(b.id, user_id, counts, totals)
+                        raise BroadcastUploadFailed(b.id)
+
+            results = await asyncio.gather(
+                *(broadcast_sender.deliver(telegram_id, send) for _, telegram_id in pending)
+            )
+            counts.update(results)
+            cursor = batch[-1][0]
+            await _record_batch(b.id, cursor, counts, totals)
+
+    return totals
+
+
+async def _record_batch(broadcast_id: int, cursor: int, counts: Counter, totals: Counter) -> None:
+    """Сохраняет прогресс партии и метрики; BroadcastLeaseLost, если аренда потеряна."""
+    owned = await _save_progress(broadcast_id, cursor, counts)
+    broadcast_sender.throttle.prune()
+
+    delivered_total.inc(counts[DeliveryResult.DELIVERED])
+    failed_total.inc(counts[DeliveryResult.FAILED])
+    blocked_total.inc(counts[DeliveryResult.BLOCKED])
+    totals.update(counts)
+    if not owned:
+        raise BroadcastLeaseLost(broadcast_id)
+
+
+async def claim_due_broadcasts(limit: int = 1) -> list[Broadcast]:
+    """
+    Забирает до limit рассылок к отправке: наступившие PENDING и SENDING с истёкшей
+    арендой (воркер упал). FOR UPDATE SKIP LOCKED — несколько воркеров не возьмут
+    одну рассылку дважды.
+    """
+    due = (
+        select(Broadcast.id)
+        .where(
+            (
+                (Broadcast.status == BroadcastStatus.PENDING)
+                # Если указано время — отправлять, когда наступило
+                & ((Broadcast.scheduled_at.is_(None)) | (Broadcast.scheduled_at <= func.now()))
+            )
+            | (
+                (Broadcast.status == BroadcastStatus.SENDING)
+                & ((Broadcast.lease_until.is_(None)) | (Broadcast.lease_until < func.now()))
+            )
+        )
+        # Прерванные рассылки продолжаются в первую очередь
+        .order_by(
+            (Broadcast.status == BroadcastStatus.SENDING).desc(),
+            Broadcast.scheduled_at.is_(None).desc(),
+            Broadcast.scheduled_at.asc(),
+        )
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
     async with get_session() as session:
-        q = select(Broadcast).where(Broadcast.status == BroadcastStatus.PENDING)
-        # Если указано время — отправлять, когда наступило
-        q = q.where((Broadcast.scheduled_at.is_(None)) | (Broadcast.scheduled_at <= func.now()))
-        row = await session.execute(q.order_by(Broadcast.scheduled_at.is_(None).desc(), Broadcast.scheduled_at.asc()).limit(1))
-        return row.scalar_one_or_none()
+        result = await session.scalars(
+            update(Broadcast)
+            .where(Broadcast.id.in_(due.scalar_subquery()))
+            .values(
+                status=BroadcastStatus.SENDING,
+                started_at=func.coalesce(Broadcast.started_at, func.now()),
+                claimed_by=WORKER_ID,
+                lease_until=_lease_until(),
+            )
+            .returning(Broadcast)
+            .execution_options(synchronize_session=False)
+        )
+        return list(result.all())
 
 
-async def run_broadcast_worker_once() -> None:
-    b = await pick_due_broadcast()
-    if not b:
-        return
-    await send_broadcast_now(b)
+async def seconds_until_next_due() -> Optional[float]:
+    """Секунды до ближайшей запланированной рассылки или истечения чужой аренды."""
     async with get_session() as session:
-        db_b = await session.get(Broadcast, b.id)
-        if db_b:
-            db_b.status = BroadcastStatus.SENT
+        next_pending = (
+            select(func.min(Broadcast.scheduled_at))
+            .where(Broadcast.status == BroadcastStatus.PENDING)
+            .scalar_subquery()
+        )
+        next_lease = (
+            select(func.min(Broadcast.lease_until))
+            .where(Broadcast.status == BroadcastStatus.SENDING)
+            .scalar_subquery()
+        )
+        value = await session.scalar(
+            select(func.extract("epoch", func.least(next_pending, next_lease) - func.now()))
+        )
+    return float(value) if value is not None else None
+
+
+async def _finish(broadcast_id: int, status: BroadcastStatus) -> None:
+    values = {"status": status, "lease_until": None}
+    if status == BroadcastStatus.SENT:
+        values["sent_at"] = func.now()
+    async with get_session() as session:
+        await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.claimed_by == WORKER_ID)
+            .values(**values)
+        )
+
+
+async def _run_claimed(b: Broadcast) -> None:
+    try:
+        totals = await send_broadcast_now(b)
+    except BroadcastLeaseLost:
+        logger.warning("Рассылка %s: аренду перехватил другой воркер, останавливаемся", b.id)
+        return
+    except BroadcastUploadFailed:
+        logger.error(
+            "Рассылка %s: медиа не загружено за %s попыток, рассылка остановлена",
+            b.id,
+            config.BROADCAST_UPLOAD_ATTEMPTS,
+        )
+        await _finish(b.id, BroadcastStatus.FAILED)
+        return
+    await _finish(b.id, BroadcastStatus.SENT)
+    logger.info(
+        "Рассылка %s завершена: доставлено %s, ошибок %s, заблокировали %s",
+        b.id,
+        totals[DeliveryResult.DELIVERED],
+        totals[DeliveryResult.FAILED],
+        totals[DeliveryResult.BLOCKED],
+    )
+
+
+async def run_broadcast_worker_once() -> None:
+    """Забирает и отправляет одну наступившую рассылку (разовый запуск)."""
+    for b in await claim_due_broadcasts(1):
+        await _run_claimed(b)
+
+
+async def run_broadcast_scheduler(max_concurrent: Optional[int] = None) -> None:
+    """
+    Планировщик рассылок: спит до ближайшего scheduled_at (или истечения аренды),
+    просыпается раньше по NOTIFY/локальному событию и ведёт до max_concurrent
+    рассылок одновременно.
+    """
+    max_concurrent = max_concurrent or config.BROADCAST_MAX_CONCURRENT
+    running: Dict[int, asyncio.Task] = {}
+    pg_listener.subscribe(BROADCASTS_CHANNEL, notify_broadcasts_changed)
+    try:
+        while True:
+            broadcast_wakeup.clear()
+            delay = float(config.BROADCAST_SCHEDULER_MAX_SLEEP)
+            try:
+                free = max_concurrent - len(running)
+                if free > 0:
+                    for b in await claim_due_broadcasts(free):
+                        logger.info("Рассылка %s взята в работу", b.id)
+                        running[b.id] = asyncio.create_task(_run_claimed(b))
+                if len(running) < max_concurrent:
+                    next_due = await seconds_until_next_due()
+                    if next_due is not None:
+                        # Не чаще раза в секунду, если наступившую рассылку держит другой воркер
+                        delay = min(delay, max(next_due, 1.0))
+            except Exception as e:
+                logger.error("broadcast scheduler error: %s", e)
+                delay = min(delay, 10.0)
+
+            wakeup = asyncio.create_task(broadcast_wakeup.wait())
+            try:
+                await asyncio.wait(
+                    {wakeup, *running.values()},
+                    timeout=delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            finally:
+                wakeup.cancel()
+
+            for broadcast_id, task in list(running.items()):
+                if task.done():
+                    running.pop(broadcast_id)
+                    if not task.cancelled() and task.exception() is not None:
+                        logger.error("Рассылка %s прервана: %s", broadcast_id, task.exception())
+    finally:
+        for task in running.values():
+            task.cancel()
@@ -9,6 +9,7 @@ import contextlib
 from app.steps_bot.settings import config
 from app.steps_bot.states.order import OrderInput
 from app.steps_bot.db import repo
+from app.steps_bot.db.identity import UserId, resolve_user
 from app.steps_bot.services.ledger_service import (
     purchase_from_family_proportional,
     purchase_from_user,
@@ -52,7 +53,7 @@ async def finalize_successful_order(
     Создаёт заказ, списывает баллы с семьи пропорционально и пишет проводки.
     
     Args:
-        user_id: ID пользователя (telegram или БД)
+        user_id: TelegramId или UserId пользователя
         product_id: ID товара
         pvz_id: ID ПВЗ для доставки
         full_name: полное имя получателя (для сохранения в профиль)
@@ -63,7 +64,9 @@ async def finalize_successful_order(
             raise ValueError("Товар недоступен")
 
         product, category = result
-        user, family, _ = await repo.get_user_with_family(session, user_id)
+        user = await resolve_user(session, user_id)
+        if not user:
+            raise ValueError("Пользователь не найден")
 
         # Обновляем контакты пользователя для заказа (перезаписываем новыми значениями)
         if phone is not None:
@@ -81,29 +84,21 @@ async def finalize_successful_order(
             elif len(parts) == 1:
                 last_name = parts[0]  # Только фамилия
         
-        # Проверяем доступность по семье или по личному балансу
-        if family:
-            enough_family = await repo.family_points_enough(session, family.id, int(product.price))
-            if not enough_family:
-                raise ValueError("Недостаточно баллов семьи")
-        else:
-            # Проверяем личный баланс
-            if int(user.balance) < int(product.price):
-                raise ValueError("Недостаточно баллов")
-
+        # Достаточность баллов проверяется при списании под блокировкой строк —
+        # при нехватке ValueError откатывает и созданный заказ
         order = await repo.create_order_with_item(
             session=session,
-            user_id=user.id,
+            user_id=UserId(user.id),
             product=product,
             pvz_id=pvz_id,
             recipient_first_name=first_name,
             recipient_last_name=last_name,
         )
 
-        if family:
+        if user.family_id:
             await purchase_from_family_proportional(
                 session=session,
-                family_id=family.id,
+                family_id=user.family_id,
                 amount=int(product.price),
                 order_id=order.id,
                 title="Покупка в каталоге",
@@ -112,7 +107,7 @@ async def finalize_successful_order(
         else:
             await purchase_from_user(
                 session=session,
-                user_id_or_telegram=user.id,
+                user_id_or_telegram=UserId(user.id),
                 amount=int(product.price),
                 order_id=order.id,
                 title="Покупка в каталоге",
@@ -154,19 +149,13 @@ async def ensure_purchase_allowed(user_id: int, product_id: int) -> tuple[bool,
             return False, "Товар недоступен или уже куплен."
 
         product, _ = result
-        try:
-            user, family, _ = await repo.get_user_with_family(session, user_id)
-        except ValueError:
+        user = await resolve_user(session, user_id)
+        if not user:
             return False, "Пользователь не найден."
 
-        if family:
-            enough_family = await repo.family_points_enough(session, family.id, int(product.price))
-            if not enough_family:
-                return False, "Недостаточно баллов семьи."
-            return True, "ok"
-
-        # Без семьи — достаточно ли личных баллов
-        if int(user.balance) < int(product.price):
-            return False, "Недостаточно баллов."
+        # Одно скалярное чтение: суммарные баллы семьи или личный баланс
+        available = await repo.spendable_points(session, user)
+        if available < int(product.price):
+            return False, "Недостаточно баллов семьи." if user.family_id else "Недостаточно баллов."
 
         return True, "ok"
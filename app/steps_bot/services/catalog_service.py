@@ -4,7 +4,8 @@ from typing import List, Tuple, Optional
 
 from sqlalchemy import select, func
 
-from app.steps_bot.db.repo import get_session
+from app.steps_bot.db.repo import get_session, spendable_points
+from app.steps_bot.db.identity import resolve_user
 from app.steps_bot.db.models.catalog import CatalogCategory, Product
 from app.steps_bot.db.models.captions import MediaType
 
@@ -49,6 +50,17 @@ async def get_category_page(
         return items, total
 
 
+async def get_available_points(user_id: int) -> Optional[int]:
+    """
+    Баллы, которые пользователь может потратить (семейные или личные); None — пользователь не найден.
+    """
+    async with get_session() as s:
+        user = await resolve_user(s, user_id)
+        if user is None:
+            return None
+        return await spendable_points(s, user)
+
+
 async def get_product(prod_id: int) -> Optional[Product]:
     async with get_session() as s:
         return await s.get(Product, prod_id)
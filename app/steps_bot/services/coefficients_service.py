@@ -1,37 +1,141 @@
 from __future__ import annotations
 
+import asyncio
+import time
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
 from sqlalchemy import select
 
+from app.steps_bot.db.notify import pg_listener
 from app.steps_bot.db.repo import get_session
 from app.steps_bot.db.models.walk import WalkForm, WalkFormCoefficient
 from app.steps_bot.db.models.coefficients import TemperatureCoefficient
+from app.steps_bot.settings import config
 
+COEFFICIENTS_CHANNEL = "coefficients_changed"
 
-async def get_walk_form_coef(form: WalkForm) -> int:
+
+class CoefficientTable:
+    """
+    Снимок коэффициентов в памяти: коэффициент формы и отсортированные температурные
+    диапазоны по каждой форме прогулки (поиск диапазона — бинарный).
+    """
+    __slots__ = ("form_coefs", "ranges", "loaded_at")
+
+    def __init__(
+        self,
+        form_coefs: Dict[WalkForm, int],
+        temp_rows: List[Tuple[WalkForm, int, int, int]],
+    ) -> None:
+        self.form_coefs = form_coefs
+        self.loaded_at = time.monotonic()
+
+        grouped: Dict[WalkForm, List[Tuple[int, int, int]]] = {}
+        for form, min_t, max_t, coef in temp_rows:
+            grouped.setdefault(form, []).append((int(min_t), int(max_t), int(coef)))
+
+        # form -> (mins, maxs, coefs, prefix_max): prefix_max позволяет корректно
+        # обработать пересекающиеся диапазоны, не теряя O(log n) на обычных данных
+        self.ranges: Dict[WalkForm, Tuple[List[int], List[int], List[int], List[int]]] = {}
+        for form, items in grouped.items():
+            items.sort()
+            mins = [i[0] for i in items]
+            maxs = [i[1] for i in items]
+            coefs = [i[2] for i in items]
+            prefix_max: List[int] = []
+            running = None
+            for m in maxs:
+                running = m if running is None else max(running, m)
+                prefix_max.append(running)
+            self.ranges[form] = (mins, maxs, coefs, prefix_max)
+
+    def walk_form_coef(self, form: WalkForm) -> int:
+        return int(self.form_coefs.get(form) or 1)
+
+    def temperature_coef(self, form: WalkForm, temp_c: int | None) -> int:
+        if temp_c is None:
+            return 1
+        found = self.ranges.get(form)
+        if not found:
+            return 1
+        mins, maxs, coefs, prefix_max = found
+        i = bisect_right(mins, temp_c) - 1
+        while i >= 0 and prefix_max[i] >= temp_c:
+            if maxs[i] >= temp_c:
+                return int(coefs[i] or 1)
+            i -= 1
+        return 1
+
+
+_table: Optional[CoefficientTable] = None
+_load_lock = asyncio.Lock()
+# Растёт при каждом сбросе: таблицу, загрузка которой началась до сброса, не кэшируем
+_generation = 0
+
+
+async def _load_table() -> CoefficientTable:
     async with get_session() as s:
-        q = select(WalkFormCoefficient.coefficient).where(WalkFormCoefficient.walk_form == form)
-        res = await s.execute(q)
-        coef = res.scalar_one_or_none()
-        return int(coef or 1)
+        forms = (
+            await s.execute(select(WalkFormCoefficient.walk_form, WalkFormCoefficient.coefficient))
+        ).all()
+        temps = (
+            await s.execute(
+                select(
+                    TemperatureCoefficient.walk_form,
+                    TemperatureCoefficient.min_temp_c,
+                    TemperatureCoefficient.max_temp_c,
+                    TemperatureCoefficient.coefficient,
+                )
+            )
+        ).all()
+    return CoefficientTable({form: coef for form, coef in forms}, [tuple(r) for r in temps])
+
+
+async def get_coefficient_table() -> CoefficientTable:
+    """
+    Возвращает закэшированную таблицу коэффициентов, перечитывая её раз в COEFFICIENTS_CACHE_TTL_SECONDS.
+    """
+    global _table
+    table = _table
+    if table is not None and time.monotonic() - table.loaded_at < config.COEFFICIENTS_CACHE_TTL_SECONDS:
+        return table
+    async with _load_lock:
+        table = _table
+        if table is None or time.monotonic() - table.loaded_at >= config.COEFFICIENTS_CACHE_TTL_SECONDS:
+            generation = _generation
+            table = await _load_table()
+            if generation == _generation:
+                _table = table
+    return table
+
+
+def invalidate_coefficients(_payload: Optional[str] = None) -> None:
+    """
+    Сбрасывает кэш — следующий запрос перечитает коэффициенты из БД.
+    Колбэк NOTIFY coefficients_changed (триггеры на таблицах коэффициентов).
+    """
+    global _table, _generation
+    _table = None
+    _generation += 1
+
+
+def subscribe_coefficient_changes() -> None:
+    """Подписывает кэш на правки коэффициентов в админке (вызывать до pg_listener.start())."""
+    pg_listener.subscribe(COEFFICIENTS_CHANNEL, invalidate_coefficients)
+
+
+async def get_walk_form_coef(form: WalkForm) -> int:
+    return (await get_coefficient_table()).walk_form_coef(form)
 
 
 async def get_temperature_coef(form: WalkForm, temp_c: int | None) -> int:
     if temp_c is None:
         return 1
-    async with get_session() as s:
-        q = (
-            select(TemperatureCoefficient.coefficient)
-            .where(TemperatureCoefficient.walk_form == form)
-            .where(TemperatureCoefficient.min_temp_c <= temp_c)
-            .where(TemperatureCoefficient.max_temp_c >= temp_c)
-        )
-        res = await s.execute(q)
-        coef = res.scalar_one_or_none()
-        return int(coef or 1)
+    return (await get_coefficient_table()).temperature_coef(form, temp_c)
 
 
 async def get_total_multiplier(form: WalkForm, temp_c: int | None = None) -> int:
     """Итоговый множитель = коэффициент формы × (опционально) температурный коэффициент."""
-    base = await get_walk_form_coef(form)
-    temp = await get_temperature_coef(form, temp_c)
-    return max(1, base * temp)
+    table = await get_coefficient_table()
+    return max(1, table.walk_form_coef(form) * table.temperature_coef(form, temp_c))
@@ -4,6 +4,7 @@ from sqlalchemy import select, and_, func, delete, update
 from sqlalchemy.orm import selectinload
 from sqlalchemy.exc import IntegrityError
 
+from app.steps_bot.db.identity import UserId
 from app.steps_bot.db.repo import get_session
 from app.steps_bot.services.ledger_service import transfer_user_to_family
 from app.steps_bot.db.models.family import (
@@ -86,7 +87,7 @@ class FamilyService:
             from app.steps_bot.services.ledger_service import transfer_user_to_family
             await transfer_user_to_family(
                 session,
-                telegram_id,
+                UserId(owner.id),
                 family.id,
                 title="Перевод при создании семьи",
             )
@@ -175,7 +176,7 @@ class FamilyService:
                 # Переносим личный баланс участника в семью
                 await transfer_user_to_family(
                     session,
-                    invitee_tg,
+                    UserId(invitee.id),
                     inv.family_id,
                     title="Перевод при вступлении в семью",
                 )
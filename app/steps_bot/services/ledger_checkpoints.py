@@ -0,0 +1,279 @@
+"""
+Снимки журнала операций и сверка балансов.
+
+Журнал только растёт, поэтому итоги владельца (вклад, заработано, потрачено)
+считаются как снимок из ledger_checkpoints плюс «хвост» проводок после него.
+
+Граница снимка — не id и не created_at: транзакция, начатая раньше, может
+закоммититься позже проводок с большими id. Каждая проводка хранит txid своей
+транзакции, а граница upto_txid — xmin снимка Postgres (pg_snapshot_xmin):
+все транзакции с меньшим txid к этому моменту завершены. Поэтому в снимок идут
+проводки с txid из [прошлая граница, upto_txid), а хвост — txid >= upto_txid.
+Долгая транзакция лишь задерживает границу, но не теряет проводки.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import and_, case, func, literal, select, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.steps_bot import metrics
+from app.steps_bot.db.models.family import Family
+from app.steps_bot.db.models.ledger import (
+    LedgerCheckpoint,
+    LedgerCheckpointState,
+    LedgerEntry,
+    OperationType,
+    OwnerType,
+)
+from app.steps_bot.db.models.user import User
+from app.steps_bot.db.repo import get_session
+from app.steps_bot.db.utils import XID8
+from app.steps_bot.services.ledger_partitions import ensure_ledger_partitions
+from app.steps_bot.settings import config
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_try_advisory_xact_lock: снимок строит один процесс за раз
+CHECKPOINT_LOCK_KEY = 0x1ED6E7
+
+checkpoint_rows = metrics.counter(
+    "ledger_checkpoint_rows_total", "Строки снимков журнала, обновлённые задачей"
+)
+balance_mismatches = metrics.gauge(
+    "ledger_balance_mismatches", "Владельцы, чей баланс не сходится с журналом (последняя сверка)"
+)
+
+
+class OwnerTotals(NamedTuple):
+    amount: int
+    balance_delta: int
+    count: int
+
+
+class BalanceMismatch(NamedTuple):
+    owner_type: OwnerType
+    owner_id: int
+    balance: int
+    ledger_balance: int
+
+
+_owner_id = func.coalesce(LedgerEntry.user_id, LedgerEntry.family_id)
+
+
+def balance_effect():
+    """
+    Влияние проводки на баланс владельца. Пользовательская проводка перевода в семью
+    записана с плюсом, но баланс уменьшает; пользовательские начисления участника
+    семьи (balance_after IS NULL) — только статистика.
+    """
+    is_user = LedgerEntry.owner_type == OwnerType.USER
+    return case(
+        (and_(is_user, LedgerEntry.operation == OperationType.TRANSFER), -LedgerEntry.amount),
+        (and_(is_user, LedgerEntry.balance_after.is_(None)), 0),
+        else_=LedgerEntry.amount,
+    )
+
+
+def _upto_txid():
+    """Текущая граница снимков (NULL — снимков ещё не было)."""
+    return select(LedgerCheckpointState.upto_txid).where(LedgerCheckpointState.id == 1).scalar_subquery()
+
+
+def _in_tail():
+    """Проводка ещё не вошла в снимок."""
+    upto = _upto_txid()
+    return (upto.is_(None)) | (LedgerEntry.txid >= upto)
+
+
+async def checkpoint_ledger() -> int:
+    """
+    Переносит в снимки проводки всех транзакций, завершённых к началу вызова
+    и не вошедших в прошлый снимок. Возвращает число обновлённых строк снимков.
+    """
+    async with get_session() as s:
+        if not await s.scalar(select(func.pg_try_advisory_xact_lock(CHECKPOINT_LOCK_KEY))):
+            return 0
+
+        prev = await s.scalar(
+            select(LedgerCheckpointState.upto_txid).where(LedgerCheckpointState.id == 1)
+        )
+        # Самая старая ещё идущая транзакция: всё, что раньше неё, завершено
+        upto = await s.scalar(select(func.pg_snapshot_xmin(func.pg_current_snapshot())))
+        if prev is not None and upto <= prev:
+            return 0
+
+        in_range = LedgerEntry.txid < literal(upto, XID8())
+        if prev is not None:
+            in_range = and_(LedgerEntry.txid >= literal(prev, XID8()), in_range)
+
+        delta = (
+            select(
+                LedgerEntry.owner_type,
+                _owner_id,
+                LedgerEntry.operation,
+                func.sum(LedgerEntry.amount),
+                func.sum(balance_effect()),
+                func.count(),
+            )
+            .where(in_range)
+            .group_by(LedgerEntry.owner_type, _owner_id, LedgerEntry.operation)
+        )
+        stmt = insert(LedgerCheckpoint).from_select(
+            ["owner_type", "owner_id", "operation", "amount_sum", "balance_delta", "entry_count"],
+            delta,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[
+                LedgerCheckpoint.owner_type,
+                LedgerCheckpoint.owner_id,
+                LedgerCheckpoint.operation,
+            ],
+            set_={
+                "amount_sum": LedgerCheckpoint.amount_sum + stmt.excluded.amount_sum,
+                "balance_delta": LedgerCheckpoint.balance_delta + stmt.excluded.balance_delta,
+                "entry_count": LedgerCheckpoint.entry_count + stmt.excluded.entry_count,
+                "updated_at": func.now(),
+            },
+        )
+        rows = (await s.execute(stmt)).rowcount or 0
+
+        # Граница и строки снимков меняются в одной транзакции: читатели видят их согласованно
+        state = insert(LedgerCheckpointState).values(id=1, upto_txid=literal(upto, XID8()))
+        await s.execute(
+            state.on_conflict_do_update(
+                index_elements=[LedgerCheckpointState.id],
+                set_={"upto_txid": state.excluded.upto_txid, "updated_at": func.now()},
+            )
+        )
+
+    checkpoint_rows.inc(rows)
+    logger.info("Снимок журнала до транзакции %s: обновлено строк %s", upto, rows)
+    return rows
+
+
+async def get_owner_totals(
+    session: AsyncSession,
+    owner_type: OwnerType,
+    owner_id: int,
+) -> Dict[OperationType, OwnerTotals]:
+    """
+    Итоги владельца по типам операций одним запросом: строки снимка плюс хвост
+    проводок после границы (по индексу txid — хвост короткий).
+    """
+    owner_col = LedgerEntry.user_id if owner_type == OwnerType.USER else LedgerEntry.family_id
+
+    snapshot = select(
+        LedgerCheckpoint.operation.label("operation"),
+        LedgerCheckpoint.amount_sum.label("amount"),
+        LedgerCheckpoint.balance_delta.label("balance_delta"),
+        LedgerCheckpoint.entry_count.label("count"),
+    ).where(
+        LedgerCheckpoint.owner_type == owner_type,
+        LedgerCheckpoint.owner_id == owner_id,
+    )
+    tail = (
+        select(
+            LedgerEntry.operation,
+            func.sum(LedgerEntry.amount),
+            func.sum(balance_effect()),
+            func.count(),
+        )
+        .where(LedgerEntry.owner_type == owner_type, owner_col == owner_id, _in_tail())
+        .group_by(LedgerEntry.operation)
+    )
+
+    parts = union_all(snapshot, tail).subquery()
+    rows = await session.execute(
+        select(
+            parts.c.operation,
+            func.sum(parts.c.amount),
+            func.sum(parts.c.balance_delta),
+            func.sum(parts.c.count),
+        ).group_by(parts.c.operation)
+    )
+    return {
+        op: OwnerTotals(int(amount or 0), int(delta or 0), int(count or 0))
+        for op, amount, delta, count in rows
+    }
+
+
+async def reconcile_balances(limit: int = 100) -> List[BalanceMismatch]:
+    """
+    Сверяет users.balance и families.balance с журналом (снимки + хвост).
+    Возвращает до limit расхождений каждого типа владельца.
+    """
+    ledger = union_all(
+        select(
+            LedgerCheckpoint.owner_type.label("owner_type"),
+            LedgerCheckpoint.owner_id.label("owner_id"),
+            LedgerCheckpoint.balance_delta.label("delta"),
+        ),
+        select(LedgerEntry.owner_type, _owner_id, balance_effect()).where(_in_tail()),
+    ).subquery()
+    totals = (
+        select(ledger.c.owner_type, ledger.c.owner_id, func.sum(ledger.c.delta).label("total"))
+        .group_by(ledger.c.owner_type, ledger.c.owner_id)
+        .subquery()
+    )
+
+    mismatches: List[BalanceMismatch] = []
+    async with get_session() as s:
+        for owner_type, model in ((OwnerType.USER, User), (OwnerType.FAMILY, Family)):
+            expected = func.coalesce(totals.c.total, 0)
+            rows = await s.execute(
+                select(model.id, model.balance, expected)
+                .outerjoin(
+                    totals,
+                    and_(totals.c.owner_type == owner_type, totals.c.owner_id == model.id),
+                )
+                .where(model.balance != expected)
+                .order_by(model.id)
+                .limit(limit)
+            )
+            mismatches.extend(
+                BalanceMismatch(owner_type, owner_id, int(balance), int(total))
+                for owner_id, balance, total in rows
+            )
+    return mismatches
+
+
+async def run_ledger_maintenance(interval: Optional[float] = None) -> None:
+    """Фоновый цикл: секции журнала, снимки и периодическая сверка балансов."""
+    interval = interval or config.LEDGER_CHECKPOINT_INTERVAL_SECONDS
+    last_reconcile = time.monotonic()
+    while True:
+        # Секции на ближайшие месяцы: без них вставки уходят в ledger_entries_default
+        try:
+            await ensure_ledger_partitions()
+        except Exception as e:
+            logger.error("ledger partitions error: %s", e)
+
+        await asyncio.sleep(interval)
+        try:
+            await checkpoint_ledger()
+        except Exception as e:
+            logger.error("ledger checkpoint error: %s", e)
+
+        if time.monotonic() - last_reconcile < config.LEDGER_RECONCILE_INTERVAL_SECONDS:
+            continue
+        last_reconcile = time.monotonic()
+        try:
+            mismatches = await reconcile_balances()
+        except Exception as e:
+            logger.error("ledger reconcile error: %s", e)
+            continue
+        balance_mismatches.set(len(mismatches))
+        for m in mismatches:
+            logger.warning(
+                "Баланс не сходится с журналом: %s %s баланс=%s журнал=%s",
+                m.owner_type.value,
+                m.owner_id,
+                m.balance,
+                m.ledger_balance,
+            )
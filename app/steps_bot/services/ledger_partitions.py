@@ -0,0 +1,227 @@
+"""
+Месячные секции журнала ledger_entries: создание заранее и архивирование старых.
+
+Секция ledger_entries_YYYY_MM покрывает календарный месяц по UTC. Старые секции
+выгружаются в gzip-CSV и удаляются; итоги владельцев при этом не меняются —
+они хранятся в снимках ledger_checkpoints.
+
+Создание и отсоединение секции блокируют журнал: ATTACH/DETACH DEFAULT и DETACH
+берут ACCESS EXCLUSIVE на ledger_entries (DETACH ... CONCURRENTLY при наличии
+секции DEFAULT Postgres не разрешает). Поэтому такие операции идут короткими
+транзакциями с lock_timeout: не дождавшись блокировки, они не держат очередь
+из записей в журнал, а падают и повторяются в следующий проход.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import gzip
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.steps_bot.db.models.ledger import LedgerCheckpointState, LedgerEntry
+from app.steps_bot.db.repo import get_session
+from app.steps_bot.settings import config
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "ledger_entries"
+DEFAULT_PARTITION = "ledger_entries_default"
+_PARTITION_RE = re.compile(r"^ledger_entries_(\d{4})_(\d{2})$")
+
+
+class ArchivedPartition(NamedTuple):
+    name: str
+    rows: int
+    path: Path
+
+
+def month_start(day: dt.date) -> dt.date:
+    return day.replace(day=1)
+
+
+def add_months(month: dt.date, n: int) -> dt.date:
+    index = month.year * 12 + month.month - 1 + n
+    return dt.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: dt.date) -> str:
+    return f"{PARENT_TABLE}_{month:%Y_%m}"
+
+
+async def list_ledger_partitions(session: AsyncSession) -> Dict[dt.date, str]:
+    """Месячные секции журнала: первый день месяца → имя таблицы."""
+    rows = await session.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:parent AS regclass)"
+        ),
+        {"parent": PARENT_TABLE},
+    )
+    partitions: Dict[dt.date, str] = {}
+    for (name,) in rows:
+        m = _PARTITION_RE.match(name)
+        if m:
+            partitions[dt.date(int(m.group(1)), int(m.group(2)), 1)] = name
+    return partitions
+
+
+async def _set_lock_timeout(session: AsyncSession) -> None:
+    await session.execute(
+        text(f"SET LOCAL lock_timeout = '{config.LEDGER_PARTITION_LOCK_TIMEOUT_SECONDS}s'")
+    )
+
+
+async def _create_partition(session: AsyncSession, month: dt.date) -> int:
+    """
+    Создаёт секцию месяца. Если в секцию DEFAULT уже попали проводки этого месяца
+    (секцию вовремя не создали), CREATE ... PARTITION OF упал бы на проверке DEFAULT:
+    тогда DEFAULT отсоединяется, проводки переносятся в новую секцию и DEFAULT
+    подключается обратно — всё в одной транзакции. Возвращает число перенесённых строк.
+    """
+    name = partition_name(month)
+    # Границы — литералы в UTC; имя собрано из даты, экранирование не нужно
+    start = f"'{month.isoformat()} 00:00:00+00'"
+    end = f"'{add_months(month, 1).isoformat()} 00:00:00+00'"
+    create = f"CREATE TABLE {name} PARTITION OF {PARENT_TABLE} FOR VALUES FROM ({start}) TO ({end})"
+
+    await _set_lock_timeout(session)
+    has_default = await session.scalar(
+        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": DEFAULT_PARTITION}
+    )
+    stray = 0
+    if has_default:
+        stray = await session.scalar(
+            text(
+                f"SELECT count(*) FROM {DEFAULT_PARTITION} "
+                f"WHERE created_at >= {start} AND created_at < {end}"
+            )
+        )
+    if not stray:
+        await session.execute(text(create))
+        return 0
+
+    columns = ", ".join(c.name for c in LedgerEntry.__table__.columns)
+    await session.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    await session.execute(text(create))
+    await session.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            f"WHERE created_at >= {start} AND created_at < {end} RETURNING {columns}) "
+            f"INSERT INTO {name} ({columns}) SELECT {columns} FROM moved"
+        )
+    )
+    await session.execute(
+        text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+    )
+    return stray
+
+
+async def ensure_ledger_partitions(months_ahead: Optional[int] = None) -> List[str]:
+    """
+    Создаёт недостающие секции с текущего месяца на months_ahead месяцев вперёд,
+    каждую своей транзакцией. Возвращает имена созданных секций.
+    """
+    months_ahead = config.LEDGER_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    current = month_start(dt.datetime.now(dt.timezone.utc).date())
+    created: List[str] = []
+    async with get_session() as s:
+        existing = await list_ledger_partitions(s)
+    for i in range(months_ahead + 1):
+        month = add_months(current, i)
+        if month in existing:
+            continue
+        async with get_session() as s:
+            moved = await _create_partition(s, month)
+        name = partition_name(month)
+        if moved:
+            logger.warning(
+                "Секция %s создана с опозданием: %s проводок перенесено из %s",
+                name,
+                moved,
+                DEFAULT_PARTITION,
+            )
+        created.append(name)
+    if created:
+        logger.info("Созданы секции журнала: %s", ", ".join(created))
+    return created
+
+
+async def _copy_partition(session: AsyncSession, name: str, path: Path) -> None:
+    """Выгружает секцию в gzip-CSV через COPY asyncpg (сначала во временный файл)."""
+    conn = await session.connection()
+    raw = (await conn.get_raw_connection()).driver_connection
+
+    tmp = path.with_suffix(path.suffix + ".part")
+    with gzip.open(tmp, "wb") as gz:
+        async def sink(chunk: bytes) -> None:
+            gz.write(chunk)
+
+        await raw.copy_from_table(name, output=sink, format="csv", header=True)
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+async def archive_ledger_partitions(
+    before: dt.date,
+    directory: Path,
+    dry_run: bool = False,
+) -> List[ArchivedPartition]:
+    """
+    Выгружает секции целиком до месяца before в directory/<секция>.csv.gz,
+    затем отсоединяет и удаляет их. Секцию с проводками, ещё не попавшими в снимок
+    ledger_checkpoints, не трогает: иначе вклад и сверка потеряли бы эти суммы.
+    """
+    before = month_start(before)
+    directory.mkdir(parents=True, exist_ok=True)
+    archived: List[ArchivedPartition] = []
+
+    async with get_session() as s:
+        partitions = await list_ledger_partitions(s)
+        upto_txid = await s.scalar(
+            select(LedgerCheckpointState.upto_txid).where(LedgerCheckpointState.id == 1)
+        )
+    if upto_txid is None:
+        logger.warning("Снимков журнала ещё нет, архивировать нечего")
+        return archived
+
+    for month, name in sorted(partitions.items()):
+        if month >= before:
+            continue
+        async with get_session() as s:
+            rows, pending = (
+                await s.execute(
+                    text(f"SELECT count(*), count(*) FILTER (WHERE txid >= :upto) FROM {name}"),
+                    {"upto": upto_txid},
+                )
+            ).one()
+            if pending:
+                logger.warning(
+                    "Секция %s содержит %s проводок после снимка, пропускаем",
+                    name,
+                    pending,
+                )
+                continue
+            path = directory / f"{name}.csv.gz"
+            if dry_run:
+                logger.info("Будет архивирована секция %s → %s", name, path)
+                archived.append(ArchivedPartition(name, rows, path))
+                continue
+            await _copy_partition(s, name, path)
+
+        # Отсоединение и удаление — отдельной короткой транзакцией после записи файла:
+        # DETACH держит ACCESS EXCLUSIVE на ledger_entries до коммита
+        async with get_session() as s:
+            await _set_lock_timeout(s)
+            await s.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            await s.execute(text(f"DROP TABLE {name}"))
+        logger.info("Секция %s архивирована: %s строк → %s", name, rows, path)
+        archived.append(ArchivedPartition(name, rows, path))
+    return archived
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import datetime as dt
-from typing import Optional, Sequence, Tuple
+from typing import NamedTuple, Optional, Sequence, Tuple
 
-from sqlalchemy import select, func, update
+from sqlalchemy import literal, select, tuple_, union_all
+from sqlalchemy.orm import aliased
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.steps_bot.db.identity import resolve_user
+from app.steps_bot.db.ledger_writer import LedgerOwnerNotFound, LedgerWriter
 from app.steps_bot.db.models.family import Family
 from app.steps_bot.db.models.user import User
 from app.steps_bot.db.models.ledger import (
@@ -14,6 +17,15 @@ from app.steps_bot.db.models.ledger import (
     OperationType,
 )
 from app.steps_bot.db.models.walk import WalkForm
+from app.steps_bot.services.ledger_checkpoints import get_owner_totals
+
+
+# Счётчик прогулок пользователя по форме прогулки
+WALK_COUNT_COLUMNS = {
+    WalkForm.STROLLER: "walk_count_stroller",
+    WalkForm.DOG: "walk_count_dog",
+    WalkForm.STROLLER_DOG: "walk_count_stroller_dog",
+}
 
 
 async def transfer_user_to_family(
@@ -27,173 +39,143 @@ async def transfer_user_to_family(
     Переносит весь личный баланс пользователя в баланс семьи. Возвращает запись журнала перевода
     (owner_type=family), если было что переносить. Если баланс нулевой — возвращает None.
     """
-    user = await _get_user_by_id_or_telegram(session, user_id_or_telegram)
+    user = await resolve_user(session, user_id_or_telegram, for_update=True)
     if not user:
         raise ValueError("Пользователь не найден")
 
-    fam = (
-        await session.execute(select(Family).where(Family.id == family_id).with_for_update())
-    ).scalar_one_or_none()
-    if not fam:
-        raise ValueError("Семья не найдена")
-
-    q = select(User).where(User.id == (user.id)).with_for_update()
-    ul = (await session.execute(q)).scalar_one()
-    amount = int(ul.balance)
+    amount = int(user.balance)
     if amount <= 0:
         return None
 
-    ul.balance = 0
-    fam.balance = int(fam.balance) + amount
-
-    entry = LedgerEntry(
+    writer = LedgerWriter(session)
+    writer.add(
         owner_type=OwnerType.FAMILY,
-        family_id=fam.id,
+        family_id=family_id,
         operation=OperationType.TRANSFER,
         amount=amount,
-        balance_after=int(fam.balance),
         title=title,
         description=description,
-        created_at=dt.datetime.now(tz=dt.timezone.utc),
     )
     # Пользовательская запись для учёта вклада
-    user_entry = LedgerEntry(
+    writer.increment_user(user.id, balance=-amount)
+    writer.add(
         owner_type=OwnerType.USER,
-        user_id=ul.id,
+        user_id=user.id,
         operation=OperationType.TRANSFER,
-        amount=int(amount),
-        balance_after=int(ul.balance),
+        amount=amount,
+        apply=False,
+        balance_after=0,
         title=title,
         description=description,
-        created_at=dt.datetime.now(tz=dt.timezone.utc),
     )
-    session.add(entry)
-    session.add(user_entry)
-    await session.flush()
-    return entry
-
-
-async def _get_user_by_id_or_telegram(
-    session: AsyncSession,
-    user_id_or_telegram: int,
-) -> Optional[User]:
-    """
-    Возвращает пользователя по users.id или users.telegram_id.
-    """
-    user = (
-        await session.execute(
-            select(User).where(User.id == user_id_or_telegram).limit(1)
-        )
-    ).scalar_one_or_none()
-    if user:
-        return user
-    user = (
-        await session.execute(
-            select(User).where(User.telegram_id == user_id_or_telegram).limit(1)
-        )
-    ).scalar_one_or_none()
-    return user
-
-
-async def accrue_steps_points(
-    session: AsyncSession,
-    user_id_or_telegram: int,
+    try:
+        entries = await writer.flush()
+    except LedgerOwnerNotFound as e:
+        if (OwnerType.FAMILY, int(family_id)) in e.missing:
+            raise ValueError("Семья не найдена") from e
+        raise
+    return entries[0]
+
+
+async def stage_steps_accrual(
+    writer: LedgerWriter,
+    user: User,
     amount: int,
     title: str = "Начисление за шаги",
     description: Optional[str] = None,
     trigger_referral_reward: bool = True,
     walk_form: Optional[WalkForm] = None,
-) -> LedgerEntry:
+) -> None:
     """
-    Начисляет баллы за шаги: если пользователь состоит в семье — на баланс семьи,
-    иначе — на личный баланс. Пишет запись в журнал.
-    
-    Args:
-        trigger_referral_reward: Если True, начисляет процент пригласившему (используется для избежания циклических начислений)
+    Добавляет в writer начисление за шаги (на семью, если пользователь в семье,
+    иначе на личный баланс), счётчик прогулок и реферальное вознаграждение.
+    Запись — при writer.flush().
     """
     if amount <= 0:
         raise ValueError("Сумма должна быть положительной")
 
-    user = await _get_user_by_id_or_telegram(session, user_id_or_telegram)
-    if not user:
-        raise ValueError("Пользователь не найден")
-
     if user.family_id:
-        fam = (
-            await session.execute(
-                select(Family).where(Family.id == user.family_id).with_for_update()
-            )
-        ).scalar_one_or_none()
-        if not fam:
-            raise ValueError("Семья не найдена")
-        fam.balance = int(fam.balance) + int(amount)
-        entry = LedgerEntry(
+        writer.add(
             owner_type=OwnerType.FAMILY,
-            family_id=fam.id,
+            family_id=user.family_id,
             operation=OperationType.STEPS_ACCRUAL,
             amount=int(amount),
-            balance_after=int(fam.balance),
             title=title,
             description=description,
             walk_form=walk_form,
-            created_at=dt.datetime.now(tz=dt.timezone.utc),
         )
         # Также фиксируем пользовательскую проводку для статистики вклада
-        user_entry = LedgerEntry(
+        writer.add(
             owner_type=OwnerType.USER,
             user_id=user.id,
             operation=OperationType.STEPS_ACCRUAL,
             amount=int(amount),
-            balance_after=None,
+            apply=False,
             title=title,
             description=description,
             walk_form=walk_form,
-            created_at=dt.datetime.now(tz=dt.timezone.utc),
         )
-        session.add(user_entry)
     else:
-        q = select(User).where(User.id == user.id).with_for_update()
-        user_locked = (await session.execute(q)).scalar_one()
-        user_locked.balance = int(user_locked.balance) + int(amount)
-        entry = LedgerEntry(
+        writer.add(
             owner_type=OwnerType.USER,
-            user_id=user_locked.id,
+            user_id=user.id,
             operation=OperationType.STEPS_ACCRUAL,
             amount=int(amount),
-            balance_after=int(user_locked.balance),
             title=title,
             description=description,
             walk_form=walk_form,
-            created_at=dt.datetime.now(tz=dt.timezone.utc),
         )
-    session.add(entry)
-    await session.flush()
 
     # Инкремент счётчика прогулок по типу
     if walk_form is not None:
-        col_map = {
-            WalkForm.STROLLER: User.walk_count_stroller,
-            WalkForm.DOG: User.walk_count_dog,
-            WalkForm.STROLLER_DOG: User.walk_count_stroller_dog,
-        }
-        count_col = col_map[walk_form]
-        await session.execute(
-            update(User).where(User.id == user.id).values(
-                **{count_col.key: count_col + 1}
-            )
-        )
-        await session.flush()
-    
+        writer.increment_user(user.id, **{WALK_COUNT_COLUMNS[walk_form]: 1})
+
     # Реферальное вознаграждение: если пользователь - чей-то реферал, начисляем процент пригласившему
     if trigger_referral_reward and title in ("Начисление за шаги", "Начисление за прогулку"):
         from app.steps_bot.services.referral_service import reward_inviter_for_referral_earning
         await reward_inviter_for_referral_earning(
-            session=session,
+            session=writer.session,
             user_id=user.id,
             earned_amount=int(amount),
+            writer=writer,
         )
+
+
+async def accrue_steps_points(
+    session: AsyncSession,
+    user_id_or_telegram: int,
+    amount: int,
+    title: str = "Начисление за шаги",
+    description: Optional[str] = None,
+    trigger_referral_reward: bool = True,
+    walk_form: Optional[WalkForm] = None,
+) -> LedgerEntry:
+    """
+    Начисляет баллы за шаги: если пользователь состоит в семье — на баланс семьи,
+    иначе — на личный баланс. Пишет запись в журнал.
     
-    return entry
+    Args:
+        trigger_referral_reward: Если True, начисляет процент пригласившему (используется для избежания циклических начислений)
+    """
+    if amount <= 0:
+        raise ValueError("Сумма должна быть положительной")
+
+    user = await resolve_user(session, user_id_or_telegram)
+    if not user:
+        raise ValueError("Пользователь не найден")
+
+    writer = LedgerWriter(session)
+    await stage_steps_accrual(
+        writer,
+        user,
+        amount,
+        title=title,
+        description=description,
+        trigger_referral_reward=trigger_referral_reward,
+        walk_form=walk_form,
+    )
+    entries = await writer.flush()
+    return entries[0]
 
 
 async def purchase_from_family_proportional(
@@ -230,68 +212,44 @@ async def purchase_from_family_proportional(
         raise ValueError("Недостаточно баллов семьи")
 
     remaining = int(amount)
-    entries: list[LedgerEntry] = []
+    writer = LedgerWriter(session)
 
     take_family = min(remaining, int(family.balance))
     if take_family > 0:
-        family.balance = int(family.balance) - take_family
-        entries.append(
-            LedgerEntry(
-                owner_type=OwnerType.FAMILY,
-                family_id=family.id,
-                operation=OperationType.PURCHASE,
-                amount=-take_family,
-                balance_after=int(family.balance),
-                order_id=order_id,
-                title=title,
-                description=description,
-                created_at=dt.datetime.now(tz=dt.timezone.utc),
-            )
+        writer.add(
+            owner_type=OwnerType.FAMILY,
+            family_id=family.id,
+            operation=OperationType.PURCHASE,
+            amount=-take_family,
+            order_id=order_id,
+            title=title,
+            description=description,
         )
         remaining -= take_family
 
-    if remaining == 0 or not members:
-        for e in entries:
-            session.add(e)
-        await session.flush()
-        return entries
-
     members_total = sum(int(u.balance) for u in members)
-    if members_total == 0:
-        for e in entries:
-            session.add(e)
-        await session.flush()
-        return entries
-
-    allocated = 0
-    for i, u in enumerate(members):
-        if i < len(members) - 1:
-            part = (int(u.balance) * remaining) // members_total
-            part = min(part, int(u.balance))
-        else:
-            part = min(remaining - allocated, int(u.balance))
-        if part <= 0:
-            continue
-        u.balance = int(u.balance) - part
-        allocated += part
-        entries.append(
-            LedgerEntry(
+    if remaining > 0 and members_total > 0:
+        allocated = 0
+        for i, u in enumerate(members):
+            if i < len(members) - 1:
+                part = (int(u.balance) * remaining) // members_total
+                part = min(part, int(u.balance))
+            else:
+                part = min(remaining - allocated, int(u.balance))
+            if part <= 0:
+                continue
+            allocated += part
+            writer.add(
                 owner_type=OwnerType.USER,
                 user_id=u.id,
                 operation=OperationType.PURCHASE,
                 amount=-part,
-                balance_after=int(u.balance),
                 order_id=order_id,
                 title=title,
                 description=description,
-                created_at=dt.datetime.now(tz=dt.timezone.utc),
             )
-        )
 
-    for e in entries:
-        session.add(e)
-    await session.flush()
-    return entries
+    return await writer.flush()
 
 
 async def purchase_from_user(
@@ -308,31 +266,32 @@ async def purchase_from_user(
     if amount <= 0:
         raise ValueError("Сумма должна быть положительной")
 
-    user = await _get_user_by_id_or_telegram(session, user_id_or_telegram)
-    if not user:
+    user_locked = await resolve_user(session, user_id_or_telegram, for_update=True)
+    if not user_locked:
         raise ValueError("Пользователь не найден")
-
-    q = select(User).where(User.id == user.id).with_for_update()
-    user_locked = (await session.execute(q)).scalar_one()
     if int(user_locked.balance) < int(amount):
         raise ValueError("Недостаточно баллов")
 
-    user_locked.balance = int(user_locked.balance) - int(amount)
-
-    entry = LedgerEntry(
+    writer = LedgerWriter(session)
+    writer.add(
         owner_type=OwnerType.USER,
         user_id=user_locked.id,
         operation=OperationType.PURCHASE,
         amount=-int(amount),
-        balance_after=int(user_locked.balance),
         order_id=order_id,
         title=title,
         description=description,
-        created_at=dt.datetime.now(tz=dt.timezone.utc),
     )
-    session.add(entry)
-    await session.flush()
-    return entry
+    entries = await writer.flush()
+    return entries[0]
+
+
+# Операции, из которых складывается вклад участника в семью
+CONTRIBUTION_OPERATIONS = (
+    OperationType.STEPS_ACCRUAL,
+    OperationType.PROMO_ACCRUAL,
+    OperationType.TRANSFER,
+)
 
 
 async def get_user_contribution_points(
@@ -342,74 +301,142 @@ async def get_user_contribution_points(
     """
     Возвращает суммарные заработанные пользователем баллы (вклад):
     суммируются начисления по операциям STEPS_ACCRUAL и PROMO_ACCRUAL
-    из пользовательских проводок (owner_type = user).
+    из пользовательских проводок (owner_type = user). Считается по снимку
+    журнала и хвосту после него.
     """
-    rows = (
-        await session.execute(
-            select(func.coalesce(func.sum(LedgerEntry.amount), 0))
-            .where(
-                (LedgerEntry.owner_type == OwnerType.USER)
-                & (LedgerEntry.user_id == user_id)
-                & (LedgerEntry.operation.in_([
-                    OperationType.STEPS_ACCRUAL,
-                    OperationType.PROMO_ACCRUAL,
-                    OperationType.TRANSFER,
-                ]))
-            )
-        )
-    ).scalar_one()
-    return int(rows or 0)
+    totals = await get_owner_totals(session, OwnerType.USER, user_id)
+    return sum(totals[op].amount for op in CONTRIBUTION_OPERATIONS if op in totals)
 
 
-async def get_history_for_user_with_family(
+async def get_earned_and_spent(
+    session: AsyncSession,
+    owner_type: OwnerType,
+    owner_id: int,
+) -> Tuple[int, int]:
+    """
+    Возвращает (заработано, потрачено) владельцем: начисления за шаги и промо;
+    покупки за вычетом возвратов.
+    """
+    totals = await get_owner_totals(session, owner_type, owner_id)
+
+    def amount(op: OperationType) -> int:
+        return totals[op].amount if op in totals else 0
+
+    earned = amount(OperationType.STEPS_ACCRUAL) + amount(OperationType.PROMO_ACCRUAL)
+    spent = -(amount(OperationType.PURCHASE) + amount(OperationType.REFUND))
+    return earned, spent
+
+
+class HistoryCursor(NamedTuple):
+    """Позиция в истории: (created_at, id) проводки; в callback_data — «мкс:id»."""
+    created_at: dt.datetime
+    id: int
+
+    def encode(self) -> str:
+        micros = (self.created_at - _EPOCH) // dt.timedelta(microseconds=1)
+        return f"{micros}:{self.id}"
+
+    @classmethod
+    def decode(cls, value: str) -> "HistoryCursor":
+        micros, entry_id = value.split(":")
+        return cls(_EPOCH + dt.timedelta(microseconds=int(micros)), int(entry_id))
+
+    @classmethod
+    def of(cls, entry: LedgerEntry) -> "HistoryCursor":
+        return cls(entry.created_at, entry.id)
+
+
+_EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+
+
+class HistoryPage(NamedTuple):
+    user: User
+    family: Optional[Family]
+    entries: Sequence[LedgerEntry]
+    # Курсоры для кнопок «раньше»/«позже»; None — в эту сторону страниц нет
+    older: Optional[HistoryCursor]
+    newer: Optional[HistoryCursor]
+
+
+async def get_history_page(
     session: AsyncSession,
     user_id_or_telegram: int,
     limit: int = 20,
-) -> Tuple[User, Optional[Family], Sequence[LedgerEntry]]:
+    before: Optional[HistoryCursor] = None,
+    after: Optional[HistoryCursor] = None,
+) -> HistoryPage:
     """
-    Возвращает пользователя, его семью и последние операции по пользователю и семье.
+    Страница операций пользователя и его семьи по курсору (created_at, id), от новых к старым.
+    before — страница старше курсора, after — новее; без курсоров — последние операции.
+
+    Проводки пользователя и семьи выбираются двумя отдельными сканами индексов
+    (user_id, created_at, id) и (family_id, created_at, id), каждый с LIMIT,
+    и сливаются через UNION ALL — вместо OR, который не обслуживается одним индексом.
     """
-    user = await _get_user_by_id_or_telegram(session, user_id_or_telegram)
+    user = await resolve_user(session, user_id_or_telegram)
     if not user:
         raise ValueError("Пользователь не найден")
 
     family = None
     if user.family_id:
-        family = (
-            await session.execute(
-                select(Family).where(Family.id == user.family_id).limit(1)
-            )
-        ).scalar_one_or_none()
+        family = await session.get(Family, user.family_id)
 
+    owners = [LedgerEntry.user_id == user.id]
     if family:
-        rows = (
-            await session.execute(
-                select(LedgerEntry)
-                .where(
-                    (
-                        (LedgerEntry.owner_type == OwnerType.USER)
-                        & (LedgerEntry.user_id == user.id)
-                    )
-                    | (
-                        (LedgerEntry.owner_type == OwnerType.FAMILY)
-                        & (LedgerEntry.family_id == family.id)
-                    )
-                )
-                .order_by(LedgerEntry.created_at.desc(), LedgerEntry.id.desc())
-                .limit(limit)
-            )
-        ).scalars().all()
-        return user, family, rows
+        owners.append(LedgerEntry.family_id == family.id)
+
+    forward = after is not None
+    key = tuple_(LedgerEntry.created_at, LedgerEntry.id)
+    if forward:
+        position = key > tuple_(literal(after.created_at), literal(after.id))
+        order = (LedgerEntry.created_at.asc(), LedgerEntry.id.asc())
+    elif before is not None:
+        position = key < tuple_(literal(before.created_at), literal(before.id))
+        order = (LedgerEntry.created_at.desc(), LedgerEntry.id.desc())
+    else:
+        position = None
+        order = (LedgerEntry.created_at.desc(), LedgerEntry.id.desc())
+
+    # +1 строка — признак, что дальше в этом направлении есть ещё страница
+    branches = []
+    for owner in owners:
+        q = select(LedgerEntry).where(owner)
+        if position is not None:
+            q = q.where(position)
+        branches.append(q.order_by(*order).limit(limit + 1))
+    merged = union_all(*branches).subquery() if len(branches) > 1 else branches[0].subquery()
+    entry = aliased(LedgerEntry, merged)
+    if forward:
+        merged_order = (entry.created_at.asc(), entry.id.asc())
+    else:
+        merged_order = (entry.created_at.desc(), entry.id.desc())
+    rows = list(
+        (await session.execute(select(entry).order_by(*merged_order).limit(limit + 1))).scalars()
+    )
 
-    rows = (
-        await session.execute(
-            select(LedgerEntry)
-            .where(
-                (LedgerEntry.owner_type == OwnerType.USER)
-                & (LedgerEntry.user_id == user.id)
-            )
-            .order_by(LedgerEntry.created_at.desc(), LedgerEntry.id.desc())
-            .limit(limit)
-        )
-    ).scalars().all()
-    return user, None, rows
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if forward:
+        rows.reverse()
+    if not rows:
+        return HistoryPage(user, family, rows, None, None)
+
+    if forward:
+        older = HistoryCursor.of(rows[-1])
+        newer = HistoryCursor.of(rows[0]) if has_more else None
+    else:
+        older = HistoryCursor.of(rows[-1]) if has_more else None
+        newer = HistoryCursor.of(rows[0]) if before is not None else None
+    return HistoryPage(user, family, rows, older, newer)
+
+
+async def get_history_for_user_with_family(
+    session: AsyncSession,
+    user_id_or_telegram: int,
+    limit: int = 20,
+) -> Tuple[User, Optional[Family], Sequence[LedgerEntry]]:
+    """
+    Возвращает пользователя, его семью и последние операции по пользователю и семье.
+    """
+    page = await get_history_page(session, user_id_or_telegram, limit=limit)
+    return page.user, page.family, page.entries
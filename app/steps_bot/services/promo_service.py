@@ -4,6 +4,7 @@ from typing import Optional, Sequence, Tuple
 
 from sqlalchemy import select
 
+from app.steps_bot.db.identity import UserId
 from app.steps_bot.db.repo import get_session, get_user_with_family, family_points_enough
 from app.steps_bot.db.models.promo import PromoGroup, PromoCode
 from app.steps_bot.services.ledger_service import purchase_from_family_proportional, purchase_from_user
@@ -32,70 +33,69 @@ async def purchase_and_acquire_code_family(
     Возвращает (код|None, группа|None, ошибка|None).
     """
     async with get_session() as session:
-        async with session.begin():
-            group = await session.get(PromoGroup, group_id)
-            if not group or not group.is_active:
-                return None, group, "Группа недоступна"
-
-            res = await session.execute(
-                select(PromoCode)
-                .where(
-                    PromoCode.group_id == group_id,
-                    PromoCode.is_active.is_(True),
-                    PromoCode.used_count < PromoCode.max_uses,
-                )
-                .order_by(PromoCode.id.asc())
-                .with_for_update(skip_locked=True)
-                .limit(1)
+        group = await session.get(PromoGroup, group_id)
+        if not group or not group.is_active:
+            return None, group, "Группа недоступна"
+
+        res = await session.execute(
+            select(PromoCode)
+            .where(
+                PromoCode.group_id == group_id,
+                PromoCode.is_active.is_(True),
+                PromoCode.used_count < PromoCode.max_uses,
             )
-            code_obj = res.scalars().first()
-            if not code_obj:
-                return None, group, "В данной группе нет промокодов"
-
-            user, family, _ = await get_user_with_family(session, user_id_or_telegram)
-
-            price = int(group.price_points or 0)
-            if price > 0:
-                if family:
-                    # Пользователь в семье - списываем с семьи
-                    enough = await family_points_enough(session, family.id, price)
-                    if not enough:
-                        return None, group, f"Недостаточно баллов семьи: нужно {price}"
-
-                    try:
-                        await purchase_from_family_proportional(
-                            session=session,
-                            family_id=family.id,
-                            amount=price,
-                            order_id=None,
-                            title="Покупка промокода",
-                            description=f"{group.name}",
-                        )
-                    except ValueError as e:
-                        return None, group, str(e)
-                else:
-                    # Пользователь без семьи - списываем с личного баланса
-                    if int(user.balance) < price:
-                        return None, group, f"Недостаточно баллов: нужно {price}"
-
-                    try:
-                        await purchase_from_user(
-                            session=session,
-                            user_id_or_telegram=user_id_or_telegram,
-                            amount=price,
-                            order_id=None,
-                            title="Покупка промокода",
-                            description=f"{group.name}",
-                        )
-                    except ValueError as e:
-                        return None, group, str(e)
-
-            code_obj.used_count += 1
-            if code_obj.used_count >= code_obj.max_uses:
-                code_obj.is_active = False
-
-            await session.flush()
-            return code_obj.code, group, None
+            .order_by(PromoCode.id.asc())
+            .with_for_update(skip_locked=True)
+            .limit(1)
+        )
+        code_obj = res.scalars().first()
+        if not code_obj:
+            return None, group, "В данной группе нет промокодов"
+
+        user, family, _ = await get_user_with_family(session, user_id_or_telegram)
+
+        price = int(group.price_points or 0)
+        if price > 0:
+            if family:
+                # Пользователь в семье - списываем с семьи
+                enough = await family_points_enough(session, family.id, price)
+                if not enough:
+                    return None, group, f"Недостаточно баллов семьи: нужно {price}"
+
+                try:
+                    await purchase_from_family_proportional(
+                        session=session,
+                        family_id=family.id,
+                        amount=price,
+                        order_id=None,
+                        title="Покупка промокода",
+                        description=f"{group.name}",
+                    )
+                except ValueError as e:
+                    return None, group, str(e)
+            else:
+                # Пользователь без семьи - списываем с личного баланса
+                if int(user.balance) < price:
+                    return None, group, f"Недостаточно баллов: нужно {price}"
+
+                try:
+                    await purchase_from_user(
+                        session=session,
+                        user_id_or_telegram=UserId(user.id),
+                        amount=price,
+                        order_id=None,
+                        title="Покупка промокода",
+                        description=f"{group.name}",
+                    )
+                except ValueError as e:
+                    return None, group, str(e)
+
+        code_obj.used_count += 1
+        if code_obj.used_count >= code_obj.max_uses:
+            code_obj.is_active = False
+
+        await session.flush()
+        return code_obj.code, group, None
 
 
 async def acquire_code(group_id: int) -> Tuple[Optional[str], Optional[PromoGroup]]:
@@ -103,29 +103,28 @@ async def acquire_code(group_id: int) -> Tuple[Optional[str], Optional[PromoGrou
     Атомарно выдаёт код из группы и помечает использование.
     """
     async with get_session() as session:
-        async with session.begin():
-            group = await session.get(PromoGroup, group_id)
-            if not group or not group.is_active:
-                return None, group
-
-            res = await session.execute(
-                select(PromoCode)
-                .where(
-                    PromoCode.group_id == group_id,
-                    PromoCode.is_active.is_(True),
-                    PromoCode.used_count < PromoCode.max_uses,
-                )
-                .order_by(PromoCode.id.asc())
-                .with_for_update(skip_locked=True)
-                .limit(1)
+        group = await session.get(PromoGroup, group_id)
+        if not group or not group.is_active:
+            return None, group
+
+        res = await session.execute(
+            select(PromoCode)
+            .where(
+                PromoCode.group_id == group_id,
+                PromoCode.is_active.is_(True),
+                PromoCode.used_count < PromoCode.max_uses,
             )
-            code_obj = res.scalars().first()
-            if not code_obj:
-                return None, group
+            .order_by(PromoCode.id.asc())
+            .with_for_update(skip_locked=True)
+            .limit(1)
+        )
+        code_obj = res.scalars().first()
+        if not code_obj:
+            return None, group
 
-            code_obj.used_count += 1
-            if code_obj.used_count >= code_obj.max_uses:
-                code_obj.is_active = False
+        code_obj.used_count += 1
+        if code_obj.used_count >= code_obj.max_uses:
+            code_obj.is_active = False
 
-            await session.flush()
-            return code_obj.code, group
+        await session.flush()
+        return code_obj.code, group
@@ -0,0 +1,119 @@
+"""
+Разбор и нормализация адресов ПВЗ для поиска.
+
+Адреса приходят в свободной форме: «Москва Ленинградский проспект 75 к1А»,
+«г. Казань, ул. Баумана, 12». Из адреса выделяются город и улица; все три
+поисковых значения приводятся к одной форме: нижний регистр, «ё» → «е»,
+пунктуация → пробел. Модуль без зависимостей: его использует и импорт
+в боте/API, и сохранение ПВЗ в Django-админке.
+"""
+from __future__ import annotations
+
+import re
+from typing import NamedTuple
+
+_NON_WORD_RE = re.compile(r"[^0-9a-zа-я]+")
+_DIGIT_RE = re.compile(r"\d")
+_POSTCODE_RE = re.compile(r"^\d{6}$")
+
+# Префиксы населённого пункта, которые не входят в название
+_CITY_PREFIXES = {"г", "город", "гор", "пгт", "пос", "поселок", "с", "село", "д", "деревня"}
+# Части адреса, стоящие перед городом (регион, район)
+_REGION_WORDS = {"обл", "область", "край", "респ", "республика", "район", "р-н", "ао", "округ"}
+# Типы улиц в поисковой форме («пр-т» → «пр т»): в запросе улицы не сужают поиск,
+# «ул ленина» найдёт и «проспект ленина»
+_STREET_TYPES = {
+    "ул", "улица", "пр", "т", "просп", "проспект", "пер", "переулок", "ш", "шоссе",
+    "б", "р", "бул", "бульвар", "наб", "набережная", "пл", "площадь", "проезд", "мкр", "микрорайон",
+}
+# Окончания прилагательных: «Нижний Новгород», «Набережные Челны», «Старый Оскол»
+_ADJECTIVE_ENDINGS = ("ий", "ый", "ой", "ая", "ое", "ие", "ые", "яя")
+# Длины колонок pvz.city / pvz.street / pvz.search: длиннее COPY и UPDATE не пропустят
+CITY_MAX_LENGTH = 128
+STREET_MAX_LENGTH = 255
+SEARCH_MAX_LENGTH = 255
+
+
+class ParsedAddress(NamedTuple):
+    city: str
+    street: str
+    search: str
+
+
+def normalize_text(value: str) -> str:
+    """Поисковая форма строки: нижний регистр, «ё» → «е», только буквы, цифры и пробелы."""
+    text = (value or "").lower().replace("ё", "е")
+    return _NON_WORD_RE.sub(" ", text).strip()
+
+
+def street_tokens(query: str) -> list[str]:
+    """Слова запроса улицы в поисковой форме без типов улиц (если остались другие слова)."""
+    words = normalize_text(query).split()
+    named = [w for w in words if w not in _STREET_TYPES]
+    return named or words
+
+
+def _strip_city_prefix(words: list[str]) -> list[str]:
+    while words and words[0] in _CITY_PREFIXES and len(words) > 1:
+        words = words[1:]
+    return words
+
+
+def _is_region(segment: str) -> bool:
+    return any(word in _REGION_WORDS for word in segment.lower().replace(".", " ").split())
+
+
+def _city_from_words(words: list[str]) -> int:
+    """Сколько первых слов адреса без запятых занимает город (1 или 2)."""
+    if (
+        len(words) > 2
+        and words[0].endswith(_ADJECTIVE_ENDINGS)
+        and not _DIGIT_RE.search(words[1])
+        and words[1][:1].isupper()
+    ):
+        return 2
+    return 1
+
+
+def _clip(value: str, limit: int) -> str:
+    return value[:limit].rstrip()
+
+
+def _street_from(words: list[str]) -> str:
+    """Улица — слова до первого слова с цифрой (номер дома, корпус)."""
+    street = []
+    for word in words:
+        if _DIGIT_RE.search(word):
+            break
+        street.append(word)
+    return " ".join(street)
+
+
+def parse_address(full_address: str) -> ParsedAddress:
+    """
+    Выделяет город и улицу из адреса ПВЗ. С запятыми город — первая часть после
+    индекса и региона, улица — следующая; без запятых город — первое слово
+    (два, если первое — прилагательное), улица — слова до номера дома.
+    Значения обрезаются до длины колонок pvz.
+    """
+    address = (full_address or "").strip()
+    segments = [s.strip() for s in address.split(",") if s.strip()]
+    if len(segments) > 1:
+        while len(segments) > 1 and (_POSTCODE_RE.match(segments[0]) or _is_region(segments[0])):
+            segments = segments[1:]
+        city_words = _strip_city_prefix(normalize_text(segments[0]).split())
+        city = " ".join(city_words)
+        street = normalize_text(_street_from(segments[1].split())) if len(segments) > 1 else ""
+    else:
+        words = address.split()
+        words = words[1:] if words and _POSTCODE_RE.match(words[0]) else words
+        while len(words) > 1 and normalize_text(words[0]) in _CITY_PREFIXES:
+            words = words[1:]
+        size = _city_from_words(words)
+        city = normalize_text(" ".join(words[:size]))
+        street = normalize_text(_street_from(words[size:]))
+    return ParsedAddress(
+        city=_clip(city, CITY_MAX_LENGTH),
+        street=_clip(street, STREET_MAX_LENGTH),
+        search=_clip(normalize_text(address), SEARCH_MAX_LENGTH),
+    )
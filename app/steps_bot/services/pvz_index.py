@@ -0,0 +1,213 @@
+"""
+Индекс ПВЗ в памяти процесса.
+
+Список ПВЗ меняется только импортом (POST /pvz) и правками в админке, а читается
+на каждом шаге выбора города и улицы. Индекс — снимок таблицы pvz: город →
+отсортированные по адресу ПВЗ, плюс отсортированные слова адресов для поиска
+по префиксу. Перестраивается целиком и подменяется одним присваиванием по NOTIFY
+pvz_changed (триггер на pvz, приходит после коммита) и раз в PVZ_INDEX_TTL_SECONDS.
+Опечатки, которые префиксом не найти, ищет триграммный поиск в БД (repo.search_pvz).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from app.steps_bot.db import repo
+from app.steps_bot.db.models.pvz import PVZ
+from app.steps_bot.db.notify import pg_listener
+from app.steps_bot.services.pvz_address import normalize_text, parse_address, street_tokens
+from app.steps_bot.settings import config
+
+logger = logging.getLogger(__name__)
+
+PVZ_CHANNEL = "pvz_changed"
+
+
+class PvzEntry(NamedTuple):
+    """ПВЗ в индексе; id и full_address — как у модели PVZ (для pvz_list_kb)."""
+    id: str
+    full_address: str
+    tokens: Tuple[str, ...]
+
+
+class _CityIndex:
+    __slots__ = ("entries", "tokens")
+
+    def __init__(self, entries: List[PvzEntry]) -> None:
+        entries.sort(key=lambda e: e.full_address)
+        self.entries = entries
+        # (слово, номер ПВЗ) по возрастанию: все слова с префиксом — один отрезок списка
+        self.tokens = sorted({(t, i) for i, e in enumerate(entries) for t in e.tokens})
+
+    def _prefixed(self, prefix: str) -> Set[int]:
+        found: Set[int] = set()
+        i = bisect_left(self.tokens, (prefix,))
+        while i < len(self.tokens) and self.tokens[i][0].startswith(prefix):
+            found.add(self.tokens[i][1])
+            i += 1
+        return found
+
+    def search(self, words: List[str]) -> List[PvzEntry]:
+        """ПВЗ, где каждое слово запроса — префикс слова адреса; точные совпадения выше."""
+        matched: Optional[Set[int]] = None
+        for word in words:
+            ids = self._prefixed(word)
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                return []
+        exact = set(words)
+        ranked = sorted(matched or (), key=lambda i: (-len(exact.intersection(self.entries[i].tokens)), i))
+        return [self.entries[i] for i in ranked]
+
+
+class PvzIndex:
+    """Неизменяемый снимок таблицы pvz, собранный build()."""
+
+    __slots__ = ("cities", "city_names", "size", "loaded_at")
+
+    def __init__(self, cities: Dict[str, _CityIndex]) -> None:
+        self.cities = cities
+        self.city_names = sorted(cities)
+        self.size = sum(len(c.entries) for c in cities.values())
+        self.loaded_at = time.monotonic()
+
+    @classmethod
+    def build(cls, rows) -> "PvzIndex":
+        """rows — (id, full_address, city, search); пустые city/search разбираются из адреса."""
+        grouped: Dict[str, List[PvzEntry]] = {}
+        for pvz_id, full_address, city, search in rows:
+            if city is None or search is None:
+                parsed = parse_address(full_address)
+                city, search = parsed.city, parsed.search
+            entry = PvzEntry(str(pvz_id), full_address, tuple(search.split()))
+            grouped.setdefault(city, []).append(entry)
+        return cls({city: _CityIndex(entries) for city, entries in grouped.items()})
+
+    def resolve_city(self, city: str) -> Optional[str]:
+        """Точное совпадение, иначе город с префиксом запроса и наибольшим числом ПВЗ."""
+        query = normalize_text(city)
+        if not query:
+            return None
+        if query in self.cities:
+            return query
+        best = None
+        i = bisect_left(self.city_names, query)
+        while i < len(self.city_names) and self.city_names[i].startswith(query):
+            name = self.city_names[i]
+            if best is None or len(self.cities[name].entries) > len(self.cities[best].entries):
+                best = name
+            i += 1
+        return best
+
+    def search(self, city: str, street: Optional[str] = None) -> List[PvzEntry]:
+        found = self.cities.get(city)
+        if found is None:
+            return []
+        if not street:
+            return found.entries
+        words = street_tokens(street)
+        return found.search(words) if words else []
+
+
+_index: Optional[PvzIndex] = None
+_load_lock = asyncio.Lock()
+_reload_task: Optional[asyncio.Task] = None
+_reload_again = False
+
+
+async def _load_index() -> PvzIndex:
+    async with repo.get_session(isolated=True) as s:
+        rows = (await s.execute(select(PVZ.id, PVZ.full_address, PVZ.city, PVZ.search))).all()
+    index = PvzIndex.build(rows)
+    logger.info("Индекс ПВЗ загружен: %s ПВЗ, %s городов", index.size, len(index.cities))
+    return index
+
+
+async def get_pvz_index() -> Optional[PvzIndex]:
+    """
+    Текущий индекс; загружает его при первом обращении и по истечении PVZ_INDEX_TTL_SECONDS.
+    None — БД недоступна и индекса ещё нет (поиск уйдёт в БД).
+    """
+    global _index
+    index = _index
+    if index is not None and time.monotonic() - index.loaded_at < config.PVZ_INDEX_TTL_SECONDS:
+        return index
+    async with _load_lock:
+        index = _index
+        if index is None or time.monotonic() - index.loaded_at >= config.PVZ_INDEX_TTL_SECONDS:
+            try:
+                index = _index = await _load_index()
+            except Exception as e:
+                logger.error("Не удалось загрузить индекс ПВЗ: %s", e)
+    return index
+
+
+async def reload_pvz_index() -> None:
+    """Собирает новый индекс и подменяет текущий; читатели до подмены видят старый целиком."""
+    global _index
+    async with _load_lock:
+        try:
+            _index = await _load_index()
+        except Exception as e:
+            logger.error("Не удалось перестроить индекс ПВЗ: %s", e)
+
+
+async def _reload_loop() -> None:
+    global _reload_task, _reload_again
+    try:
+        while True:
+            _reload_again = False
+            await reload_pvz_index()
+            if not _reload_again:
+                break
+    finally:
+        _reload_task = None
+
+
+def notify_pvz_changed(_payload: Optional[str] = None) -> None:
+    """Колбэк NOTIFY pvz_changed: перестроить индекс (уведомления во время сборки — ещё раз)."""
+    global _reload_task, _reload_again
+    if _reload_task is not None:
+        _reload_again = True
+        return
+    _reload_task = asyncio.create_task(_reload_loop())
+
+
+def subscribe_pvz_changes() -> None:
+    """Подписывает индекс на изменения таблицы pvz (вызывать до pg_listener.start())."""
+    pg_listener.subscribe(PVZ_CHANNEL, notify_pvz_changed)
+
+
+async def resolve_pvz_city(city: str) -> Optional[str]:
+    """Город из базы ПВЗ по вводу пользователя: индекс, иначе триграммы в БД."""
+    index = await get_pvz_index()
+    if index is not None:
+        found = index.resolve_city(city)
+        if found is not None:
+            return found
+    async with repo.get_session() as session:
+        return await repo.resolve_pvz_city(session, city)
+
+
+async def search_pvz(
+    city: str,
+    street: Optional[str] = None,
+    offset: int = 0,
+) -> Tuple[List[PvzEntry | PVZ], int]:
+    """
+    Страница ПВЗ города и всего найдено (не больше PVZ_SEARCH_LIMIT): из индекса,
+    а если по префиксам ничего нет — ранжированный триграммный поиск в БД.
+    """
+    index = await get_pvz_index()
+    if index is not None:
+        found = index.search(city, street)[: config.PVZ_SEARCH_LIMIT]
+        if found:
+            return found[offset: offset + config.PVZ_PAGE_SIZE], len(found)
+    async with repo.get_session() as session:
+        return await repo.search_pvz(session, city, street, offset=offset)
@@ -6,9 +6,11 @@ from __future__ import annotations
 import logging
 from typing import Optional, Tuple, List
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.steps_bot.db.ledger_writer import LedgerWriter
+from app.steps_bot.db.models.ledger import OperationType, OwnerType
 from app.steps_bot.db.models.user import User
 from app.steps_bot.db.models.family import Family
 from app.steps_bot.db.models.referral import Referral
@@ -88,7 +90,6 @@ async def create_referral(
     )
     session.add(referral)
     await session.flush()
-    await session.commit()
     
     logger.info(f"Referral created: user={user.telegram_id}, inviter={inviter.telegram_id}")
     return referral
@@ -98,6 +99,7 @@ async def reward_inviter_for_referral_earning(
     session: AsyncSession,
     user_id: int,
     earned_amount: int,
+    writer: Optional[LedgerWriter] = None,
 ) -> Optional[int]:
     """
     Начисляет пригласившему процент от заработка реферала.
@@ -106,14 +108,19 @@ async def reward_inviter_for_referral_earning(
         session: Сессия БД
         user_id: ID пользователя (реферала), который заработал баллы
         earned_amount: Количество заработанных баллов
+        writer: Пакет проводок вызывающего; если не передан — записываем сразу
     
     Returns:
         Optional[int]: Количество начисленных баллов пригласившему или None
     """
-    # Проверяем, является ли пользователь чьим-то рефералом
-    referral = await session.scalar(
-        select(Referral).where(Referral.user_id == user_id)
-    )
+    # Реферальная связь и семья пригласившего — одним запросом
+    referral = (
+        await session.execute(
+            select(Referral.id, Referral.inviter_id, User.family_id)
+            .join(User, User.id == Referral.inviter_id)
+            .where(Referral.user_id == user_id)
+        )
+    ).first()
     
     if not referral:
         return None  # Пользователь не является рефералом
@@ -127,57 +134,49 @@ async def reward_inviter_for_referral_earning(
     if reward_amount <= 0:
         return None
     
-    # Обновляем накопленное вознаграждение в записи реферала
-    referral.reward_points += reward_amount
-    
-    # Получаем реферала для информации
-    referred_user = await session.scalar(
-        select(User).where(User.id == user_id)
+    # Реферал обычно уже в identity map сессии — без запроса
+    referred_user = await session.get(User, user_id)
+    description = (
+        f"Вознаграждение {reward_percent}% от заработка реферала "
+        f"@{referred_user.username or referred_user.telegram_id}"
     )
     
-    # Начисляем баллы пригласившему напрямую (без создания пользовательских записей для статистики)
-    from app.steps_bot.db.models.ledger import LedgerEntry, OwnerType, OperationType
-    from app.steps_bot.db.models.family import Family
-    import datetime as dt
+    own_writer = writer is None
+    if own_writer:
+        writer = LedgerWriter(session)
     
-    inviter = await session.scalar(
-        select(User).where(User.id == referral.inviter_id).with_for_update()
+    # Обновляем накопленное вознаграждение в записи реферала
+    writer.also(
+        update(Referral)
+        .where(Referral.id == referral.id)
+        .values(reward_points=Referral.reward_points + reward_amount)
+        .returning(Referral.id)
     )
     
-    if inviter.family_id:
+    # Начисляем баллы пригласившему напрямую (без создания пользовательских записей для статистики)
+    if referral.family_id:
         # Начисляем в семейный баланс
-        fam = await session.scalar(
-            select(Family).where(Family.id == inviter.family_id).with_for_update()
+        writer.add(
+            owner_type=OwnerType.FAMILY,
+            family_id=referral.family_id,
+            operation=OperationType.PROMO_ACCRUAL,  # Используем PROMO_ACCRUAL для реферальных
+            amount=reward_amount,
+            title="Реферальное начисление",
+            description=description,
         )
-        if fam:
-            fam.balance = int(fam.balance) + reward_amount
-            entry = LedgerEntry(
-                owner_type=OwnerType.FAMILY,
-                family_id=fam.id,
-                operation=OperationType.PROMO_ACCRUAL,  # Используем PROMO_ACCRUAL для реферальных
-                amount=reward_amount,
-                balance_after=int(fam.balance),
-                title="Реферальное начисление",
-                description=f"Вознаграждение {reward_percent}% от заработка реферала @{referred_user.username or referred_user.telegram_id}",
-                created_at=dt.datetime.now(tz=dt.timezone.utc),
-            )
-            session.add(entry)
     else:
         # Начисляем на личный баланс
-        inviter.balance = int(inviter.balance) + reward_amount
-        entry = LedgerEntry(
+        writer.add(
             owner_type=OwnerType.USER,
-            user_id=inviter.id,
+            user_id=referral.inviter_id,
             operation=OperationType.PROMO_ACCRUAL,  # Используем PROMO_ACCRUAL для реферальных
             amount=reward_amount,
-            balance_after=int(inviter.balance),
             title="Реферальное начисление",
-            description=f"Вознаграждение {reward_percent}% от заработка реферала @{referred_user.username or referred_user.telegram_id}",
-            created_at=dt.datetime.now(tz=dt.timezone.utc),
+            description=description,
         )
-        session.add(entry)
     
-    await session.flush()
+    if own_writer:
+        await writer.flush()
     logger.info(
         f"Referral reward: inviter_id={referral.inviter_id}, "
         f"referral_id={user_id}, earned={earned_amount}, "
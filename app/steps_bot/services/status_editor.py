@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from app.steps_bot import metrics
+from app.steps_bot.settings import config
+
+logger = logging.getLogger(__name__)
+
+edits_submitted = metrics.counter(
+    "status_edits_submitted_total", "Запрошенные обновления лайв-статуса"
+)
+edits_sent = metrics.counter(
+    "status_edits_sent_total", "Фактически отправленные edit_message_text"
+)
+edits_saved = metrics.counter(
+    "status_edits_saved_total", "Обновления, не ушедшие в Telegram (без изменений/склеены/сброшены)"
+)
+edits_unchanged = metrics.counter(
+    "status_edits_unchanged_total", "Пропущенные обновления с тем же текстом"
+)
+
+
+class _Slot:
+    """Состояние лайв-сообщения одного чата."""
+    __slots__ = (
+        "chat_id",
+        "message_id",
+        "sent_text",
+        "sent_at",
+        "pending_text",
+        "reply_markup",
+        "on_replaced",
+        "timer",
+    )
+
+    def __init__(self, chat_id: int, message_id: int) -> None:
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.sent_text: Optional[str] = None
+        self.sent_at = 0.0
+        self.pending_text: Optional[str] = None
+        self.reply_markup: Any = None
+        self.on_replaced: Optional[Callable[[int], None]] = None
+        self.timer: Optional[asyncio.Task] = None
+
+
+class StatusEditor:
+    """
+    Склеивает правки лайв-статуса по чату: в Telegram уходит только последний текст
+    и не чаще одного раза в interval секунд; неизменившийся текст не отправляется вовсе.
+    """
+
+    def __init__(self, interval: Optional[float] = None) -> None:
+        self._interval = interval if interval is not None else config.STATUS_EDIT_INTERVAL_SECONDS
+        self._slots: Dict[int, _Slot] = {}
+
+    def _slot(self, chat_id: int, message_id: int) -> _Slot:
+        slot = self._slots.get(chat_id)
+        if slot is None or slot.message_id != message_id:
+            if slot is not None and slot.timer is not None:
+                slot.timer.cancel()
+            slot = self._slots[chat_id] = _Slot(chat_id, message_id)
+        return slot
+
+    def remember(self, chat_id: int, message_id: int, text: str) -> None:
+        """Запоминает только что отправленное сообщение, чтобы следующая правка шла с интервалом."""
+        slot = self._slot(chat_id, message_id)
+        slot.sent_text = text
+        slot.sent_at = time.monotonic()
+
+    async def submit(
+        self,
+        bot: Bot,
+        chat_id: int,
+        message_id: int,
+        text: str,
+        *,
+        reply_markup: Any = None,
+        on_replaced: Optional[Callable[[int], None]] = None,
+    ) -> None:
+        """
+        Ставит текст статуса в очередь на отправку.
+
+        on_replaced вызывается с новым message_id, если старое сообщение отредактировать
+        нельзя и статус пришлось отправить заново.
+        """
+        edits_submitted.inc()
+        slot = self._slot(chat_id, message_id)
+        slot.reply_markup = reply_markup
+        slot.on_replaced = on_replaced
+
+        if slot.timer is not None:
+            # Уже ждём отправки — просто подменяем текст на свежий
+            if slot.pending_text is not None:
+                edits_saved.inc()
+            slot.pending_text = text
+            return
+
+        if text == slot.sent_text:
+            edits_unchanged.inc()
+            edits_saved.inc()
+            return
+
+        slot.pending_text = text
+        wait = self._interval - (time.monotonic() - slot.sent_at)
+        if wait <= 0:
+            await self._push(bot, slot)
+        else:
+            slot.timer = asyncio.create_task(self._push_later(bot, slot, wait))
+
+    def drain(self, chat_id: int) -> None:
+        """
+        Сбрасывает отложенную правку и забывает чат (вызывается при завершении прогулки,
+        когда статус всё равно заменяется итоговым сообщением).
+        """
+        slot = self._slots.pop(chat_id, None)
+        if slot is None:
+            return
+        if slot.timer is not None:
+            slot.timer.cancel()
+        if slot.pending_text is not None:
+            edits_saved.inc()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    async def _push_later(self, bot: Bot, slot: _Slot, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            return
+        slot.timer = None
+        if self._slots.get(slot.chat_id) is not slot:
+            return
+        try:
+            await self._push(bot, slot)
+        except Exception:
+            logger.exception("Не удалось обновить статус в чате %s", slot.chat_id)
+
+    async def _push(self, bot: Bot, slot: _Slot) -> None:
+        text, slot.pending_text = slot.pending_text, None
+        if text is None:
+            return
+        if text == slot.sent_text:
+            edits_unchanged.inc()
+            edits_saved.inc()
+            return
+
+        # Отмечаем время заранее, чтобы параллельные submit() ушли в отложенную отправку
+        slot.sent_at = time.monotonic()
+        try:
+            await bot.edit_message_text(
+                chat_id=slot.chat_id,
+                message_id=slot.message_id,
+                text=text,
+                reply_markup=slot.reply_markup,
+            )
+            edits_sent.inc()
+        except TelegramRetryAfter as e:
+            # Флуд-лимит: отложим последнюю версию текста до конца запрета
+            if slot.pending_text is None:
+                slot.pending_text = text
+            if slot.timer is not None:
+                slot.timer.cancel()
+            slot.timer = asyncio.create_task(self._push_later(bot, slot, float(e.retry_after)))
+            return
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                sent = await bot.send_message(slot.chat_id, text, reply_markup=slot.reply_markup)
+                edits_sent.inc()
+                self._slots.pop(slot.chat_id, None)
+                new_slot = self._slot(slot.chat_id, sent.message_id)
+                new_slot.sent_text = text
+                new_slot.sent_at = time.monotonic()
+                if slot.on_replaced is not None:
+                    slot.on_replaced(sent.message_id)
+                return
+
+        slot.sent_text = text
+        slot.sent_at = time.monotonic()
+
+
+status_editor = StatusEditor()
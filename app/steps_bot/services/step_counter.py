@@ -1,26 +1,161 @@
+from __future__ import annotations
+
+import math
+from typing import Callable, NamedTuple, Sequence
+
 from geopy.distance import geodesic
 
+from app.steps_bot.settings import config
+
+try:  # NumPy нужен только для пакетного подсчёта
+    import numpy as np
+except ImportError:  # pragma: no cover - зависит от окружения
+    np = None
+
 STEP_LENGTH = 0.75  # метра
 MIN_DISTANCE = 5.5
 MAX_DISTANCE = 50
 MAX_SPEED = 8  # км/ч
 
+EARTH_RADIUS_M = 6_371_008.8  # средний радиус Земли (IUGG)
+
+Coords = tuple[float, float]
+
+
+class SegmentScore(NamedTuple):
+    """
+    Результат оценки одного отрезка между двумя live-обновлениями.
+    """
+    distance_m: float
+    speed_kmh: float
+    steps: int
+    too_fast: bool
+
 
-def calculate_distance_m(prev: tuple[float, float], curr: tuple[float, float]) -> float:
+def haversine_m(prev: Coords, curr: Coords) -> float:
+    """
+    Расстояние по формуле гаверсинусов (сфера), погрешность < 0.5% против геодезического.
+    """
+    lat1, lon1 = math.radians(prev[0]), math.radians(prev[1])
+    lat2, lon2 = math.radians(curr[0]), math.radians(curr[1])
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def equirectangular_m(prev: Coords, curr: Coords) -> float:
+    """
+    Равнопромежуточная проекция: самый дешёвый вариант, точен на отрезках до сотен метров.
+    """
+    lat1, lon1 = math.radians(prev[0]), math.radians(prev[1])
+    lat2, lon2 = math.radians(curr[0]), math.radians(curr[1])
+    x = (lon2 - lon1) * math.cos((lat1 + lat2) / 2)
+    y = lat2 - lat1
+    return EARTH_RADIUS_M * math.hypot(x, y)
+
+
+def geodesic_m(prev: Coords, curr: Coords) -> float:
+    """
+    Эталонное геодезическое расстояние на эллипсоиде WGS-84 (geopy).
+    """
     return geodesic(prev, curr).meters
 
 
-def calculate_steps(prev: tuple[float, float], curr: tuple[float, float]) -> int:
-    distance = calculate_distance_m(prev, curr)
-    if MIN_DISTANCE <= distance <= MAX_DISTANCE:
-        return int(distance / STEP_LENGTH)
+DISTANCE_ENGINES: dict[str, Callable[[Coords, Coords], float]] = {
+    "haversine": haversine_m,
+    "equirectangular": equirectangular_m,
+    "geodesic": geodesic_m,
+}
+
+
+def get_distance_engine(name: str | None = None) -> Callable[[Coords, Coords], float]:
+    """
+    Возвращает функцию расстояния по имени (по умолчанию — из настроек STEP_DISTANCE_ENGINE).
+    """
+    key = (name or config.STEP_DISTANCE_ENGINE).lower()
+    try:
+        return DISTANCE_ENGINES[key]
+    except KeyError:
+        raise ValueError(f"Неизвестный движок расстояния: {key}") from None
+
+
+def steps_for_distance(distance_m: float) -> int:
+    if MIN_DISTANCE <= distance_m <= MAX_DISTANCE:
+        return int(distance_m / STEP_LENGTH)
     return 0
 
 
-def is_too_fast(prev_coords: tuple[float, float], curr_coords: tuple[float, float], prev_ts: float, curr_ts: float) -> bool:
+def score_segment(
+    prev: Coords,
+    curr: Coords,
+    prev_ts: float,
+    curr_ts: float,
+    engine: str | None = None,
+) -> SegmentScore:
+    """
+    Считает расстояние один раз и возвращает расстояние, скорость, шаги и признак превышения скорости.
+    """
+    distance = get_distance_engine(engine)(prev, curr)
     delta_t = curr_ts - prev_ts
     if delta_t <= 0:
-        return True
-    distance = calculate_distance_m(prev_coords, curr_coords)
+        return SegmentScore(distance, 0.0, 0, True)
     speed_kmh = (distance / delta_t) * 3.6
-    return speed_kmh > MAX_SPEED
+    too_fast = speed_kmh > MAX_SPEED
+    steps = 0 if too_fast else steps_for_distance(distance)
+    return SegmentScore(distance, speed_kmh, steps, too_fast)
+
+
+def score_segments(
+    prev: Sequence[Coords],
+    curr: Sequence[Coords],
+    delta_t: Sequence[float],
+):
+    """
+    Пакетная оценка отрезков (prev, curr, dt) по гаверсинусу.
+
+    Возвращает кортеж массивов (distance_m, speed_kmh, steps, too_fast). При наличии NumPy
+    считается векторно, иначе — поэлементно теми же правилами, что и score_segment.
+    """
+    if np is None:
+        scores = [
+            score_segment(p, c, 0.0, float(d), engine="haversine")
+            for p, c, d in zip(prev, curr, delta_t)
+        ]
+        return (
+            [s.distance_m for s in scores],
+            [s.speed_kmh for s in scores],
+            [s.steps for s in scores],
+            [s.too_fast for s in scores],
+        )
+
+    p = np.radians(np.asarray(prev, dtype=np.float64).reshape(-1, 2))
+    c = np.radians(np.asarray(curr, dtype=np.float64).reshape(-1, 2))
+    dt = np.asarray(delta_t, dtype=np.float64).reshape(-1)
+
+    dlat = c[:, 0] - p[:, 0]
+    dlon = c[:, 1] - p[:, 1]
+    a = np.sin(dlat / 2) ** 2 + np.cos(p[:, 0]) * np.cos(c[:, 0]) * np.sin(dlon / 2) ** 2
+    distance = 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+    valid_dt = dt > 0
+    speed = np.zeros_like(distance)
+    np.divide(distance, dt, out=speed, where=valid_dt)
+    speed *= 3.6
+    too_fast = ~valid_dt | (speed > MAX_SPEED)
+
+    in_range = (distance >= MIN_DISTANCE) & (distance <= MAX_DISTANCE) & ~too_fast
+    steps = np.where(in_range, (distance / STEP_LENGTH).astype(np.int64), 0)
+    return distance, speed, steps, too_fast
+
+
+def calculate_distance_m(prev: Coords, curr: Coords) -> float:
+    return get_distance_engine()(prev, curr)
+
+
+def calculate_steps(prev: Coords, curr: Coords) -> int:
+    return steps_for_distance(calculate_distance_m(prev, curr))
+
+
+def is_too_fast(prev_coords: Coords, curr_coords: Coords, prev_ts: float, curr_ts: float) -> bool:
+    return score_segment(prev_coords, curr_coords, prev_ts, curr_ts).too_fast
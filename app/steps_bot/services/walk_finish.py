@@ -2,81 +2,70 @@ from __future__ import annotations
 
 import logging
 import datetime as dt
+from typing import Optional
 
+from aiogram import Bot
 from aiogram.types import Message
-from aiogram.exceptions import TelegramBadRequest
-from sqlalchemy import select, text, update
+from aiogram.exceptions import TelegramAPIError, TelegramBadRequest
+from sqlalchemy import select, text
 
+from app.steps_bot.db.identity import TelegramId, resolve_user
+from app.steps_bot.db.ledger_writer import LedgerWriter
 from app.steps_bot.db.repo import get_session
 from app.steps_bot.db.models.walk import WalkForm
-from app.steps_bot.db.models.user import User
 from app.steps_bot.presentation.keyboards.simple_kb import back_kb
-from app.steps_bot.storage.user_memory import (
-    user_walk_multiplier,
-    user_walk_form,
-    user_walk_started_at,
-    user_steps,
-    user_coords,
-    user_was_over_speed,
-    user_msg_id,
-    user_walk_finished,
-    user_daily_steps_used,
-    user_daily_steps_date,
-)
-from app.steps_bot.services.ledger_service import accrue_steps_points
+from app.steps_bot.storage.walk_sessions import WalkSession, WalkSessionStore, walk_sessions
+from app.steps_bot.services.ledger_service import stage_steps_accrual
+from app.steps_bot.services.status_editor import status_editor
 
 logger = logging.getLogger(__name__)
 
 
-async def finish_walk(
-    message: Message,
-    *,
-    target_message_id: int | None = None,
-    user_id: int | None = None,
-) -> None:
+async def _credit_walk(
+    uid: int,
+    walk: WalkSession,
+    store: Optional[WalkSessionStore] = None,
+) -> Optional[tuple[int, int, int]]:
     """
-    Завершает прогулку: фиксирует шаги, начисляет баллы в журнал и обновляет счётчик шагов.
+    Помечает прогулку завершённой, начисляет баллы и учитывает шаги в дневном лимите.
+    Возвращает (шаги, коэффициент, баллы) или None, если прогулку уже завершили
+    (повторное нажатие, другой процесс) — тогда баллы не начисляются.
     """
-    uid = (
-        user_id
-        if user_id is not None
-        else (message.from_user.id if message.from_user and not message.from_user.is_bot else message.chat.id)
-    )
+    if not await (store or walk_sessions).claim_finish(walk):
+        return None
 
-    user_walk_finished[uid] = True
-
-    total_steps = int(user_steps.get(uid, 0))
-    multiplier = int(user_walk_multiplier.get(uid, 1))
-    _walk_form = user_walk_form.get(uid, WalkForm.DOG)
+    total_steps = int(walk.steps)
+    multiplier = int(walk.multiplier)
+    _walk_form = walk.walk_form or WalkForm.DOG
     points = int(total_steps * multiplier)
 
     finished_at = dt.datetime.now(dt.timezone.utc)
-    started_ts = user_walk_started_at.get(uid)
+    started_ts = walk.started_at
     _started_at = (
         dt.datetime.fromtimestamp(started_ts, tz=dt.timezone.utc)
         if started_ts is not None else finished_at
     )
 
     try:
-        async with get_session() as s:
-            await accrue_steps_points(
-                session=s,
-                user_id_or_telegram=uid,
-                amount=points,
-                title="Начисление за прогулку",
-                description=f"Шаги: {total_steps}, коэффициент: ×{multiplier}",
-                walk_form=_walk_form,
-            )
-
-            upd_steps = (
-                update(User)
-                .where((User.telegram_id == uid) | (User.id == uid))
-                .values(
-                    step_count=User.step_count + total_steps,
-                    updated_at=finished_at,
+        # Своя транзакция: баллы фиксируются сразу, блокировки не держатся до конца апдейта
+        async with get_session(isolated=True) as s:
+            user = await resolve_user(s, TelegramId(uid))
+            if user is None:
+                raise ValueError("Пользователь не найден")
+            # Проводки семьи/пользователя/пригласившего, счётчик прогулок и шаги —
+            # одним запросом при flush()
+            writer = LedgerWriter(s)
+            if points > 0:
+                await stage_steps_accrual(
+                    writer,
+                    user,
+                    points,
+                    title="Начисление за прогулку",
+                    description=f"Шаги: {total_steps}, коэффициент: ×{multiplier}",
+                    walk_form=_walk_form,
                 )
-            )
-            await s.execute(upd_steps)
+            writer.increment_user(user.id, step_count=total_steps)
+            await writer.flush()
 
     except Exception as e:
         logger.exception("Failed to finalize walk for %s: %s", uid, e)
@@ -84,20 +73,45 @@ async def finish_walk(
     # Обновляем дневной использованный лимит
     try:
         today = dt.date.today().isoformat()
-        if user_daily_steps_date.get(uid) != today:
-            user_daily_steps_date[uid] = today
-            user_daily_steps_used[uid] = 0
-        user_daily_steps_used[uid] = int(user_daily_steps_used.get(uid, 0)) + total_steps
+        if walk.daily_steps_date != today:
+            walk.daily_steps_date = today
+            walk.daily_steps_used = 0
+        walk.daily_steps_used = int(walk.daily_steps_used) + total_steps
     except Exception:
         pass
 
-    summary_text = (
+    return total_steps, multiplier, points
+
+
+def _summary_text(total_steps: int, multiplier: int, points: int) -> str:
+    return (
         "🏁 Прогулка завершена!\n\n"
         f"Итого шагов: {total_steps}\n"
         f"Начислено баллов: {points} (коэфф: ×{multiplier})"
     )
 
-    msg_id = target_message_id or user_msg_id.get(uid, {}).get("message_id")
+
+async def finish_walk(
+    message: Message,
+    *,
+    target_message_id: int | None = None,
+    user_id: int | None = None,
+) -> None:
+    """
+    Завершает прогулку: фиксирует шаги, начисляет баллы в журнал и обновляет счётчик шагов.
+    """
+    uid = (
+        user_id
+        if user_id is not None
+        else (message.from_user.id if message.from_user and not message.from_user.is_bot else message.chat.id)
+    )
+
+    walk = await walk_sessions.get_or_create(uid)
+    credited = await _credit_walk(uid, walk)
+    summary_text = _summary_text(*(credited or (0, int(walk.multiplier), 0)))
+
+    status_editor.drain(message.chat.id)
+    msg_id = target_message_id or walk.message_id
     try:
         if msg_id:
             await message.bot.edit_message_text(
@@ -115,9 +129,39 @@ async def finish_walk(
         except Exception as e2:
             logger.exception("Fallback answer failed: %s", e2)
 
-    user_coords.pop(uid, None)
-    user_was_over_speed.pop(uid, None)
-    user_walk_multiplier.pop(uid, None)
-    user_walk_form.pop(uid, None)
-    user_walk_started_at.pop(uid, None)
-    user_steps.pop(uid, None)
+    walk.reset_walk()
+    walk_sessions.save(walk)
+
+
+async def finish_idle_walk(
+    bot: Bot,
+    walk: WalkSession,
+    store: Optional[WalkSessionStore] = None,
+) -> bool:
+    """
+    Завершает брошенную прогулку без входящего сообщения (пользователь перестал слать геолокацию).
+    Возвращает False, если прогулку уже завершил кто-то другой.
+    """
+    store = store or walk_sessions
+    credited = await _credit_walk(walk.user_id, walk, store)
+    if credited is None:
+        return False
+    summary_text = _summary_text(*credited)
+    chat_id = walk.chat_id or walk.user_id
+    status_editor.drain(chat_id)
+    try:
+        if walk.message_id:
+            await bot.edit_message_text(
+                chat_id=chat_id,
+                message_id=walk.message_id,
+                text=summary_text,
+                reply_markup=back_kb,
+            )
+        else:
+            await bot.send_message(chat_id, summary_text, reply_markup=back_kb)
+    except TelegramAPIError as e:
+        logger.warning("finish_idle_walk notify failed for %s: %s", walk.user_id, e)
+
+    walk.reset_walk()
+    store.save(walk)
+    return True
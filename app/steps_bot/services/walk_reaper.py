@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+import time
+from typing import NamedTuple, Optional
+
+from aiogram import Bot
+
+from app.steps_bot import metrics
+from app.steps_bot.services.walk_finish import finish_idle_walk
+from app.steps_bot.settings import config
+from app.steps_bot.storage.walk_sessions import WalkSessionStore, walk_sessions
+
+logger = logging.getLogger(__name__)
+
+walks_reaped = metrics.counter(
+    "walks_reaped_total", "Брошенные прогулки, завершённые по таймауту"
+)
+sessions_evicted = metrics.counter(
+    "walk_sessions_evicted_total", "Записи прогулок, вытесненные из памяти"
+)
+bytes_reclaimed = metrics.counter(
+    "walk_sessions_reclaimed_bytes_total", "Оценка освобождённой памяти, байт"
+)
+metrics.gauge(
+    "walk_sessions_cached", "Записи прогулок в памяти процесса", fn=lambda: len(walk_sessions)
+)
+
+
+class ReapResult(NamedTuple):
+    reaped: int
+    evicted: int
+    reclaimed_bytes: int
+
+
+async def reap_idle_walks(
+    bot: Bot,
+    ttl: Optional[float] = None,
+    store: Optional[WalkSessionStore] = None,
+) -> ReapResult:
+    """
+    Завершает прогулки своего шарда без обновлений дольше ttl (с начислением баллов)
+    и вытесняет неактивные записи. Записи с сегодняшним дневным лимитом в памяти-only
+    хранилище остаются, иначе лимит обнулился бы.
+    """
+    ttl = ttl if ttl is not None else config.WALK_IDLE_TTL_SECONDS
+    store = store or walk_sessions
+    now = time.time()
+    today = dt.date.today().isoformat()
+
+    reaped = evicted = reclaimed = 0
+    for walk in store.cached():
+        if now - walk.touched_at < ttl:
+            continue
+        # Прогулку другого шарда завершает её воркер; здесь запись только вытесняется
+        if walk.is_active and store.owns(walk.user_id):
+            try:
+                if await finish_idle_walk(bot, walk, store):
+                    reaped += 1
+            except Exception:
+                logger.exception("Не удалось завершить брошенную прогулку %s", walk.user_id)
+                continue
+            # finish_idle_walk обновил touched_at — запись вытеснится, когда снова простоит ttl
+            continue
+        if not store.durable and walk.daily_steps_date == today and walk.daily_steps_used:
+            continue
+        size = walk.approx_size()
+        if store.evict(walk.user_id) is not None:
+            evicted += 1
+            reclaimed += size
+
+    try:
+        purged = await store.purge_stale(today)
+    except Exception:
+        logger.exception("Не удалось удалить устаревшие записи прогулок")
+        purged = 0
+
+    walks_reaped.inc(reaped)
+    sessions_evicted.inc(evicted)
+    bytes_reclaimed.inc(reclaimed)
+    if reaped or evicted or purged:
+        logger.info(
+            "Walk reaper: завершено %s, вытеснено %s (~%s байт), удалено из БД %s, в памяти %s",
+            reaped,
+            evicted,
+            reclaimed,
+            purged,
+            len(store),
+        )
+    return ReapResult(reaped, evicted, reclaimed)
+
+
+async def run_walk_reaper(bot: Bot, interval: Optional[float] = None) -> None:
+    """Фоновый цикл очистки брошенных прогулок."""
+    interval = interval or config.WALK_REAPER_INTERVAL_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reap_idle_walks(bot)
+        except Exception as e:
+            logger.error("walk reaper error: %s", e)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+import time
+from typing import Optional, Set
+
+from aiogram import Bot
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message
+
+from app.steps_bot import metrics
+from app.steps_bot.db.models.walk import WalkForm
+from app.steps_bot.presentation.keyboards.simple_kb import end_walk_kb, walk_back_kb
+from app.steps_bot.services.coefficients_service import get_total_multiplier, get_walk_form_coef
+from app.steps_bot.services.status_editor import status_editor
+from app.steps_bot.services.weather_service import get_current_temp_c
+from app.steps_bot.storage.walk_sessions import walk_sessions
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STEP_GOAL = 3000  # дневной лимит шагов
+
+first_status_latency = metrics.histogram(
+    "walk_start_first_status_seconds", "От получения локации до первого статуса прогулки"
+)
+weather_latency = metrics.histogram(
+    "walk_start_weather_seconds", "От получения локации до применения температурного коэффициента"
+)
+
+# Ссылки на фоновые задачи, чтобы их не собрал GC до завершения
+_background: Set[asyncio.Task] = set()
+
+
+def format_temp(temp_c: Optional[int]) -> str:
+    if temp_c is None:
+        return "н/д"
+    return f"{'+' if temp_c >= 0 else ''}{temp_c}°C"
+
+
+def status_text(
+    temp_c: Optional[int],
+    steps: int,
+    step_goal: int,
+    multiplier: int,
+    speed_kmh: Optional[float] = None,
+    warning: Optional[str] = None,
+) -> str:
+    """Текст лайв-статуса прогулки."""
+    parts = [
+        format_temp(temp_c),
+        f"🚶 Вы прошли: {steps} / {step_goal} шагов",
+        f"⭐ Баллы: {steps * multiplier} (коэфф: ×{multiplier})",
+    ]
+    if speed_kmh is not None:
+        parts.append(f"📏 Скорость: {speed_kmh:.1f} км/ч")
+    if warning:
+        parts.append(f"\n{warning}")
+    return "\n".join(parts)
+
+
+async def start_walk(message: Message, state: FSMContext, walk_form: WalkForm) -> None:
+    """
+    Принимает лайв-локацию, фиксирует старт прогулки и сразу выводит статус
+    с базовым коэффициентом формы. Температура и итоговый множитель подтягиваются
+    в фоне и обновляют статус, когда погода ответит.
+    """
+    received_at = time.monotonic()
+    location = message.location
+    user_id = message.from_user.id
+
+    walk = await walk_sessions.get_or_create(user_id)
+    walk.finished = False
+
+    # Определяем оставшийся дневной лимит
+    today = dt.date.today().isoformat()
+    if walk.daily_steps_date != today:
+        walk.daily_steps_date = today
+        walk.daily_steps_used = 0
+    remaining = max(0, DEFAULT_STEP_GOAL - int(walk.daily_steps_used))
+
+    if remaining <= 0:
+        walk_sessions.save(walk)
+        await message.answer(
+            "🏁 Дневной лимит шагов уже достигнут. Возвращайтесь завтра!",
+            reply_markup=walk_back_kb,
+        )
+        return
+
+    await state.update_data(step_goal=remaining)
+
+    if not location.live_period:
+        await message.answer("❌ Пожалуйста, отправь именно лайв-локацию через 📎")
+        return
+
+    walk.reset_walk()
+
+    current_coords = (location.latitude, location.longitude)
+    walk.coords = current_coords
+    walk.coords_ts = time.time()
+
+    walk.walk_form = walk_form
+    multiplier = max(1, await get_walk_form_coef(walk_form))
+    walk.multiplier = multiplier
+    walk.started_at = time.time()
+    # Погоду запрашивает фоновая задача — live-обновления не должны дублировать запрос
+    walk.temp_updated_at = walk.started_at
+
+    text = status_text(None, 0, remaining, multiplier)
+    sent = await message.answer(text, reply_markup=end_walk_kb)
+    first_status_latency.observe(time.monotonic() - received_at)
+    status_editor.remember(message.chat.id, sent.message_id, text)
+    walk.chat_id = message.chat.id
+    walk.message_id = sent.message_id
+    walk_sessions.save(walk)
+    logger.info(
+        "Начало прогулки (%s) пользователя %s: message_id=%s; base mul=%s",
+        walk_form.value,
+        user_id,
+        sent.message_id,
+        multiplier,
+    )
+    await state.clear()
+
+    task = asyncio.create_task(
+        _resolve_weather(message.bot, user_id, walk.started_at, current_coords, remaining, received_at)
+    )
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+
+
+async def _resolve_weather(
+    bot: Bot,
+    user_id: int,
+    started_at: float,
+    coords: tuple[float, float],
+    step_goal: int,
+    received_at: float,
+) -> None:
+    """Подтягивает температуру и итоговый множитель для только что начатой прогулки."""
+    try:
+        temp_c = await get_current_temp_c(coords[0], coords[1])
+    except Exception:
+        logger.exception("Не удалось получить температуру для прогулки %s", user_id)
+        return
+
+    walk = await walk_sessions.get(user_id)
+    # Прогулку могли завершить или начать заново, пока ждали погоду
+    if walk is None or walk.finished or walk.started_at != started_at or walk.walk_form is None:
+        return
+
+    walk.temp_c = temp_c
+    walk.temp_updated_at = time.time()
+    if temp_c is not None:
+        try:
+            walk.multiplier = await get_total_multiplier(walk.walk_form, temp_c=temp_c)
+        except Exception:
+            logger.exception("Не удалось пересчитать множитель")
+    walk_sessions.save(walk)
+    weather_latency.observe(time.monotonic() - received_at)
+
+    if walk.message_id and walk.chat_id:
+        def _on_replaced(message_id: int) -> None:
+            walk.message_id = message_id
+            walk_sessions.save(walk)
+
+        try:
+            await status_editor.submit(
+                bot,
+                walk.chat_id,
+                walk.message_id,
+                status_text(walk.temp_c, walk.steps, step_goal, walk.multiplier),
+                reply_markup=end_walk_kb,
+                on_replaced=_on_replaced,
+            )
+        except Exception:
+            logger.exception("Не удалось обновить статус прогулки %s", user_id)
@@ -1,14 +1,65 @@
 from __future__ import annotations
 
-from typing import Optional
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
 import httpx
 
-OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+from app.steps_bot import metrics
+from app.steps_bot.settings import config
 
-async def get_current_temp_c(lat: float, lon: float) -> Optional[int]:
-    """
-    Возвращает только текущую температуру в °C по координатам (Open-Meteo, без ключа).
-    """
+OPEN_METEO_URL = config.OPEN_METEO_URL
+
+# Неудачный ответ кэшируем ненадолго, чтобы не долбить API при его недоступности
+_FAILURE_TTL_SECONDS = 60.0
+
+cache_hits = metrics.counter("weather_cache_hits_total", "Температура взята из кэша")
+cache_misses = metrics.counter("weather_cache_misses_total", "Запросы к погодному API")
+fetches_coalesced = metrics.counter(
+    "weather_fetches_coalesced_total", "Запросы, присоединившиеся к уже идущему запросу ячейки"
+)
+
+Cell = Tuple[int, int]
+
+_client: Optional[httpx.AsyncClient] = None
+_cache: Dict[Cell, Tuple[float, Optional[int]]] = {}
+_inflight: Dict[Cell, asyncio.Task] = {}
+
+metrics.gauge("weather_cache_cells", "Ячейки сетки в кэше погоды", fn=lambda: len(_cache))
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Долгоживущий клиент с пулом соединений (без TLS-рукопожатия на каждый запрос)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=config.WEATHER_HTTP_TIMEOUT,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _client
+
+
+async def close_weather_client() -> None:
+    """Закрывает общий HTTP-клиент (вызывается при остановке приложения)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def grid_cell(lat: float, lon: float) -> Cell:
+    """Ячейка сетки WEATHER_GRID_DEG × WEATHER_GRID_DEG, в которую попадает точка."""
+    step = config.WEATHER_GRID_DEG
+    return int(lat // step), int(lon // step)
+
+
+def _cell_center(cell: Cell) -> Tuple[float, float]:
+    step = config.WEATHER_GRID_DEG
+    return round((cell[0] + 0.5) * step, 4), round((cell[1] + 0.5) * step, 4)
+
+
+async def _fetch_temp_c(lat: float, lon: float) -> Optional[int]:
     params = {
         "latitude": lat,
         "longitude": lon,
@@ -16,11 +67,10 @@ async def get_current_temp_c(lat: float, lon: float) -> Optional[int]:
         "timezone": "auto",
     }
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.get(OPEN_METEO_URL, params=params)
-            if resp.status_code != 200:
-                return None
-            data = resp.json()
+        resp = await _get_client().get(OPEN_METEO_URL, params=params)
+        if resp.status_code != 200:
+            return None
+        data = resp.json()
 
         cw = data.get("current_weather") or {}
         temp = cw.get("temperature")
@@ -29,3 +79,52 @@ async def get_current_temp_c(lat: float, lon: float) -> Optional[int]:
         return int(round(float(temp)))
     except (httpx.HTTPError, ValueError, KeyError):
         return None
+
+
+def _store(cell: Cell, temp: Optional[int]) -> None:
+    ttl = config.WEATHER_CACHE_TTL_SECONDS if temp is not None else _FAILURE_TTL_SECONDS
+    if len(_cache) >= config.WEATHER_CACHE_MAX_CELLS and cell not in _cache:
+        now = time.monotonic()
+        for key in [k for k, (exp, _) in _cache.items() if exp <= now]:
+            del _cache[key]
+        while len(_cache) >= config.WEATHER_CACHE_MAX_CELLS:
+            # dict хранит порядок вставки — вытесняем самую старую ячейку
+            del _cache[next(iter(_cache))]
+    _cache[cell] = (time.monotonic() + ttl, temp)
+
+
+async def get_current_temp_c(lat: float, lon: float) -> Optional[int]:
+    """
+    Возвращает только текущую температуру в °C по координатам (Open-Meteo, без ключа).
+
+    Ответ кэшируется по ячейке сетки на WEATHER_CACHE_TTL_SECONDS; одновременные
+    запросы из одной ячейки ждут один общий запрос к API.
+    """
+    cell = grid_cell(lat, lon)
+    cached = _cache.get(cell)
+    if cached is not None and cached[0] > time.monotonic():
+        cache_hits.inc()
+        return cached[1]
+
+    task = _inflight.get(cell)
+    if task is not None:
+        fetches_coalesced.inc()
+    else:
+        cache_misses.inc()
+        # Отдельная задача: отмена одного ожидающего не обрывает запрос для остальных
+        task = _inflight[cell] = asyncio.create_task(_refresh_cell(cell))
+    return await asyncio.shield(task)
+
+
+async def _refresh_cell(cell: Cell) -> Optional[int]:
+    try:
+        temp = await _fetch_temp_c(*_cell_center(cell))
+        _store(cell, temp)
+        return temp
+    finally:
+        _inflight.pop(cell, None)
+
+
+def clear_weather_cache() -> None:
+    """Очищает кэш температуры (тесты, смена OPEN_METEO_URL)."""
+    _cache.clear()
@@ -11,6 +11,8 @@ class Settings(BaseSettings):
     """
     BOT_TOKEN: str
     WEBHOOK_URL: str
+    # Секрет вебхука (X-Telegram-Bot-Api-Secret-Token): проверяют роутер и воркеры шардов
+    WEBHOOK_SECRET: Optional[str] = None
 
     POSTGRES_HOST: Optional[str] = None
     POSTGRES_PORT: Optional[int] = None
@@ -18,6 +20,17 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: Optional[str] = None
     POSTGRES_DB: Optional[str] = None
 
+    # Пул соединений asyncpg и кэш подготовленных выражений
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_COMMAND_TIMEOUT: float = 60.0
+    # Подключение через PgBouncer (transaction pooling): без пула и кэша выражений
+    DB_PGBOUNCER: bool = False
+
     CDEK_ACCOUNT: Optional[str] = None
     CDEK_SECURE: Optional[str] = None
     CDEK_TEST_MODE: bool = False
@@ -34,6 +47,84 @@ class Settings(BaseSettings):
     DEFAULT_PACKAGE_H: int = 10
 
     MEDIA_ROOT: str = "/app/media"
+
+    # Подсчёт шагов: haversine | equirectangular | geodesic
+    STEP_DISTANCE_ENGINE: str = "haversine"
+
+    # Хранилище активных прогулок: memory | db
+    WALK_SESSION_BACKEND: str = "memory"
+    WALK_SESSION_FLUSH_SECONDS: float = 2.0
+    WALK_SESSION_FLUSH_BATCH: int = 500
+    # Прогулка без обновлений геолокации дольше TTL завершается автоматически
+    WALK_IDLE_TTL_SECONDS: int = 1800
+    WALK_REAPER_INTERVAL_SECONDS: int = 60
+    # Лайв-статус прогулки редактируется не чаще раза в интервал
+    STATUS_EDIT_INTERVAL_SECONDS: float = 3.0
+
+    # Кэш коэффициентов прогулок (форма/температура)
+    COEFFICIENTS_CACHE_TTL_SECONDS: int = 300
+
+    # Погода: API, кэш по ячейкам сетки (~0.05° ≈ 5 км) и таймаут запроса
+    OPEN_METEO_URL: str = "https://api.open-meteo.com/v1/forecast"
+    WEATHER_GRID_DEG: float = 0.05
+    WEATHER_CACHE_TTL_SECONDS: int = 600
+    WEATHER_CACHE_MAX_CELLS: int = 10000
+    WEATHER_HTTP_TIMEOUT: float = 5.0
+
+    # Рассылки: размер партии, параллельность, лимиты Telegram (глобальный и на чат)
+    BROADCAST_BATCH_SIZE: int = 500
+    BROADCAST_CONCURRENCY: int = 20
+    BROADCAST_RATE_PER_SECOND: float = 25.0
+    BROADCAST_PER_CHAT_INTERVAL: float = 1.0
+    BROADCAST_MAX_RETRIES: int = 3
+    # Неудачных загрузок медиа, после которых рассылка помечается FAILED
+    BROADCAST_UPLOAD_ATTEMPTS: int = 3
+    # Планировщик: одновременные рассылки, аренда, максимальный сон между проверками
+    BROADCAST_MAX_CONCURRENT: int = 3
+    BROADCAST_LEASE_SECONDS: int = 300
+    BROADCAST_SCHEDULER_MAX_SLEEP: int = 300
+
+    # Снимки журнала: период построения и период сверки балансов
+    LEDGER_CHECKPOINT_INTERVAL_SECONDS: int = 600
+    LEDGER_RECONCILE_INTERVAL_SECONDS: int = 86400
+    # Месячные секции журнала: сколько создавать вперёд, сколько месяцев хранить, куда архивировать
+    LEDGER_PARTITIONS_AHEAD: int = 3
+    LEDGER_RETENTION_MONTHS: int = 12
+    LEDGER_ARCHIVE_DIR: str = "ledger_archive"
+    # Сколько ждать блокировку журнала при создании/отсоединении секции (потом — ошибка и повтор)
+    LEDGER_PARTITION_LOCK_TIMEOUT_SECONDS: int = 5
+
+    # Поиск ПВЗ: пороги триграммного сходства города и улицы, размер страницы,
+    # предел выдачи, при скольких ПВЗ в городе показывать список без уточнения улицы
+    PVZ_CITY_SIMILARITY: float = 0.3
+    PVZ_STREET_SIMILARITY: float = 0.4
+    PVZ_PAGE_SIZE: int = 8
+    PVZ_SEARCH_LIMIT: int = 48
+    PVZ_CITY_LIST_MAX: int = 10
+    # Индекс ПВЗ в памяти перестраивается по NOTIFY pvz_changed и не реже раза в TTL
+    PVZ_INDEX_TTL_SECONDS: int = 3600
+    # Импорт POST /pvz: размер порции COPY, сколько ошибок элементов возвращать,
+    # за сколько секунд нужно прочитать тело и слить список (иначе 408 и откат)
+    PVZ_IMPORT_BATCH_SIZE: int = 1000
+    PVZ_IMPORT_MAX_ERRORS: int = 100
+    PVZ_IMPORT_TIMEOUT_SECONDS: int = 300
+    # Выгрузка GET /order: строк за одно чтение серверного курсора, максимальный размер страницы
+    ORDER_EXPORT_BATCH_SIZE: int = 1000
+    ORDER_EXPORT_MAX_LIMIT: int = 10000
+
+    # LRU telegram_id → users.id (на процесс)
+    IDENTITY_CACHE_SIZE: int = 50000
+
+    # LISTEN/NOTIFY для межпроцессных уведомлений (выключить за PgBouncer в transaction-режиме)
+    PG_LISTEN_ENABLED: bool = True
+
+    # Шардирование вебхука: адреса воркеров через запятую (http://host:port);
+    # номер шарда этого воркера — позиция его адреса в списке
+    SHARD_WORKER_URLS: str = ""
+    SHARD_INDEX: int = 0
+    SHARD_FORWARD_TIMEOUT: float = 10.0
+    # Сколько секунд воркер помнит update_id, чтобы не обработать повторную доставку
+    SHARD_UPDATE_DEDUP_SECONDS: int = 600
     
     API_KEY: str
 
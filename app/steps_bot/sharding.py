@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import httpx
+
+from app.steps_bot.settings import config
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+# Ошибки, при которых запрос не дошёл до воркера целиком: повторная доставка безопасна
+_NOT_DELIVERED = (
+    httpx.ConnectError,
+    httpx.ConnectTimeout,
+    httpx.PoolTimeout,
+    httpx.WriteError,
+    httpx.WriteTimeout,
+)
+
+
+def worker_urls() -> list[str]:
+    """
+    Возвращает адреса воркеров из SHARD_WORKER_URLS (через запятую).
+    """
+    return [u.strip().rstrip("/") for u in config.SHARD_WORKER_URLS.split(",") if u.strip()]
+
+
+def is_sharded() -> bool:
+    return len(worker_urls()) > 1
+
+
+def secret_matches(value: Optional[str]) -> bool:
+    """
+    Сверяет заголовок SECRET_HEADER с WEBHOOK_SECRET; без секрета в настройках проверка отключена.
+    """
+    if not config.WEBHOOK_SECRET:
+        return True
+    return value is not None and hmac.compare_digest(value.encode(), config.WEBHOOK_SECRET.encode())
+
+
+def shard_for(telegram_id: int, shard_count: int) -> int:
+    """
+    Стабильно сопоставляет telegram_id номеру шарда (не зависит от PYTHONHASHSEED).
+    """
+    if shard_count <= 1:
+        return 0
+    digest = hashlib.blake2b(
+        int(telegram_id).to_bytes(8, "big", signed=True),
+        digest_size=8,
+    ).digest()
+    return int.from_bytes(digest, "big") % shard_count
+
+
+def extract_user_id(update: dict[str, Any]) -> Optional[int]:
+    """
+    Достаёт id пользователя из «сырого» апдейта Telegram без полной валидации.
+    """
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        user = event.get("from") or event.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return int(user["id"])
+        chat = event.get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return int(chat["id"])
+    return None
+
+
+class ShardRouter:
+    """
+    Пересылает апдейты воркерам: все апдейты одного пользователя попадают в один процесс,
+    поэтому его прогулка и FSM-состояние живут только там.
+    """
+
+    def __init__(self, urls: list[str], timeout: float | None = None) -> None:
+        self._urls = urls
+        self._client = httpx.AsyncClient(
+            timeout=timeout or config.SHARD_FORWARD_TIMEOUT,
+            limits=httpx.Limits(max_keepalive_connections=32 * max(1, len(urls))),
+        )
+
+    @property
+    def shard_count(self) -> int:
+        return len(self._urls)
+
+    def url_for(self, update: dict[str, Any]) -> str:
+        user_id = extract_user_id(update)
+        shard = shard_for(user_id, self.shard_count) if user_id is not None else 0
+        return self._urls[shard]
+
+    async def forward(self, update: dict[str, Any]) -> bool:
+        """
+        Пересылает апдейт воркеру. False — апдейт воркеру не доставлен или отклонён,
+        Telegram нужно повторить; таймаут ответа — не повод для повтора.
+        """
+        url = self.url_for(update)
+        try:
+            resp = await self._client.post(
+                f"{url}/update",
+                json=update,
+                headers={SECRET_HEADER: config.WEBHOOK_SECRET or ""},
+            )
+            if resp.status_code != 200:
+                logger.error("Shard %s rejected update %s: HTTP %s", url, update.get("update_id"), resp.status_code)
+            return resp.status_code == 200
+        except _NOT_DELIVERED as e:
+            logger.error("Shard %s unavailable for update %s: %s", url, update.get("update_id"), e)
+            return False
+        except httpx.HTTPError as e:
+            # Апдейт уже у воркера и, возможно, обрабатывается: повтор от Telegram
+            # выполнил бы его второй раз (начисления, заказы), поэтому считаем доставленным
+            logger.warning("Shard %s did not answer update %s: %s", url, update.get("update_id"), e)
+            return True
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class RecentUpdates:
+    """
+    update_id апдейтов, принятых за последние ttl секунд: повторная доставка
+    того же апдейта (Telegram повторяет его, если не дождался ответа) отбрасывается.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self._ttl = ttl
+        self._seen: "OrderedDict[int, float]" = OrderedDict()
+
+    def add(self, update_id: int) -> bool:
+        """Запоминает update_id; False — такой апдейт уже был."""
+        now = time.monotonic()
+        while self._seen:
+            oldest, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self._ttl:
+                break
+            del self._seen[oldest]
+        if update_id in self._seen:
+            return False
+        self._seen[update_id] = now
+        return True
+
+    def __len__(self) -> int:
+        return len(self._seen)
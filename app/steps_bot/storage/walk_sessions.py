@@ -0,0 +1,376 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+import time
+from typing import Dict, Iterator, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.steps_bot.db.repo import get_session
+from app.steps_bot.db.models.walk import WalkForm
+from app.steps_bot.db.models.walk_session import WalkSessionRecord
+from app.steps_bot.settings import config
+from app.steps_bot.sharding import shard_for, worker_urls
+
+logger = logging.getLogger(__name__)
+
+# Поля, которые переносятся между WalkSession и строкой walk_sessions
+_PERSISTED_FIELDS = (
+    "steps",
+    "chat_id",
+    "message_id",
+    "was_over_speed",
+    "finished",
+    "multiplier",
+    "walk_form",
+    "started_at",
+    "temp_c",
+    "temp_updated_at",
+    "daily_steps_used",
+    "daily_steps_date",
+)
+
+
+class WalkSession:
+    """
+    Состояние прогулки одного пользователя: гео, шаги, лайв-сообщение, коэффициенты и дневной лимит.
+    """
+    __slots__ = (
+        "user_id",
+        "coords",
+        "coords_ts",
+        "steps",
+        "chat_id",
+        "message_id",
+        "was_over_speed",
+        "finished",
+        "multiplier",
+        "walk_form",
+        "started_at",
+        "temp_c",
+        "temp_updated_at",
+        "daily_steps_used",
+        "daily_steps_date",
+        "touched_at",
+    )
+
+    def __init__(self, user_id: int) -> None:
+        self.user_id = user_id
+        self.touched_at = time.time()
+        self.daily_steps_used = 0
+        self.daily_steps_date: Optional[str] = None
+        self.finished = False
+        self.reset_walk()
+
+    def reset_walk(self) -> None:
+        """Сбрасывает данные текущей прогулки, сохраняя дневной лимит и флаг завершения."""
+        self.coords: Optional[Tuple[float, float]] = None
+        self.coords_ts: Optional[float] = None
+        self.steps = 0
+        self.chat_id: Optional[int] = None
+        self.message_id: Optional[int] = None
+        self.was_over_speed = False
+        self.multiplier = 1
+        self.walk_form: Optional[WalkForm] = None
+        self.started_at: Optional[float] = None
+        self.temp_c: Optional[int] = None
+        self.temp_updated_at: Optional[float] = None
+
+    @property
+    def is_active(self) -> bool:
+        """Прогулка начата и ещё не завершена."""
+        return self.started_at is not None and not self.finished
+
+    def approx_size(self) -> int:
+        """Оценка занимаемой записью памяти в байтах."""
+        size = sys.getsizeof(self)
+        if self.coords is not None:
+            size += sys.getsizeof(self.coords) + 2 * sys.getsizeof(0.0)
+        return size
+
+    def to_row(self) -> dict:
+        row = {name: getattr(self, name) for name in _PERSISTED_FIELDS}
+        lat, lon = self.coords if self.coords else (None, None)
+        row.update(user_id=self.user_id, lat=lat, lon=lon, coords_ts=self.coords_ts)
+        return row
+
+    @classmethod
+    def from_record(cls, record: WalkSessionRecord) -> "WalkSession":
+        walk = cls(record.user_id)
+        for name in _PERSISTED_FIELDS:
+            setattr(walk, name, getattr(record, name))
+        if record.lat is not None and record.lon is not None:
+            walk.coords = (record.lat, record.lon)
+        walk.coords_ts = record.coords_ts
+        return walk
+
+
+class WalkSessionStore:
+    """
+    Хранилище прогулок в памяти процесса: одна компактная запись на пользователя.
+    """
+
+    def __init__(self) -> None:
+        self._sessions: Dict[int, WalkSession] = {}
+
+    async def start(self) -> None:
+        return None
+
+    async def close(self) -> None:
+        return None
+
+    async def get(self, user_id: int) -> Optional[WalkSession]:
+        return self._sessions.get(user_id)
+
+    async def get_or_create(self, user_id: int) -> WalkSession:
+        walk = await self.get(user_id)
+        if walk is None:
+            walk = WalkSession(user_id)
+            self._sessions[user_id] = walk
+        return walk
+
+    # Переживает ли запись вытеснение из памяти (есть ли копия вне процесса)
+    durable = False
+
+    def save(self, walk: WalkSession) -> None:
+        """Фиксирует изменения записи и отмечает время последней активности."""
+        walk.touched_at = time.time()
+        self._sessions[walk.user_id] = walk
+
+    async def delete(self, user_id: int) -> None:
+        self._sessions.pop(user_id, None)
+
+    def owns(self, user_id: int) -> bool:
+        """Ведёт ли этот процесс прогулку пользователя (в памяти — только свои записи)."""
+        return True
+
+    async def claim_finish(self, walk: WalkSession) -> bool:
+        """
+        Помечает прогулку завершённой, если она ещё не завершена. Возвращает True
+        ровно одному вызывающему — только он начисляет баллы.
+        """
+        if walk.finished:
+            return False
+        walk.finished = True
+        return True
+
+    def evict(self, user_id: int) -> Optional[WalkSession]:
+        """Убирает запись из памяти процесса. Возвращает вытесненную запись."""
+        return self._sessions.pop(user_id, None)
+
+    async def purge_stale(self, today: str) -> int:
+        """Удаляет вне памяти записи без активной прогулки и без лимита за сегодня."""
+        return 0
+
+    def cached(self) -> Iterator[WalkSession]:
+        """Перебирает загруженные в память записи."""
+        return iter(list(self._sessions.values()))
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class DbWalkSessionStore(WalkSessionStore):
+    """
+    Хранилище прогулок с кэшем в памяти и отложенной пакетной записью в таблицу walk_sessions.
+
+    Изменённые записи копятся в наборе «грязных» и сбрасываются одним upsert раз в
+    WALK_SESSION_FLUSH_SECONDS или при достижении WALK_SESSION_FLUSH_BATCH записей.
+
+    Таблица общая для всех воркеров, но кэш — локальный для шарда: после рестарта
+    процесс поднимает только прогулки пользователей своего шарда (shard_for по
+    SHARD_WORKER_URLS и SHARD_INDEX), а reaper завершает только их. Завершение
+    подтверждается условным UPDATE в БД (claim_finish), поэтому баллы за прогулку
+    начисляются один раз, даже если запись оказалась в кэше двух процессов.
+    """
+
+    durable = True
+
+    def __init__(
+        self,
+        flush_interval: float | None = None,
+        flush_batch: int | None = None,
+        shard_index: int | None = None,
+        shard_count: int | None = None,
+    ) -> None:
+        super().__init__()
+        self._shard_index = config.SHARD_INDEX if shard_index is None else shard_index
+        self._shard_count = max(1, len(worker_urls())) if shard_count is None else shard_count
+        self._flush_interval = flush_interval or config.WALK_SESSION_FLUSH_SECONDS
+        self._flush_batch = flush_batch or config.WALK_SESSION_FLUSH_BATCH
+        self._dirty: set[int] = set()
+        self._deleted: set[int] = set()
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            restored = await self.load_active()
+            logger.info("Восстановлено активных прогулок: %s", restored)
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def get(self, user_id: int) -> Optional[WalkSession]:
+        walk = self._sessions.get(user_id)
+        if walk is not None or user_id in self._deleted:
+            return walk
+        async with get_session() as s:
+            record = await s.get(WalkSessionRecord, user_id)
+        if record is None:
+            return None
+        if not self.owns(user_id):
+            # Роутер и воркер видят разные SHARD_WORKER_URLS: апдейт всё равно обрабатываем
+            logger.warning("Прогулка %s принадлежит другому шарду", user_id)
+        walk = WalkSession.from_record(record)
+        # Пока ждали БД, запись могли создать конкурентно — побеждает уже загруженная
+        return self._sessions.setdefault(user_id, walk)
+
+    def save(self, walk: WalkSession) -> None:
+        super().save(walk)
+        self._deleted.discard(walk.user_id)
+        self._dirty.add(walk.user_id)
+        if len(self._dirty) >= self._flush_batch:
+            self._wakeup.set()
+
+    async def delete(self, user_id: int) -> None:
+        await super().delete(user_id)
+        self._dirty.discard(user_id)
+        self._deleted.add(user_id)
+        self._wakeup.set()
+
+    def evict(self, user_id: int) -> Optional[WalkSession]:
+        # Несохранённую запись не вытесняем — дождёмся следующего сброса
+        if user_id in self._dirty:
+            return None
+        return super().evict(user_id)
+
+    async def flush(self) -> None:
+        """Записывает накопленные изменения и удаления одной транзакцией."""
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            deleted, self._deleted = self._deleted, set()
+            rows = [self._sessions[uid].to_row() for uid in dirty if uid in self._sessions]
+            if not rows and not deleted:
+                return
+            try:
+                async with get_session() as s:
+                    if rows:
+                        stmt = insert(WalkSessionRecord).values(rows)
+                        stmt = stmt.on_conflict_do_update(
+                            index_elements=[WalkSessionRecord.user_id],
+                            set_={
+                                **{
+                                    name: stmt.excluded[name]
+                                    for name in rows[0]
+                                    if name != "user_id"
+                                },
+                                "updated_at": func.now(),
+                            },
+                        )
+                        await s.execute(stmt)
+                    if deleted:
+                        await s.execute(
+                            delete(WalkSessionRecord).where(WalkSessionRecord.user_id.in_(deleted))
+                        )
+            except Exception:
+                logger.exception("Не удалось сохранить %s прогулок", len(rows) + len(deleted))
+                # Вернём записи в очередь, если их не успели изменить повторно
+                self._dirty |= {uid for uid in dirty if uid in self._sessions}
+                self._deleted |= deleted - set(self._sessions)
+
+    def owns(self, user_id: int) -> bool:
+        return shard_for(user_id, self._shard_count) == self._shard_index
+
+    async def claim_finish(self, walk: WalkSession) -> bool:
+        """
+        Завершает прогулку в БД: UPDATE ... WHERE NOT finished AND started_at = текущий старт.
+        Перед этим сбрасываются несохранённые изменения, чтобы строка описывала эту прогулку.
+        """
+        if walk.finished or walk.started_at is None:
+            return False
+        await self.flush()
+        if walk.user_id in self._dirty:
+            # Сброс не удался — завершим в следующий раз, не рискуя начислить дважды
+            return False
+        async with get_session() as s:
+            claimed = await s.scalar(
+                update(WalkSessionRecord)
+                .where(
+                    WalkSessionRecord.user_id == walk.user_id,
+                    WalkSessionRecord.finished.is_(False),
+                    WalkSessionRecord.started_at == walk.started_at,
+                )
+                .values(finished=True, updated_at=func.now())
+                .returning(WalkSessionRecord.user_id)
+            )
+        if claimed is None:
+            # Прогулку уже завершил другой процесс: локальная копия устарела
+            self._sessions.pop(walk.user_id, None)
+            return False
+        walk.finished = True
+        return True
+
+    async def purge_stale(self, today: str) -> int:
+        async with get_session() as s:
+            result = await s.execute(
+                delete(WalkSessionRecord).where(
+                    WalkSessionRecord.finished.is_(True) | WalkSessionRecord.started_at.is_(None),
+                    WalkSessionRecord.daily_steps_date.is_(None)
+                    | (WalkSessionRecord.daily_steps_date < today),
+                )
+            )
+        return int(result.rowcount or 0)
+
+    async def load_active(self) -> int:
+        """Подгружает в кэш незавершённые прогулки своего шарда (после рестарта)."""
+        async with get_session() as s:
+            records = (
+                await s.execute(
+                    select(WalkSessionRecord).where(
+                        WalkSessionRecord.finished.is_(False),
+                        WalkSessionRecord.started_at.is_not(None),
+                    )
+                )
+            ).scalars().all()
+        # shard_for — хэш в Python, поэтому строки чужих шардов отбрасываются здесь
+        records = [r for r in records if self.owns(r.user_id)]
+        for record in records:
+            self._sessions.setdefault(record.user_id, WalkSession.from_record(record))
+        return len(records)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+
+def create_walk_session_store(backend: str | None = None) -> WalkSessionStore:
+    """
+    Создаёт хранилище прогулок по имени бэкенда: memory | db.
+    """
+    name = (backend or config.WALK_SESSION_BACKEND).lower()
+    if name == "memory":
+        return WalkSessionStore()
+    if name == "db":
+        return DbWalkSessionStore()
+    raise ValueError(f"Неизвестный бэкенд хранилища прогулок: {name}")
+
+
+walk_sessions: WalkSessionStore = create_walk_session_store()
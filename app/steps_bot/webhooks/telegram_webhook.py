@@ -1,17 +1,29 @@
 from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
 from aiogram.types import Update
 import logging
 
 from app.steps_bot.dispatcher import bot, dp
+from app.steps_bot.sharding import SECRET_HEADER, ShardRouter, is_sharded, secret_matches, worker_urls
 
 router = APIRouter()
 
+# В шардированном режиме этот процесс только маршрутизирует апдейты воркерам
+shard_router = ShardRouter(worker_urls()) if is_sharded() else None
+
 
 @router.post('/webhook')
 async def telegram_webhook(request: Request):
+    if not secret_matches(request.headers.get(SECRET_HEADER)):
+        return JSONResponse(status_code=403, content={'ok': False})
     try:
         body = await request.json()
         logging.debug(f'Incoming update: {body}')
+        if shard_router is not None:
+            if not await shard_router.forward(body):
+                # 5xx: Telegram повторит доставку, апдейт не теряется
+                return JSONResponse(status_code=503, content={'ok': False})
+            return {'ok': True}
         update = Update.model_validate(body)
         await dp.feed_update(bot, update)
         logging.info(f'Update processed: {update.update_id}')
@@ -0,0 +1,92 @@
+"""
+Воркер шардированного режима: обрабатывает апдейты, пересланные роутером (main.py).
+
+Апдейты принимаются только с заголовком X-Telegram-Bot-Api-Secret-Token = WEBHOOK_SECRET.
+Воркеру нужен тот же SHARD_WORKER_URLS, что и роутеру: по нему хранилище прогулок
+определяет, какие прогулки принадлежат этому шарду.
+
+Запуск одного шарда:
+    SHARD_INDEX=0 SHARD_WORKER_URLS=... WEBHOOK_SECRET=... uvicorn app.steps_bot.worker:app --host 0.0.0.0 --port 8101
+"""
+import asyncio
+import contextlib
+import logging
+from contextlib import asynccontextmanager
+
+from aiogram.types import Update
+from fastapi import Depends, FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.steps_bot import metrics
+from app.steps_bot.api.admin import validate_api_key
+from app.steps_bot.db.notify import pg_listener
+from app.steps_bot.dispatcher import bot, dp
+from app.steps_bot.settings import config
+from app.steps_bot.sharding import SECRET_HEADER, RecentUpdates, secret_matches, worker_urls
+from app.steps_bot.services.coefficients_service import subscribe_coefficient_changes
+from app.steps_bot.services.pvz_index import subscribe_pvz_changes
+from app.steps_bot.services.walk_reaper import run_walk_reaper
+from app.steps_bot.services.weather_service import close_weather_client
+from app.steps_bot.storage.walk_sessions import walk_sessions
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+)
+
+logger = logging.getLogger(__name__)
+
+SHARD_INDEX = config.SHARD_INDEX
+
+recent_updates = RecentUpdates(config.SHARD_UPDATE_DEDUP_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if not config.WEBHOOK_SECRET:
+        raise RuntimeError("WEBHOOK_SECRET is required for shard workers")
+    if not 0 <= SHARD_INDEX < len(worker_urls()):
+        raise RuntimeError(f"SHARD_WORKER_URLS must list this worker (SHARD_INDEX={SHARD_INDEX})")
+    logger.info("Shard %s starting", SHARD_INDEX)
+    await walk_sessions.start()
+    # Индекс ПВЗ и кэш коэффициентов воркера обновляются по NOTIFY
+    subscribe_pvz_changes()
+    subscribe_coefficient_changes()
+    await pg_listener.start()
+    reaper = asyncio.create_task(run_walk_reaper(bot))
+    yield
+    logger.info("Shard %s shutting down...", SHARD_INDEX)
+    reaper.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await reaper
+    await pg_listener.close()
+    await walk_sessions.close()
+    await close_weather_client()
+    await bot.session.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.post('/update')
+async def process_update(request: Request):
+    if not secret_matches(request.headers.get(SECRET_HEADER)):
+        return JSONResponse(status_code=403, content={'ok': False})
+    try:
+        body = await request.json()
+        update_id = body.get("update_id")
+        if isinstance(update_id, int) and not recent_updates.add(update_id):
+            logger.info(f'Shard {SHARD_INDEX} skipped duplicate update {update_id}')
+            return {'ok': True}
+        update = Update.model_validate(body)
+        await dp.feed_update(bot, update)
+        return {'ok': True}
+    except Exception as e:
+        logger.error(f'Shard {SHARD_INDEX} failed to process update: {e}')
+        return {'ok': False}
+
+
+# Метрики процесса — только с ключом админ-API (заголовок API_Key / API-Key)
+@app.get('/metrics', dependencies=[Depends(validate_api_key)])
+async def get_metrics():
+    return metrics.snapshot()
@@ -0,0 +1,47 @@
+"""add walk_sessions table
+
+Revision ID: i4j5k6l7m8n9
+Revises: h3i4j5k6l7m8
+Create Date: 2026-10-18
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql as pg
+
+
+revision = "i4j5k6l7m8n9"
+down_revision = "h3i4j5k6l7m8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    walkform = pg.ENUM("stroller", "dog", "stroller_dog", name="walkform", create_type=False)
+    op.create_table(
+        "walk_sessions",
+        sa.Column("user_id", sa.BigInteger(), primary_key=True, autoincrement=False),
+        sa.Column("lat", sa.Float(), nullable=True),
+        sa.Column("lon", sa.Float(), nullable=True),
+        sa.Column("coords_ts", sa.Float(), nullable=True),
+        sa.Column("steps", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("chat_id", sa.BigInteger(), nullable=True),
+        sa.Column("message_id", sa.BigInteger(), nullable=True),
+        sa.Column("was_over_speed", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("finished", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("multiplier", sa.Integer(), nullable=False, server_default="1"),
+        sa.Column("walk_form", walkform, nullable=True),
+        sa.Column("started_at", sa.Float(), nullable=True),
+        sa.Column("temp_c", sa.Integer(), nullable=True),
+        sa.Column("temp_updated_at", sa.Float(), nullable=True),
+        sa.Column("daily_steps_used", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("daily_steps_date", sa.String(10), nullable=True),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("walk_sessions")
@@ -0,0 +1,52 @@
+"""add broadcast progress columns and sending status
+
+Revision ID: j5k6l7m8n9o0
+Revises: i4j5k6l7m8n9
+Create Date: 2026-10-18
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = "j5k6l7m8n9o0"
+down_revision = "i4j5k6l7m8n9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # ALTER TYPE ... ADD VALUE нельзя выполнять внутри транзакции
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE broadcaststatus ADD VALUE IF NOT EXISTS 'sending' AFTER 'pending'")
+
+    op.add_column("broadcasts", sa.Column("started_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column(
+        "broadcasts",
+        sa.Column("cursor_user_id", sa.BigInteger(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "broadcasts",
+        sa.Column("delivered_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "broadcasts",
+        sa.Column("failed_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "broadcasts",
+        sa.Column("blocked_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("broadcasts", "blocked_count")
+    op.drop_column("broadcasts", "failed_count")
+    op.drop_column("broadcasts", "delivered_count")
+    op.drop_column("broadcasts", "cursor_user_id")
+    op.drop_column("broadcasts", "started_at")
+    # Значение enum удалить нельзя — возвращаем прерванные рассылки в очередь
+    op.execute("UPDATE broadcasts SET status = 'pending' WHERE status = 'sending'")
@@ -0,0 +1,38 @@
+"""add broadcast recipient segmentation columns
+
+Revision ID: k6l7m8n9o0p1
+Revises: j5k6l7m8n9o0
+Create Date: 2026-10-18
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = "k6l7m8n9o0p1"
+down_revision = "j5k6l7m8n9o0"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "broadcasts",
+        sa.Column("only_active", sa.Boolean(), nullable=False, server_default=sa.true()),
+    )
+    op.add_column(
+        "broadcasts",
+        sa.Column("only_with_family", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    op.add_column("broadcasts", sa.Column("min_walks", sa.Integer(), nullable=True))
+    op.add_column("broadcasts", sa.Column("landing_source", sa.String(length=120), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("broadcasts", "landing_source")
+    op.drop_column("broadcasts", "min_walks")
+    op.drop_column("broadcasts", "only_with_family")
+    op.drop_column("broadcasts", "only_active")
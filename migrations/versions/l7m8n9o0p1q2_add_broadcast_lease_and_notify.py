@@ -0,0 +1,51 @@
+"""add broadcast lease columns and NOTIFY trigger
+
+Revision ID: l7m8n9o0p1q2
+Revises: k6l7m8n9o0p1
+Create Date: 2026-10-18
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = "l7m8n9o0p1q2"
+down_revision = "k6l7m8n9o0p1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("broadcasts", sa.Column("claimed_by", sa.String(length=128), nullable=True))
+    op.add_column("broadcasts", sa.Column("lease_until", sa.DateTime(timezone=True), nullable=True))
+
+    # Новая или перенесённая рассылка будит планировщики ботов (LISTEN broadcasts_changed)
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_broadcasts_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('broadcasts_changed', NEW.id::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_broadcasts_notify
+        AFTER INSERT OR UPDATE OF scheduled_at, status ON broadcasts
+        FOR EACH ROW
+        WHEN (NEW.status = 'pending')
+        EXECUTE FUNCTION notify_broadcasts_changed();
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_broadcasts_notify ON broadcasts")
+    op.execute("DROP FUNCTION IF EXISTS notify_broadcasts_changed()")
+    op.drop_column("broadcasts", "lease_until")
+    op.drop_column("broadcasts", "claimed_by")
@@ -0,0 +1,61 @@
+"""add ledger checkpoints
+
+Revision ID: m8n9o0p1q2r3
+Revises: l7m8n9o0p1q2
+Create Date: 2026-10-18
+
+"""
+
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+revision = "m8n9o0p1q2r3"
+down_revision = "l7m8n9o0p1q2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "ledger_checkpoints",
+        sa.Column(
+            "owner_type",
+            postgresql.ENUM("user", "family", name="ownertype", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("owner_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "operation",
+            postgresql.ENUM(
+                "steps_accrual",
+                "purchase",
+                "promo_accrual",
+                "refund",
+                "manual_adjust",
+                "transfer",
+                name="operationtype",
+                create_type=False,
+            ),
+            nullable=False,
+        ),
+        sa.Column("amount_sum", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("balance_delta", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("entry_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("upto_entry_id", sa.Integer(), nullable=False),
+        sa.Column("upto_created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("owner_type", "owner_id", "operation"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("ledger_checkpoints")
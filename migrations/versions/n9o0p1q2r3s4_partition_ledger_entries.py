@@ -0,0 +1,132 @@
+"""partition ledger_entries by month
+
+Revision ID: n9o0p1q2r3s4
+Revises: m8n9o0p1q2r3
+Create Date: 2026-10-18
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "n9o0p1q2r3s4"
+down_revision = "m8n9o0p1q2r3"
+branch_labels = None
+depends_on = None
+
+# Сколько месяцев вперёд создать сразу (дальше — ensure_ledger_partitions() в боте)
+MONTHS_AHEAD = 3
+
+COLUMNS = (
+    "id, owner_type, user_id, family_id, operation, amount, balance_after, "
+    "order_id, title, description, walk_form, created_at"
+)
+
+CREATE_COLUMNS = """
+    id integer NOT NULL DEFAULT nextval('ledger_entries_id_seq'),
+    owner_type ownertype NOT NULL,
+    user_id bigint REFERENCES users (id) ON DELETE CASCADE,
+    family_id integer REFERENCES families (id) ON DELETE CASCADE,
+    operation operationtype NOT NULL,
+    amount integer NOT NULL,
+    balance_after integer,
+    order_id integer REFERENCES orders (id) ON DELETE SET NULL,
+    title varchar(120) NOT NULL,
+    description text,
+    walk_form walkform,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    CONSTRAINT ck_ledger_owner_fk CHECK (
+        (owner_type = 'user' AND user_id IS NOT NULL AND family_id IS NULL) OR
+        (owner_type = 'family' AND family_id IS NOT NULL AND user_id IS NULL)
+    )
+"""
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE ledger_entries RENAME TO ledger_entries_old")
+    op.execute("ALTER TABLE ledger_entries_old RENAME CONSTRAINT ledger_entries_pkey TO ledger_entries_old_pkey")
+    for name in (
+        "ix_ledger_owner_created",
+        "ix_ledger_user_created",
+        "ix_ledger_family_created",
+        "ix_ledger_operation_created",
+    ):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    # Ключ секционирования обязан входить в первичный ключ
+    op.execute(
+        f"""
+        CREATE TABLE ledger_entries (
+            {CREATE_COLUMNS},
+            CONSTRAINT ledger_entries_pkey PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute("ALTER SEQUENCE ledger_entries_id_seq OWNED BY ledger_entries.id")
+    op.execute("ALTER TABLE ledger_entries_old ALTER COLUMN id DROP DEFAULT")
+
+    # Месячные секции (границы в UTC) от первой проводки до MONTHS_AHEAD месяцев вперёд
+    op.execute(
+        f"""
+        DO $$
+        DECLARE
+            m date;
+            last_month date;
+        BEGIN
+            m := date_trunc(
+                'month',
+                COALESCE((SELECT min(created_at) FROM ledger_entries_old), now()) AT TIME ZONE 'UTC'
+            )::date;
+            last_month := (date_trunc('month', now() AT TIME ZONE 'UTC')
+                           + interval '{MONTHS_AHEAD} months')::date;
+            WHILE m <= last_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF ledger_entries FOR VALUES FROM (%L) TO (%L)',
+                    'ledger_entries_' || to_char(m, 'YYYY_MM'),
+                    m::timestamp AT TIME ZONE 'UTC',
+                    (m + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+                );
+                m := (m + interval '1 month')::date;
+            END LOOP;
+        END
+        $$;
+        """
+    )
+    # Страховка: строки вне созданных секций не ломают вставку
+    op.execute("CREATE TABLE ledger_entries_default PARTITION OF ledger_entries DEFAULT")
+
+    op.execute(f"INSERT INTO ledger_entries ({COLUMNS}) SELECT {COLUMNS} FROM ledger_entries_old")
+    op.execute("DROP TABLE ledger_entries_old")
+
+    # Индексы на родителе создаются в каждой секции. Вместо пяти — три:
+    # история/итоги владельца и BRIN по времени (дёшево для append-only вставок)
+    op.execute("CREATE INDEX ix_ledger_user_created ON ledger_entries (user_id, created_at)")
+    op.execute("CREATE INDEX ix_ledger_family_created ON ledger_entries (family_id, created_at)")
+    op.execute("CREATE INDEX ix_ledger_created_brin ON ledger_entries USING brin (created_at)")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE ledger_entries RENAME TO ledger_entries_part")
+    op.execute("ALTER TABLE ledger_entries_part RENAME CONSTRAINT ledger_entries_pkey TO ledger_entries_part_pkey")
+    for name in ("ix_ledger_user_created", "ix_ledger_family_created", "ix_ledger_created_brin"):
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+    op.execute(
+        f"""
+        CREATE TABLE ledger_entries (
+            {CREATE_COLUMNS},
+            CONSTRAINT ledger_entries_pkey PRIMARY KEY (id)
+        )
+        """
+    )
+    op.execute("ALTER SEQUENCE ledger_entries_id_seq OWNED BY ledger_entries.id")
+    op.execute("ALTER TABLE ledger_entries_part ALTER COLUMN id DROP DEFAULT")
+    op.execute(f"INSERT INTO ledger_entries ({COLUMNS}) SELECT {COLUMNS} FROM ledger_entries_part")
+    op.execute("DROP TABLE ledger_entries_part")
+
+    op.execute("CREATE INDEX ix_ledger_owner_created ON ledger_entries (owner_type, created_at)")
+    op.execute("CREATE INDEX ix_ledger_user_created ON ledger_entries (user_id, created_at)")
+    op.execute("CREATE INDEX ix_ledger_family_created ON ledger_entries (family_id, created_at)")
+    op.execute("CREATE INDEX ix_ledger_operation_created ON ledger_entries (operation, created_at)")
@@ -0,0 +1,32 @@
+"""ledger history keyset indexes
+
+Revision ID: o0p1q2r3s4t5
+Revises: n9o0p1q2r3s4
+Create Date: 2026-10-18
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "o0p1q2r3s4t5"
+down_revision = "n9o0p1q2r3s4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Курсор истории — (created_at, id): индексы владельца дополняются id и заменяют прежние
+    op.execute("CREATE INDEX ix_ledger_user_created_id ON ledger_entries (user_id, created_at, id)")
+    op.execute("CREATE INDEX ix_ledger_family_created_id ON ledger_entries (family_id, created_at, id)")
+    op.execute("DROP INDEX IF EXISTS ix_ledger_user_created")
+    op.execute("DROP INDEX IF EXISTS ix_ledger_family_created")
+
+
+def downgrade() -> None:
+    op.execute("CREATE INDEX ix_ledger_user_created ON ledger_entries (user_id, created_at)")
+    op.execute("CREATE INDEX ix_ledger_family_created ON ledger_entries (family_id, created_at)")
+    op.execute("DROP INDEX IF EXISTS ix_ledger_user_created_id")
+    op.execute("DROP INDEX IF EXISTS ix_ledger_family_created_id")
@@ -0,0 +1,112 @@
+"""pvz trigram search columns
+
+Revision ID: p1q2r3s4t5u6
+Revises: o0p1q2r3s4t5
+Create Date: 2026-10-18
+
+"""
+
+from __future__ import annotations
+
+import re
+
+import sqlalchemy as sa
+from alembic import op
+
+
+revision = "p1q2r3s4t5u6"
+down_revision = "o0p1q2r3s4t5"
+branch_labels = None
+depends_on = None
+
+# Копия разбора из app/steps_bot/services/pvz_address.py на момент миграции:
+# миграция не должна меняться вместе с кодом бота (и не импортирует его)
+_NON_WORD_RE = re.compile(r"[^0-9a-zа-я]+")
+_DIGIT_RE = re.compile(r"\d")
+_POSTCODE_RE = re.compile(r"^\d{6}$")
+_CITY_PREFIXES = {"г", "город", "гор", "пгт", "пос", "поселок", "с", "село", "д", "деревня"}
+_REGION_WORDS = {"обл", "область", "край", "респ", "республика", "район", "р-н", "ао", "округ"}
+_ADJECTIVE_ENDINGS = ("ий", "ый", "ой", "ая", "ое", "ие", "ые", "яя")
+
+
+def _normalize_text(value: str) -> str:
+    text = (value or "").lower().replace("ё", "е")
+    return _NON_WORD_RE.sub(" ", text).strip()
+
+
+def _street_from(words: list) -> str:
+    street = []
+    for word in words:
+        if _DIGIT_RE.search(word):
+            break
+        street.append(word)
+    return " ".join(street)
+
+
+def _parse_address(full_address: str) -> dict:
+    address = (full_address or "").strip()
+    segments = [s.strip() for s in address.split(",") if s.strip()]
+    if len(segments) > 1:
+        while len(segments) > 1 and (
+            _POSTCODE_RE.match(segments[0])
+            or any(w in _REGION_WORDS for w in segments[0].lower().replace(".", " ").split())
+        ):
+            segments = segments[1:]
+        city_words = _normalize_text(segments[0]).split()
+        while city_words and city_words[0] in _CITY_PREFIXES and len(city_words) > 1:
+            city_words = city_words[1:]
+        city = " ".join(city_words)
+        street = _normalize_text(_street_from(segments[1].split())) if len(segments) > 1 else ""
+    else:
+        words = address.split()
+        words = words[1:] if words and _POSTCODE_RE.match(words[0]) else words
+        while len(words) > 1 and _normalize_text(words[0]) in _CITY_PREFIXES:
+            words = words[1:]
+        size = 1
+        if (
+            len(words) > 2
+            and words[0].endswith(_ADJECTIVE_ENDINGS)
+            and not _DIGIT_RE.search(words[1])
+            and words[1][:1].isupper()
+        ):
+            size = 2
+        city = _normalize_text(" ".join(words[:size]))
+        street = _normalize_text(_street_from(words[size:]))
+    # Длины новых колонок: city varchar(128), street и search varchar(255)
+    return {
+        "city": city[:128].rstrip(),
+        "street": street[:255].rstrip(),
+        "search": _normalize_text(address)[:255].rstrip(),
+    }
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.add_column("pvz", sa.Column("city", sa.String(length=128), nullable=True))
+    op.add_column("pvz", sa.Column("street", sa.String(length=255), nullable=True))
+    op.add_column("pvz", sa.Column("search", sa.String(length=255), nullable=True))
+
+    # Заполняем разобранные колонки тем же разбором, что был при импорте
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, full_address FROM pvz")).all()
+    if rows:
+        params = []
+        for pvz_id, full_address in rows:
+            params.append({"id": pvz_id, **_parse_address(full_address)})
+        bind.execute(
+            sa.text("UPDATE pvz SET city = :city, street = :street, search = :search WHERE id = :id"),
+            params,
+        )
+
+    op.create_index("ix_pvz_city", "pvz", ["city"])
+    op.execute("CREATE INDEX ix_pvz_city_trgm ON pvz USING gin (city gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_pvz_search_trgm ON pvz USING gin (search gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_pvz_search_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_pvz_city_trgm")
+    op.drop_index("ix_pvz_city", table_name="pvz")
+    op.drop_column("pvz", "search")
+    op.drop_column("pvz", "street")
+    op.drop_column("pvz", "city")
@@ -0,0 +1,45 @@
+"""pvz change NOTIFY trigger
+
+Revision ID: q2r3s4t5u6v7
+Revises: p1q2r3s4t5u6
+Create Date: 2026-10-18
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "q2r3s4t5u6v7"
+down_revision = "p1q2r3s4t5u6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Любое изменение pvz (импорт, админка) перестраивает индексы ПВЗ в ботах (LISTEN pvz_changed).
+    # Триггер на выражение: импорт целиком — одно уведомление, доставляется после коммита
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_pvz_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('pvz_changed', '');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER trg_pvz_notify
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON pvz
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION notify_pvz_changed();
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_pvz_notify ON pvz")
+    op.execute("DROP FUNCTION IF EXISTS notify_pvz_changed()")
@@ -0,0 +1,26 @@
+"""orders created_at index
+
+Revision ID: r3s4t5u6v7w8
+Revises: q2r3s4t5u6v7
+Create Date: 2026-10-18
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "r3s4t5u6v7w8"
+down_revision = "q2r3s4t5u6v7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Выгрузка заказов за период: диапазон по created_at и курсор (created_at, id)
+    op.create_index("ix_orders_created_id", "orders", ["created_at", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_orders_created_id", table_name="orders")
@@ -0,0 +1,48 @@
+"""coefficients change NOTIFY triggers
+
+Revision ID: s4t5u6v7w8x9
+Revises: r3s4t5u6v7w8
+Create Date: 2026-10-18
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "s4t5u6v7w8x9"
+down_revision = "r3s4t5u6v7w8"
+branch_labels = None
+depends_on = None
+
+TABLES = ("walk_form_coefficients", "temperature_coefficients")
+
+
+def upgrade() -> None:
+    # Правка коэффициентов в админке сбрасывает их кэш в ботах (LISTEN coefficients_changed)
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_coefficients_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('coefficients_changed', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for table in TABLES:
+        op.execute(
+            f"""
+            CREATE TRIGGER trg_{table}_notify
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT
+            EXECUTE FUNCTION notify_coefficients_changed();
+            """
+        )
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_notify ON {table}")
+    op.execute("DROP FUNCTION IF EXISTS notify_coefficients_changed()")
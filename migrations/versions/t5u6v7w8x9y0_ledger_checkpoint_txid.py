@@ -0,0 +1,94 @@
+"""snapshot-safe ledger checkpoint boundary
+
+Revision ID: t5u6v7w8x9y0
+Revises: s4t5u6v7w8x9
+Create Date: 2026-10-18
+
+"""
+
+from __future__ import annotations
+
+from alembic import op
+
+
+revision = "t5u6v7w8x9y0"
+down_revision = "s4t5u6v7w8x9"
+branch_labels = None
+depends_on = None
+
+# balance_effect() из services/ledger_checkpoints.py на момент миграции
+BALANCE_EFFECT = """
+    CASE
+        WHEN owner_type = 'user' AND operation = 'transfer' THEN -amount
+        WHEN owner_type = 'user' AND balance_after IS NULL THEN 0
+        ELSE amount
+    END
+"""
+
+
+def upgrade() -> None:
+    # Без значения по умолчанию столбец добавляется без перезаписи секций;
+    # у старых проводок txid IS NULL — они целиком переносятся в снимок ниже
+    op.execute("ALTER TABLE ledger_entries ADD COLUMN txid xid8")
+    op.execute("ALTER TABLE ledger_entries ALTER COLUMN txid SET DEFAULT pg_current_xact_id()")
+
+    # ADD COLUMN держит ACCESS EXCLUSIVE: незавершённых записей в журнал сейчас нет,
+    # поэтому всё после старой границы по id можно досчитать в снимок
+    op.execute(
+        f"""
+        INSERT INTO ledger_checkpoints (
+            owner_type, owner_id, operation, amount_sum, balance_delta, entry_count,
+            upto_entry_id, upto_created_at
+        )
+        SELECT owner_type, coalesce(user_id, family_id), operation,
+               sum(amount), sum({BALANCE_EFFECT}), count(*), 0, now()
+        FROM ledger_entries
+        WHERE id > (SELECT coalesce(max(upto_entry_id), 0) FROM ledger_checkpoints)
+        GROUP BY owner_type, coalesce(user_id, family_id), operation
+        ON CONFLICT (owner_type, owner_id, operation) DO UPDATE SET
+            amount_sum = ledger_checkpoints.amount_sum + EXCLUDED.amount_sum,
+            balance_delta = ledger_checkpoints.balance_delta + EXCLUDED.balance_delta,
+            entry_count = ledger_checkpoints.entry_count + EXCLUDED.entry_count,
+            updated_at = now()
+        """
+    )
+    op.drop_column("ledger_checkpoints", "upto_entry_id")
+    op.drop_column("ledger_checkpoints", "upto_created_at")
+
+    op.execute(
+        """
+        CREATE TABLE ledger_checkpoint_state (
+            id smallint PRIMARY KEY,
+            upto_txid xid8 NOT NULL,
+            updated_at timestamptz NOT NULL DEFAULT now()
+        )
+        """
+    )
+    # Транзакции, которые ещё идут, получат txid не меньше этой границы
+    op.execute(
+        "INSERT INTO ledger_checkpoint_state (id, upto_txid) "
+        "VALUES (1, pg_snapshot_xmin(pg_current_snapshot()))"
+    )
+    op.execute("CREATE INDEX ix_ledger_txid ON ledger_entries (txid)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_ledger_txid")
+    op.execute("ALTER TABLE ledger_checkpoints ADD COLUMN upto_entry_id integer")
+    op.execute("ALTER TABLE ledger_checkpoints ADD COLUMN upto_created_at timestamptz")
+    # Старая граница по id: последняя проводка, целиком вошедшая в снимок
+    op.execute(
+        """
+        UPDATE ledger_checkpoints SET
+            upto_entry_id = coalesce((
+                SELECT max(e.id) FROM ledger_entries e
+                WHERE e.txid IS NULL
+                   OR e.txid < (SELECT upto_txid FROM ledger_checkpoint_state WHERE id = 1)
+            ), 0),
+            upto_created_at = now()
+        """
+    )
+    op.execute("ALTER TABLE ledger_checkpoints ALTER COLUMN upto_entry_id SET NOT NULL")
+    op.execute("ALTER TABLE ledger_checkpoints ALTER COLUMN upto_created_at SET NOT NULL")
+    op.execute("DROP TABLE ledger_checkpoint_state")
+    op.execute("ALTER TABLE ledger_entries DROP COLUMN txid")
@@ -0,0 +1,35 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.steps_bot.api import admin
+from app.steps_bot.db.repo import OrderCursor
+from app.steps_bot.settings import config
+
+URL = "/order/2025-10-01-2025-10-17"
+
+
+@pytest.mark.parametrize(
+    "created_at",
+    [
+        datetime(2025, 10, 17, 12, 30, 45, 123456, tzinfo=timezone.utc),
+        datetime(2025, 10, 17, 15, 30, 45, 1, tzinfo=timezone(timedelta(hours=3))),
+    ],
+)
+def test_order_cursor_round_trip(created_at):
+    cursor = OrderCursor(created_at, 7, 2**40)
+    assert OrderCursor.decode(cursor.encode()) == cursor
+
+
+@pytest.mark.parametrize("cursor", ["1:2", "x:1:2", f"{10**20}:1:2", f"-{10**20}:1:2"])
+def test_bad_cursor_is_400(cursor):
+    client = TestClient(admin.app)
+    resp = client.get(URL, params={"cursor": cursor, "limit": 10}, headers={"API-Key": config.API_KEY})
+    assert resp.status_code == 400
+    assert resp.json() == {"detail": "Invalid cursor"}
+
+
+def test_order_export_has_no_response_model():
+    route = next(r for r in admin.app.routes if getattr(r, "path", None) == "/order/{date_range}")
+    assert route.response_model is None
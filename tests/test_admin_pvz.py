@@ -0,0 +1,78 @@
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+
+from app.steps_bot.api import admin
+from app.steps_bot.db import repo
+from app.steps_bot.db.models.pvz import PVZ
+from app.steps_bot.settings import config
+
+HEADERS = {"API-Key": config.API_KEY}
+
+
+def _post(body: bytes, content_type: str = "application/json"):
+    client = TestClient(admin.app)
+    return client.post("/pvz", content=body, headers={**HEADERS, "Content-Type": content_type})
+
+
+def test_invalid_items_report():
+    body = b'[{"id": "a", "full_address": "x"}, {"id": "b"}, 5, {"id": "", "full_address": "y"}]'
+    resp = _post(body)
+    assert resp.status_code == 400
+    assert resp.json() == {
+        "detail": {
+            "message": "3 invalid PVZ items, nothing saved",
+            "errors_total": 3,
+            "errors": [
+                {"index": 1, "error": "missing required fields: id, full_address"},
+                {"index": 2, "error": "not a valid object"},
+                {"index": 3, "error": f"id must be 1-{admin.PVZ_ID_MAX_LENGTH} characters"},
+            ],
+        }
+    }
+
+
+def test_invalid_items_are_capped(monkeypatch):
+    monkeypatch.setattr(config, "PVZ_IMPORT_MAX_ERRORS", 2)
+    resp = _post(b"\n".join([b"{}", b"not json", b"[]", b"{}"]), "application/x-ndjson")
+    detail = resp.json()["detail"]
+    assert resp.status_code == 400
+    assert detail["errors_total"] == 4
+    assert [e["index"] for e in detail["errors"]] == [0, 1]
+    assert detail["errors"][1]["error"].startswith("invalid JSON")
+
+
+def test_malformed_array_is_400():
+    resp = _post(b'[{"id": "a", "full_address": "x"} {"id": "b"}]')
+    assert resp.status_code == 400
+    assert resp.json()["detail"].startswith("Invalid JSON in request body: expected ','")
+
+
+def test_import_timeout_is_408(monkeypatch):
+    async def slow(items):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(config, "PVZ_IMPORT_TIMEOUT_SECONDS", 0.01)
+    monkeypatch.setattr(admin, "_import_pvz", slow)
+    resp = _post(b"[]")
+    assert resp.status_code == 408
+
+
+def test_error_after_staged_batch_saves_nothing(run_db, monkeypatch):
+    monkeypatch.setattr(config, "PVZ_IMPORT_BATCH_SIZE", 1)
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=admin.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", headers=HEADERS) as client:
+            ok = await client.post("/pvz", json=[{"id": "a", "full_address": "Москва, ул. Тверская, 1"}])
+            bad = await client.post(
+                "/pvz",
+                json=[{"id": "b", "full_address": "Казань, ул. Баумана, 12"}, {"id": "c"}],
+            )
+        async with repo.get_session(isolated=True) as s:
+            ids = (await s.execute(select(PVZ.id))).scalars().all()
+        return ok.status_code, ok.json()["inserted"], bad.status_code, bad.json()["detail"]["errors_total"], ids
+
+    assert run_db(scenario) == (200, 1, 400, 1, ["a"])
@@ -0,0 +1,109 @@
+import asyncio
+import contextlib
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from app.steps_bot.db.models import Broadcast, MediaType
+from app.steps_bot.services import broadcast_service
+from app.steps_bot.services.broadcast_sender import DeliveryResult
+
+
+@pytest.fixture
+def recipients(monkeypatch):
+    """Получатели 1..N из памяти вместо БД; fetches — курсоры запрошенных партий."""
+    users = [(i, 1000 + i) for i in range(1, 8)]
+    state = SimpleNamespace(fetches=[], prefetch_cancelled=False, saved=[])
+
+    @contextlib.asynccontextmanager
+    async def session():
+        yield None
+
+    async def list_recipients(_session, _b, after_user_id=0, limit=None):
+        state.fetches.append(after_user_id)
+        if after_user_id > 0:
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                state.prefetch_cancelled = True
+                raise
+        return [u for u in users if u[0] > after_user_id][:limit]
+
+    async def save_progress(broadcast_id, cursor, counts):
+        state.saved.append((cursor, Counter(counts)))
+        return False
+
+    monkeypatch.setattr(broadcast_service, "get_session", session)
+    monkeypatch.setattr(broadcast_service, "list_recipients", list_recipients)
+    monkeypatch.setattr(broadcast_service, "_save_progress", save_progress)
+    return state
+
+
+def _broadcast(**kwargs):
+    return Broadcast(id=1, text="hi", cursor_user_id=0, **kwargs)
+
+
+def test_lease_lost_cancels_prefetch(monkeypatch, recipients):
+    async def send_one(b, chat_id):
+        return None
+
+    monkeypatch.setattr(broadcast_service, "_send_one", send_one)
+
+    async def run():
+        with pytest.raises(broadcast_service.BroadcastLeaseLost):
+            await broadcast_service.send_broadcast_now(_broadcast(media_type=MediaType.NONE))
+        # Отмена доходит до задачи на следующей итерации цикла, а не при остановке цикла
+        await asyncio.sleep(0)
+        assert recipients.prefetch_cancelled
+
+    monkeypatch.setattr(broadcast_service.config, "BROADCAST_BATCH_SIZE", 3)
+    asyncio.run(run())
+    assert recipients.fetches == [0, 3]
+
+
+def test_upload_attempts_are_capped(monkeypatch, recipients):
+    calls = []
+
+    async def send_one(b, chat_id):
+        calls.append(chat_id)
+        raise RuntimeError("upload failed")
+
+    async def owned(broadcast_id, cursor, counts):
+        recipients.saved.append((cursor, Counter(counts)))
+        return True
+
+    monkeypatch.setattr(broadcast_service, "_send_one", send_one)
+    monkeypatch.setattr(broadcast_service, "_save_progress", owned)
+    monkeypatch.setattr(broadcast_service.config, "BROADCAST_UPLOAD_ATTEMPTS", 2)
+    b = _broadcast(media_type=MediaType.PHOTO, media_url="https://example.invalid/p.jpg")
+
+    with pytest.raises(broadcast_service.BroadcastUploadFailed):
+        asyncio.run(broadcast_service.send_broadcast_now(b))
+    assert calls == [1001, 1002]
+    assert recipients.saved == [(2, Counter({DeliveryResult.FAILED: 2}))]
+
+
+def test_file_id_cache_error_keeps_delivery(monkeypatch, recipients):
+    sent = SimpleNamespace(photo=[SimpleNamespace(file_id="AgAD")])
+
+    async def send_one(b, chat_id):
+        return sent
+
+    async def owned(broadcast_id, cursor, counts):
+        recipients.saved.append((cursor, Counter(counts)))
+        return True
+
+    async def cache_file_id(b, message):
+        # file_id уже в памяти рассылки, запись в БД упала
+        b.telegram_file_id = message.photo[-1].file_id
+        raise ConnectionError("db down")
+
+    monkeypatch.setattr(broadcast_service, "_send_one", send_one)
+    monkeypatch.setattr(broadcast_service, "_save_progress", owned)
+    monkeypatch.setattr(broadcast_service, "_cache_file_id", cache_file_id)
+    b = _broadcast(media_type=MediaType.PHOTO, media_url="https://example.invalid/p.jpg")
+
+    totals = asyncio.run(broadcast_service.send_broadcast_now(b))
+    assert totals == Counter({DeliveryResult.DELIVERED: 7})
+    assert b.telegram_file_id == "AgAD"
@@ -0,0 +1,43 @@
+import asyncio
+
+from app.steps_bot.db.models.walk import WalkForm
+from app.steps_bot.services import coefficients_service
+from app.steps_bot.services.coefficients_service import CoefficientTable
+
+FORM = next(iter(WalkForm))
+
+
+def test_temperature_coef_picks_range():
+    table = CoefficientTable({FORM: 2}, [(FORM, -30, -10, 3), (FORM, -9, 5, 2)])
+    assert table.walk_form_coef(FORM) == 2
+    assert table.temperature_coef(FORM, -20) == 3
+    assert table.temperature_coef(FORM, 0) == 2
+    assert table.temperature_coef(FORM, 20) == 1
+    assert table.temperature_coef(FORM, None) == 1
+
+
+def test_invalidate_during_load_is_not_cached(monkeypatch):
+    loads = []
+
+    async def load():
+        loads.append(1)
+        if len(loads) == 1:
+            # NOTIFY пришёл, пока читались старые коэффициенты
+            coefficients_service.invalidate_coefficients("walk_form_coefficients")
+        return CoefficientTable({FORM: len(loads)}, [])
+
+    monkeypatch.setattr(coefficients_service, "_load_table", load)
+    monkeypatch.setattr(coefficients_service, "_table", None)
+    monkeypatch.setattr(coefficients_service, "_load_lock", asyncio.Lock())
+
+    async def run():
+        first = await coefficients_service.get_coefficient_table()
+        second = await coefficients_service.get_coefficient_table()
+        third = await coefficients_service.get_coefficient_table()
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first.walk_form_coef(FORM) == 1
+    assert second.walk_form_coef(FORM) == 2
+    assert third is second
+    assert len(loads) == 2
@@ -0,0 +1,80 @@
+import asyncio
+import json
+
+import pytest
+
+from app.steps_bot.api.json_stream import JSONStreamError, iter_json_array, iter_ndjson
+
+BODY = json.dumps(
+    [12345, -1.5e-3, 0, True, None, "Москва", {"id": "a1", "full_address": "Казань, ул. Баумана, 12"}, [1, 2]],
+    ensure_ascii=False,
+).encode()
+
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def _parse(parser, *chunks: bytes):
+    async def collect():
+        async def source():
+            for chunk in chunks:
+                yield chunk
+
+        return [item async for item in parser(source())]
+
+    return asyncio.run(collect())
+
+
+def test_array_split_at_every_byte():
+    # Каждая точка разреза: посреди числа, литерала, строки и многобайтного символа
+    expected = [(i, item, None) for i, item in enumerate(json.loads(BODY))]
+    for cut in range(1, len(BODY)):
+        assert _parse(iter_json_array, BODY[:cut], BODY[cut:]) == expected, cut
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_array_in_small_chunks(size):
+    async def collect():
+        return [item async for item in iter_json_array(_chunks(BODY, size))]
+
+    assert [item for _, item, _ in asyncio.run(collect())] == json.loads(BODY)
+
+
+@pytest.mark.parametrize(
+    "chunks, value",
+    [
+        ((b"[12", b"3]"), 123),
+        ((b"[1.", b"5]"), 1.5),
+        ((b"[1e", b"-3]"), 1e-3),
+        ((b"[-", b"7 ]"), -7),
+        ((b"[tr", b"ue]"), True),
+        ((b"[1", b"2", b"3", b"]"), 123),
+    ],
+)
+def test_scalar_split_across_chunks(chunks, value):
+    assert _parse(iter_json_array, *chunks) == [(0, value, None)]
+
+
+@pytest.mark.parametrize(
+    "chunks",
+    [
+        (b"[1x]",),
+        (b"[1", b"x]"),
+        (b"[1.]",),
+        (b"[true", b"1]"),
+        (b"[1, 2",),
+        (b"{}",),
+        (b"[1] 2",),
+    ],
+)
+def test_array_errors(chunks):
+    with pytest.raises(JSONStreamError):
+        _parse(iter_json_array, *chunks)
+
+
+def test_ndjson_split_lines_and_errors():
+    items = _parse(iter_ndjson, b'{"id": 1}\n{"id"', b': 2}\n\nnot json\n', b'{"id": 3}')
+    assert [(i, item) for i, item, _ in items] == [(0, {"id": 1}), (1, {"id": 2}), (3, None), (4, {"id": 3})]
+    assert items[2][2].startswith("invalid JSON")
@@ -0,0 +1,65 @@
+from app.steps_bot.db import repo
+from app.steps_bot.db.ledger_writer import LedgerWriter
+from app.steps_bot.db.models.ledger import OperationType, OwnerType
+from app.steps_bot.db.models.user import User
+from app.steps_bot.services.ledger_checkpoints import (
+    checkpoint_ledger,
+    get_owner_totals,
+    reconcile_balances,
+)
+
+
+async def _user(telegram_id: int) -> int:
+    async with repo.get_session(isolated=True) as s:
+        user = User(telegram_id=telegram_id, balance=0)
+        s.add(user)
+        await s.flush()
+        return user.id
+
+
+async def _credit(session, user_id: int, amount: int) -> None:
+    writer = LedgerWriter(session)
+    writer.add(
+        owner_type=OwnerType.USER,
+        user_id=user_id,
+        operation=OperationType.MANUAL_ADJUST,
+        amount=amount,
+        title="test",
+    )
+    await writer.flush()
+
+
+async def _state(*user_ids: int):
+    amounts = []
+    async with repo.get_session(isolated=True) as s:
+        for user_id in user_ids:
+            totals = await get_owner_totals(s, OwnerType.USER, user_id)
+            adjust = totals.get(OperationType.MANUAL_ADJUST)
+            amounts.append(adjust.amount if adjust else 0)
+    return amounts, await reconcile_balances()
+
+
+def test_checkpoint_keeps_late_commits(run_db):
+    async def scenario():
+        first, second = await _user(100), await _user(200)
+        states = []
+        # Транзакция A пишет первой, но коммитится после B и после снимка
+        async with repo.get_session(isolated=True) as a:
+            await _credit(a, first, 5)
+            async with repo.get_session(isolated=True) as b:
+                await _credit(b, second, 7)
+            await checkpoint_ledger()
+            states.append(await _state(first, second))
+        states.append(await _state(first, second))
+        await checkpoint_ledger()
+        states.append(await _state(first, second))
+        await checkpoint_ledger()
+        states.append(await _state(first, second))
+        return states
+
+    before_a, after_a, folded, again = run_db(scenario)
+    # Пока A не закоммичена, ни её проводка, ни баланс не видны
+    assert before_a == ([0, 7], [])
+    assert after_a == ([5, 7], [])
+    assert folded == ([5, 7], [])
+    assert again == ([5, 7], [])
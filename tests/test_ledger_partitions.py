@@ -0,0 +1,63 @@
+from sqlalchemy import text
+
+from app.steps_bot.db import repo
+from app.steps_bot.db.ledger_writer import LedgerWriter
+from app.steps_bot.db.models.ledger import OperationType, OwnerType
+from app.steps_bot.db.models.user import User
+from app.steps_bot.services.ledger_partitions import (
+    DEFAULT_PARTITION,
+    PARENT_TABLE,
+    ensure_ledger_partitions,
+    list_ledger_partitions,
+)
+
+
+async def _rows(table: str) -> int:
+    async with repo.get_session(isolated=True) as s:
+        return await s.scalar(text(f"SELECT count(*) FROM {table}"))
+
+
+def test_partition_created_after_rows_reached_default(run_db):
+    async def scenario():
+        async with repo.get_session(isolated=True) as s:
+            user = User(telegram_id=100, balance=0)
+            s.add(user)
+            await s.flush()
+            writer = LedgerWriter(s)
+            writer.add(
+                owner_type=OwnerType.USER,
+                user_id=user.id,
+                operation=OperationType.MANUAL_ADJUST,
+                amount=5,
+                title="test",
+            )
+            await writer.flush()
+        assert await _rows(DEFAULT_PARTITION) == 1
+
+        created = await ensure_ledger_partitions(months_ahead=1)
+        try:
+            async with repo.get_session(isolated=True) as s:
+                attached = set((await list_ledger_partitions(s)).values())
+                has_default = await s.scalar(
+                    text(
+                        "SELECT count(*) FROM pg_inherits "
+                        "WHERE inhparent = CAST(:parent AS regclass) "
+                        "AND inhrelid = CAST(:default AS regclass)"
+                    ),
+                    {"parent": PARENT_TABLE, "default": DEFAULT_PARTITION},
+                )
+            return (
+                len(created),
+                attached == set(created),
+                has_default,
+                await _rows(DEFAULT_PARTITION),
+                await _rows(created[0]),
+                await _rows(PARENT_TABLE),
+                await ensure_ledger_partitions(months_ahead=1),
+            )
+        finally:
+            async with repo.get_session(isolated=True) as s:
+                for name in created:
+                    await s.execute(text(f"DROP TABLE {name}"))
+
+    assert run_db(scenario) == (2, True, 1, 0, 1, 1, [])
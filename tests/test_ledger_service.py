@@ -0,0 +1,34 @@
+import datetime as dt
+
+import pytest
+
+from app.steps_bot.services.ledger_service import HistoryCursor
+
+MSK = dt.timezone(dt.timedelta(hours=3))
+
+
+@pytest.mark.parametrize(
+    "created_at",
+    [
+        dt.datetime(2025, 10, 17, 12, 30, 45, 123456, tzinfo=dt.timezone.utc),
+        dt.datetime(2025, 10, 17, 15, 30, 45, 1, tzinfo=MSK),
+        dt.datetime(1969, 12, 31, 23, 59, 59, 999999, tzinfo=dt.timezone.utc),
+    ],
+)
+def test_history_cursor_round_trip(created_at):
+    cursor = HistoryCursor(created_at, 42)
+    decoded = HistoryCursor.decode(cursor.encode())
+    assert decoded == cursor
+    assert decoded.created_at.tzinfo is not None
+
+
+def test_history_cursor_fits_callback_data():
+    cursor = HistoryCursor(dt.datetime(2099, 12, 31, tzinfo=dt.timezone.utc), 2**31 - 1)
+    # callback_data ограничен 64 байтами, «hist:o:» занимает 7
+    assert len(f"hist:o:{cursor.encode()}".encode()) <= 64
+
+
+@pytest.mark.parametrize("value", ["", "1", "a:1", "1:b", "1:2:3", f"{10**20}:1"])
+def test_history_cursor_rejects_garbage(value):
+    with pytest.raises((ValueError, OverflowError)):
+        HistoryCursor.decode(value)
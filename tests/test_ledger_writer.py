@@ -0,0 +1,87 @@
+import pytest
+from sqlalchemy import func, select
+
+from app.steps_bot.db import repo
+from app.steps_bot.db.identity import UserId
+from app.steps_bot.db.ledger_writer import LedgerOwnerNotFound, LedgerWriter
+from app.steps_bot.db.models.family import Family
+from app.steps_bot.db.models.ledger import LedgerEntry, OperationType, OwnerType
+from app.steps_bot.db.models.user import User
+from app.steps_bot.services.ledger_service import transfer_user_to_family
+
+
+async def _user(balance: int = 0) -> int:
+    async with repo.get_session(isolated=True) as s:
+        user = User(telegram_id=100 + balance, balance=balance)
+        s.add(user)
+        await s.flush()
+        return user.id
+
+
+def test_balance_after_follows_each_entry(run_db):
+    async def scenario():
+        user_id = await _user(balance=10)
+        async with repo.get_session(isolated=True) as s:
+            user = await s.get(User, user_id)
+            writer = LedgerWriter(s)
+            for amount in (5, -3, 7):
+                writer.add(
+                    owner_type=OwnerType.USER,
+                    user_id=user_id,
+                    operation=OperationType.MANUAL_ADJUST,
+                    amount=amount,
+                    title="test",
+                )
+            writer.increment_user(user_id, step_count=100)
+            entries = await writer.flush()
+            return [e.balance_after for e in entries], user.balance, user.step_count
+
+    assert run_db(scenario) == ([15, 12, 19], 19, 100)
+
+
+def test_missing_owner_writes_nothing(run_db):
+    async def scenario():
+        user_id = await _user(balance=10)
+        async with repo.get_session(isolated=True) as s:
+            writer = LedgerWriter(s)
+            writer.add(
+                owner_type=OwnerType.FAMILY,
+                family_id=404,
+                operation=OperationType.MANUAL_ADJUST,
+                amount=5,
+                title="test",
+            )
+            writer.increment_user(user_id, balance=-5)
+            with pytest.raises(LedgerOwnerNotFound) as e:
+                await writer.flush()
+            assert e.value.missing == [(OwnerType.FAMILY, 404)]
+            return await s.scalar(select(func.count()).select_from(LedgerEntry))
+
+    assert run_db(scenario) == 0
+
+
+def test_transfer_to_missing_family(run_db):
+    async def scenario():
+        user_id = await _user(balance=10)
+        with pytest.raises(ValueError, match="Семья не найдена"):
+            async with repo.get_session(isolated=True) as s:
+                await transfer_user_to_family(s, UserId(user_id), family_id=404)
+        async with repo.get_session(isolated=True) as s:
+            return (await s.get(User, user_id)).balance, await s.scalar(
+                select(func.count()).select_from(LedgerEntry)
+            )
+
+    assert run_db(scenario) == (10, 0)
+
+
+def test_transfer_to_family(run_db):
+    async def scenario():
+        user_id = await _user(balance=10)
+        async with repo.get_session(isolated=True) as s:
+            family = Family(name="Ивановы", balance=3)
+            s.add(family)
+            await s.flush()
+            entry = await transfer_user_to_family(s, UserId(user_id), family.id)
+            return entry.balance_after, family.balance, (await s.get(User, user_id)).balance
+
+    assert run_db(scenario) == (13, 13, 0)
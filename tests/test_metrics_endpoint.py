@@ -0,0 +1,16 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.steps_bot import main, worker
+from app.steps_bot.settings import config
+
+
+@pytest.mark.parametrize("module", [main, worker])
+def test_metrics_require_api_key(module):
+    # Без контекстного менеджера lifespan не запускается: вебхук и БД не нужны
+    client = TestClient(module.app)
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"API-Key": "wrong"}).status_code == 403
+    resp = client.get("/metrics", headers={"API_Key": config.API_KEY})
+    assert resp.status_code == 200
+    assert isinstance(resp.json(), dict)
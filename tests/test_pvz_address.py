@@ -0,0 +1,54 @@
+import pytest
+
+from app.steps_bot.services.pvz_address import (
+    CITY_MAX_LENGTH,
+    SEARCH_MAX_LENGTH,
+    STREET_MAX_LENGTH,
+    normalize_text,
+    parse_address,
+    street_tokens,
+)
+
+
+@pytest.mark.parametrize(
+    "address, city, street",
+    [
+        ("Москва Ленинградский проспект 75 к1А", "москва", "ленинградский проспект"),
+        ("г. Казань, ул. Баумана, 12", "казань", "ул баумана"),
+        ("123456, Московская обл., г. Химки, ул. Ленина, 5", "химки", "ул ленина"),
+        ("Республика Татарстан, Казань, Баумана 12", "казань", "баумана"),
+        ("Нижний Новгород Большая Покровская 10", "нижний новгород", "большая покровская"),
+        ("Набережные Челны пр-т Мира 3", "набережные челны", "пр т мира"),
+        ("Санкт-Петербург, Невский пр., 1", "санкт петербург", "невский пр"),
+        ("г Москва ул Тверская 1", "москва", "ул тверская"),
+        ("Ёлкино, Зелёная, 3", "елкино", "зеленая"),
+        ("пос. Восход", "восход", ""),
+        ("", "", ""),
+    ],
+)
+def test_parse_address(address, city, street):
+    parsed = parse_address(address)
+    assert (parsed.city, parsed.street) == (city, street)
+    assert parsed.search == normalize_text(address)
+
+
+def test_normalize_text():
+    assert normalize_text("  Ёжик, д.5!  ") == "ежик д 5"
+    assert normalize_text(None) == ""
+
+
+def test_street_tokens_drop_street_types():
+    assert street_tokens("ул. Ленина") == ["ленина"]
+    assert street_tokens("Ленинградский пр-т") == ["ленинградский"]
+    # Только тип улицы — оставляем как есть, иначе запрос пустой
+    assert street_tokens("проспект") == ["проспект"]
+
+
+def test_parse_address_fits_pvz_columns():
+    # Адрес без запятых и пробелов целиком уходит в город
+    parsed = parse_address("Москва" * 60)
+    assert len(parsed.city) == CITY_MAX_LENGTH
+    parsed = parse_address("Город, " + "Улица " * 60 + ", 1")
+    assert len(parsed.street) <= STREET_MAX_LENGTH
+    assert len(parsed.search) <= SEARCH_MAX_LENGTH
+    assert not parsed.street.endswith(" ")
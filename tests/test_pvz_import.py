@@ -0,0 +1,66 @@
+from sqlalchemy import select
+
+from app.steps_bot.db import repo
+from app.steps_bot.db.models.pvz import PVZ
+from app.steps_bot.db.pvz_import import PvzImport, PvzImportResult
+
+
+async def _import(*batches):
+    async with repo.get_session(isolated=True) as s:
+        job = PvzImport(s)
+        for batch in batches:
+            await job.stage(batch)
+        return await job.merge()
+
+
+def _pvz(pvz_id: str, address: str):
+    return {"id": pvz_id, "full_address": address}
+
+
+def test_import_reports_diff(run_db):
+    async def scenario():
+        first = await _import(
+            [_pvz("a", "Москва, ул. Тверская, 1"), _pvz("b", "Казань, ул. Баумана, 12")],
+            [_pvz("c", "Химки, ул. Ленина, 5")],
+        )
+        second = await _import(
+            [
+                _pvz("a", "Москва, ул. Тверская, 1"),
+                _pvz("b", "Казань, ул. Баумана, 14"),
+                _pvz("d", "Тула, ул. Советская, 2"),
+                # Повтор id в загрузке: побеждает последняя строка
+                _pvz("d", "Тула, ул. Советская, 3"),
+            ]
+        )
+        again = await _import([_pvz("a", "Москва, ул. Тверская, 1")], [])
+        async with repo.get_session(isolated=True) as s:
+            rows = (await s.execute(select(PVZ.id, PVZ.full_address, PVZ.city))).all()
+        return first, second, again, sorted(rows)
+
+    first, second, again, rows = run_db(scenario)
+    assert first == PvzImportResult(total=3, inserted=3, updated=0, deleted=0)
+    assert second == PvzImportResult(total=3, inserted=1, updated=1, deleted=1)
+    assert second.unchanged == 1
+    assert again == PvzImportResult(total=1, inserted=0, updated=0, deleted=2)
+    assert rows == [("a", "Москва, ул. Тверская, 1", "москва")]
+
+
+def test_import_of_nothing_clears_the_list(run_db):
+    async def scenario():
+        await _import([_pvz("a", "Москва, ул. Тверская, 1")])
+        return await _import()
+
+    assert run_db(scenario) == PvzImportResult(total=0, inserted=0, updated=0, deleted=1)
+
+
+def test_import_of_long_address(run_db):
+    # Без запятых весь адрес — одно «слово» города длиннее pvz.city
+    address = "Москва" * 42
+
+    async def scenario():
+        result = await _import([_pvz("a", address)])
+        async with repo.get_session(isolated=True) as s:
+            city = await s.scalar(select(PVZ.city))
+        return result.inserted, len(city)
+
+    assert run_db(scenario) == (1, 128)
@@ -0,0 +1,119 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.steps_bot import sharding
+from app.steps_bot.settings import config
+from app.steps_bot.webhooks import telegram_webhook
+
+UPDATE = {"update_id": 1, "message": {"message_id": 1, "from": {"id": 42}, "chat": {"id": 42}}}
+
+
+class _FailingRouter:
+    async def forward(self, update):
+        return False
+
+
+def _client(monkeypatch, secret="s3cret"):
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", secret)
+    monkeypatch.setattr(telegram_webhook, "shard_router", _FailingRouter())
+    app = FastAPI()
+    app.include_router(telegram_webhook.router)
+    return TestClient(app)
+
+
+def test_shard_for_is_stable():
+    assert sharding.shard_for(42, 4) == sharding.shard_for(42, 4)
+    assert sharding.shard_for(42, 1) == 0
+    assert {sharding.shard_for(i, 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_extract_user_id():
+    assert sharding.extract_user_id(UPDATE) == 42
+    assert sharding.extract_user_id({"update_id": 1}) is None
+
+
+def test_webhook_rejects_wrong_secret(monkeypatch):
+    client = _client(monkeypatch)
+    resp = client.post("/webhook", json=UPDATE, headers={sharding.SECRET_HEADER: "wrong"})
+    assert resp.status_code == 403
+
+
+def test_webhook_returns_5xx_when_shard_fails(monkeypatch):
+    client = _client(monkeypatch)
+    resp = client.post("/webhook", json=UPDATE, headers={sharding.SECRET_HEADER: "s3cret"})
+    assert resp.status_code == 503
+    assert resp.json() == {"ok": False}
+
+
+def _router(monkeypatch, handler):
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", "s3cret")
+    router = sharding.ShardRouter(["http://worker"])
+    router._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return router
+
+
+def _forward(router):
+    async def run():
+        try:
+            return await router.forward(UPDATE)
+        finally:
+            await router.close()
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "error, delivered",
+    [
+        (httpx.ConnectError, False),
+        (httpx.ConnectTimeout, False),
+        (httpx.ReadTimeout, True),
+        (httpx.RemoteProtocolError, True),
+    ],
+)
+def test_forward_retries_only_undelivered_updates(monkeypatch, error, delivered):
+    def handler(request):
+        raise error("boom", request=request)
+
+    assert _forward(_router(monkeypatch, handler)) is delivered
+
+
+def test_forward_rejected_update_is_not_delivered(monkeypatch):
+    def handler(request):
+        assert request.headers[sharding.SECRET_HEADER] == "s3cret"
+        return httpx.Response(403, json={"ok": False})
+
+    assert _forward(_router(monkeypatch, handler)) is False
+
+
+def test_recent_updates_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(sharding.time, "monotonic", lambda: now[0])
+    recent = sharding.RecentUpdates(ttl=10)
+    assert recent.add(1) and recent.add(2)
+    assert not recent.add(1)
+    now[0] += 11
+    assert recent.add(1)
+    assert len(recent) == 1
+
+
+def test_worker_skips_duplicate_update(monkeypatch):
+    from app.steps_bot import worker
+
+    fed = []
+
+    async def feed_update(bot, update):
+        fed.append(update.update_id)
+
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(worker, "recent_updates", sharding.RecentUpdates(ttl=60))
+    monkeypatch.setattr(worker.dp, "feed_update", feed_update)
+    client = TestClient(worker.app)
+    for _ in range(2):
+        resp = client.post("/update", json={"update_id": 7}, headers={sharding.SECRET_HEADER: "s3cret"})
+        assert resp.json() == {"ok": True}
+    assert fed == [7]
@@ -0,0 +1,62 @@
+import pytest
+
+from app.steps_bot.services import step_counter
+from app.steps_bot.services.step_counter import score_segment, score_segments
+
+# (prev, curr, dt): шаг в норме, слишком быстро, слишком коротко, слишком длинно, dt <= 0
+SEGMENTS = [
+    ((55.7558, 37.6173), (55.7560, 37.6175), 20.0),
+    ((55.7558, 37.6173), (55.7562, 37.6177), 1.0),
+    ((55.7558, 37.6173), (55.75581, 37.61731), 10.0),
+    ((55.7558, 37.6173), (55.7570, 37.6190), 120.0),
+    ((55.7558, 37.6173), (55.7560, 37.6175), 0.0),
+]
+
+
+def _batch():
+    prev = [s[0] for s in SEGMENTS]
+    curr = [s[1] for s in SEGMENTS]
+    dt = [s[2] for s in SEGMENTS]
+    return prev, curr, dt
+
+
+def _expected():
+    return [score_segment(p, c, 0.0, d, engine="haversine") for p, c, d in SEGMENTS]
+
+
+def test_score_segments_fallback_matches_score_segment(monkeypatch):
+    monkeypatch.setattr(step_counter, "np", None)
+    distance, speed, steps, too_fast = score_segments(*_batch())
+
+    expected = _expected()
+    assert distance == [s.distance_m for s in expected]
+    assert speed == [s.speed_kmh for s in expected]
+    assert steps == [s.steps for s in expected]
+    assert too_fast == [s.too_fast for s in expected]
+
+
+def test_score_segments_numpy_matches_score_segment():
+    if step_counter.np is None:
+        pytest.skip("NumPy не установлен")
+    distance, speed, steps, too_fast = score_segments(*_batch())
+
+    expected = _expected()
+    assert distance.tolist() == pytest.approx([s.distance_m for s in expected])
+    assert speed.tolist() == pytest.approx([s.speed_kmh for s in expected])
+    assert steps.tolist() == [s.steps for s in expected]
+    assert too_fast.tolist() == [s.too_fast for s in expected]
+
+
+def test_score_segments_covers_every_rule():
+    scores = _expected()
+    assert scores[0].steps > 0 and not scores[0].too_fast
+    assert scores[1].too_fast and scores[1].steps == 0
+    assert not scores[2].too_fast and scores[2].steps == 0
+    assert scores[3].distance_m > step_counter.MAX_DISTANCE and scores[3].steps == 0
+    assert scores[4].too_fast and scores[4].steps == 0
+
+
+def test_score_segments_empty_batch(monkeypatch):
+    assert [len(x) for x in score_segments([], [], [])] == [0, 0, 0, 0]
+    monkeypatch.setattr(step_counter, "np", None)
+    assert score_segments([], [], []) == ([], [], [], [])
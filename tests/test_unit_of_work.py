@@ -0,0 +1,72 @@
+import pytest
+from sqlalchemy import func, select, text
+
+from app.steps_bot.db import repo
+from app.steps_bot.db.identity import TelegramId, resolve_user
+from app.steps_bot.db.models.user import User
+from app.steps_bot.db.session import mark_writes
+from app.steps_bot.middlewares.db_session import CommitBeforeRequestMiddleware
+
+
+async def _count_users() -> int:
+    async with repo.get_session(isolated=True) as s:
+        return await s.scalar(select(func.count()).select_from(User))
+
+
+def test_failed_call_drops_detached_users_from_identity_map(run_db):
+    async def scenario():
+        async with repo.get_session(isolated=True) as s:
+            s.add(User(telegram_id=777))
+
+        async with repo.unit_of_work() as session:
+            user = await resolve_user(session, TelegramId(777))
+            with pytest.raises(RuntimeError):
+                async with repo.get_session():
+                    raise RuntimeError("boom")
+            assert user not in session
+            again = await resolve_user(session, TelegramId(777))
+            assert again is not user
+            assert again in session
+
+    run_db(scenario)
+
+
+def test_raw_dml_is_not_rolled_back_by_a_later_failure(run_db):
+    async def scenario():
+        async with repo.get_session(isolated=True) as s:
+            s.add(User(telegram_id=1))
+
+        async with repo.unit_of_work():
+            async with repo.get_session() as s:
+                await s.execute(text("UPDATE users SET step_count = 5 WHERE telegram_id = 1"))
+                mark_writes(s)
+            with pytest.raises(RuntimeError):
+                async with repo.get_session() as s:
+                    s.add(User(telegram_id=2))
+                    await s.flush()
+                    raise RuntimeError("boom")
+        async with repo.get_session(isolated=True) as s:
+            return (await s.execute(select(User.telegram_id, User.step_count))).all()
+
+    assert run_db(scenario) == [(1, 5)]
+
+
+def test_update_is_committed_before_telegram_request(run_db):
+    seen = []
+
+    async def make_request(bot, method):
+        seen.append(await _count_users())
+        return "sent"
+
+    async def scenario():
+        middleware = CommitBeforeRequestMiddleware()
+        async with repo.unit_of_work() as session:
+            session.add(User(telegram_id=3))
+            await session.flush()
+            assert await middleware(make_request, None, None) == "sent"
+            # Транзакция апдейта продолжается после запроса
+            session.add(User(telegram_id=4))
+        return await _count_users()
+
+    assert run_db(scenario) == 2
+    assert seen == [1]
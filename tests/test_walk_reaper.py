@@ -0,0 +1,63 @@
+import time
+
+from app.steps_bot.db import repo
+from app.steps_bot.db.models.user import User
+from app.steps_bot.services.walk_reaper import reap_idle_walks
+from app.steps_bot.sharding import shard_for
+from app.steps_bot.storage.walk_sessions import DbWalkSessionStore
+
+USER_0 = next(i for i in range(1, 100) if shard_for(i, 2) == 0)
+
+
+class _Bot:
+    def __init__(self) -> None:
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(chat_id)
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        self.sent.append(chat_id)
+
+
+def _store(shard_index: int) -> DbWalkSessionStore:
+    return DbWalkSessionStore(flush_interval=60, shard_index=shard_index, shard_count=2)
+
+
+def test_only_owning_shard_reaps(run_db):
+    async def scenario():
+        async with repo.get_session(isolated=True) as s:
+            s.add(User(telegram_id=USER_0, balance=0))
+
+        writer = _store(0)
+        walk = await writer.get_or_create(USER_0)
+        walk.started_at = time.time() - 3600
+        walk.steps = 150
+        writer.save(walk)
+        await writer.flush()
+
+        owner, other = _store(0), _store(1)
+        await owner.load_active()
+        # Чужая прогулка попала в кэш второго шарда (например, апдейт до смены списка воркеров)
+        await other.get(USER_0)
+
+        owner_bot, other_bot = _Bot(), _Bot()
+        other_result = await reap_idle_walks(other_bot, ttl=0, store=other)
+        owner_result = await reap_idle_walks(owner_bot, ttl=0, store=owner)
+        again = await reap_idle_walks(owner_bot, ttl=0, store=owner)
+        await owner.flush()
+
+        async with repo.get_session(isolated=True) as s:
+            user = await s.get(User, 1)
+            return (
+                other_result.reaped,
+                other_result.evicted,
+                owner_result.reaped,
+                again.reaped,
+                owner_bot.sent,
+                other_bot.sent,
+                user.balance,
+                user.step_count,
+            )
+
+    assert run_db(scenario) == (0, 1, 1, 0, [USER_0], [], 150, 150)
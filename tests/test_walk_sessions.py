@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+from app.steps_bot.sharding import shard_for
+from app.steps_bot.storage.walk_sessions import DbWalkSessionStore, WalkSession, WalkSessionStore
+
+# Пользователи первого и второго из двух шардов
+USER_0 = next(i for i in range(1, 100) if shard_for(i, 2) == 0)
+USER_1 = next(i for i in range(1, 100) if shard_for(i, 2) == 1)
+
+
+def _store(shard_index: int) -> DbWalkSessionStore:
+    return DbWalkSessionStore(flush_interval=60, shard_index=shard_index, shard_count=2)
+
+
+async def _started(store: WalkSessionStore, user_id: int) -> WalkSession:
+    walk = await store.get_or_create(user_id)
+    walk.finished = False
+    walk.started_at = time.time()
+    walk.steps = 100
+    store.save(walk)
+    return walk
+
+
+def test_memory_claim_finish_once():
+    async def scenario():
+        store = WalkSessionStore()
+        walk = await _started(store, USER_0)
+        return await store.claim_finish(walk), await store.claim_finish(walk), walk.finished
+
+    assert asyncio.run(scenario()) == (True, False, True)
+
+
+def test_db_round_trip(run_db):
+    async def scenario():
+        store = _store(0)
+        walk = await _started(store, USER_0)
+        walk.coords = (55.75, 37.61)
+        store.save(walk)
+        await store.flush()
+        loaded = await _store(0).get(USER_0)
+        return loaded.steps, loaded.coords, loaded.started_at == walk.started_at, loaded.is_active
+
+    assert run_db(scenario) == (100, (55.75, 37.61), True, True)
+
+
+def test_load_active_takes_only_own_shard(run_db):
+    async def scenario():
+        writer = _store(0)
+        for user_id in (USER_0, USER_1):
+            await _started(writer, user_id)
+        await writer.flush()
+
+        first, second = _store(0), _store(1)
+        loaded = (await first.load_active(), await second.load_active())
+        return (
+            loaded,
+            [w.user_id for w in first.cached()],
+            [w.user_id for w in second.cached()],
+            first.owns(USER_0),
+            first.owns(USER_1),
+        )
+
+    assert run_db(scenario) == ((1, 1), [USER_0], [USER_1], True, False)
+
+
+def test_db_claim_finish_once_across_stores(run_db):
+    async def scenario():
+        owner = _store(0)
+        walk = await _started(owner, USER_0)
+        await owner.flush()
+        # Та же прогулка попала в кэш второго процесса через get()
+        other = _store(1)
+        stale = await other.get(USER_0)
+        return (
+            await other.claim_finish(stale),
+            await owner.claim_finish(walk),
+            await owner.claim_finish(walk),
+            USER_0 in [w.user_id for w in other.cached()],
+        )
+
+    assert run_db(scenario) == (True, False, False, True)
+
+
+def test_db_claim_of_new_walk_over_finished_row(run_db):
+    async def scenario():
+        store = _store(0)
+        walk = await _started(store, USER_0)
+        first = await store.claim_finish(walk)
+        walk.reset_walk()
+        store.save(walk)
+        await store.flush()
+        # Новая прогулка ещё не сброшена в БД: claim_finish сбрасывает её сам
+        walk = await _started(store, USER_0)
+        second = await store.claim_finish(walk)
+        # Устаревшая копия первой прогулки в другом процессе завершиться не может
+        other = _store(1)
+        stale = WalkSession(USER_0)
+        stale.started_at = 1.0
+        return first, second, await other.claim_finish(stale)
+
+    assert run_db(scenario) == (True, True, False)
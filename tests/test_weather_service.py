@@ -0,0 +1,48 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.steps_bot.api import weather_stub
+from app.steps_bot.services import weather_service
+
+STUB_URL = "http://weather-stub/v1/forecast"
+# Центр ячейки сетки: точки рядом с ним гарантированно попадают в ту же ячейку
+MOSCOW = weather_service._cell_center(weather_service.grid_cell(55.75, 37.61))
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Погодный сервис ходит в заглушку Open-Meteo через ASGI, без сети."""
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=weather_stub.app))
+    monkeypatch.setattr(weather_service, "OPEN_METEO_URL", STUB_URL)
+    monkeypatch.setattr(weather_service, "_client", client)
+    monkeypatch.setitem(weather_stub._state, "temperature", -12.4)
+    monkeypatch.setitem(weather_stub._state, "requests", 0)
+    weather_service.clear_weather_cache()
+    yield weather_stub._state
+    weather_service.clear_weather_cache()
+
+
+def test_concurrent_requests_in_one_cell_share_one_fetch(stub):
+    async def run():
+        points = [(MOSCOW[0] + i * 0.001, MOSCOW[1] - i * 0.001) for i in range(10)]
+        assert len({weather_service.grid_cell(*p) for p in points}) == 1
+        return await asyncio.gather(*(weather_service.get_current_temp_c(*p) for p in points))
+
+    assert asyncio.run(run()) == [-12] * 10
+    assert stub["requests"] == 1
+
+
+def test_cache_is_per_cell_and_cleared(stub):
+    async def run():
+        first = await weather_service.get_current_temp_c(*MOSCOW)
+        stub["temperature"] = 3.0
+        cached = await weather_service.get_current_temp_c(MOSCOW[0] + 0.001, MOSCOW[1] + 0.001)
+        other_cell = await weather_service.get_current_temp_c(59.93, 30.33)
+        weather_service.clear_weather_cache()
+        refreshed = await weather_service.get_current_temp_c(*MOSCOW)
+        return first, cached, other_cell, refreshed
+
+    assert asyncio.run(run()) == (-12, -12, 3, 3)
+    assert stub["requests"] == 3